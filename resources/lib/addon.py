@@ -10,7 +10,8 @@ try:  # Python 3
 except ImportError:  # Python 2
     from urllib import unquote_plus
 
-from kodiutils import container_refresh, end_of_directory, execute_builtin, get_global_setting, localize, log_access, notification, ok_dialog, refresh_caches
+from kodiutils import (container_refresh, end_of_directory, execute_builtin, get_global_setting, localize, log_access, notification, ok_dialog,
+                       refresh_caches, snapshot_settings)
 
 plugin = Plugin()  # pylint: disable=invalid-name
 
@@ -244,10 +245,10 @@ def remove_search(keywords):
 @plugin.route('/play/id/<video_id>')
 @plugin.route('/play/id/<video_id>/<publication_id>')
 @plugin.route('/play/id/<video_id>/<publication_id>/<episode_id>')
-def play_id(video_id, publication_id=None, episode_id=None):  # pylint: disable=unused-argument
+def play_id(video_id, publication_id=None, episode_id=None):
     """The API interface to play a video by video_id and/or publication_id"""
     from vrtplayer import VRTPlayer
-    VRTPlayer().play({'video_id': video_id, 'publication_id': publication_id})
+    VRTPlayer().play({'video_id': video_id, 'publication_id': publication_id, 'episode_id': episode_id})
 
 
 @plugin.route('/play/url/<path:video_url>')
@@ -286,6 +287,13 @@ def play_episode_id(episode_id):
     VRTPlayer().play_episode_by_episode_id(episode_id=episode_id)
 
 
+@plugin.route('/diagnostics')
+def show_diagnostics():
+    """The API interface to show performance statistics of recent plugin invocations"""
+    from diagnostics import show_diagnostics as show_stats
+    show_stats()
+
+
 @plugin.route('/iptv/channels')
 def iptv_channels():
     """Return JSON-M3U formatted data for all live channels"""
@@ -321,5 +329,11 @@ def show_settings_addons():
 
 def run(argv):
     """Addon entry point from wrapper"""
+    import diagnostics
+    snapshot_settings()
     log_access(argv)
-    plugin.run(argv)
+    started = diagnostics.start()
+    try:
+        plugin.run(argv)
+    finally:
+        diagnostics.finish(plugin.path, started)
@@ -8,7 +8,15 @@ import kodiutils
 
 kodiutils.ADDON = xbmcaddon.Addon()
 
+PREFETCH_TIMEOUT = 3  # seconds
+
 if __name__ == '__main__':
     from sys import argv
-    from addon import run
-    run(argv)
+    from worker import forward
+    # Let the service worker handle listings, it keeps module state and caches warm between invocations
+    if not forward(argv):
+        from addon import run
+        run(argv)
+        # The listing is shown by now, give prefetches of next pages a moment to complete
+        from utils import wait_for_background
+        wait_for_background(timeout=PREFETCH_TIMEOUT)
@@ -3,6 +3,7 @@
 """Implements VRT MAX GraphQL API functionality"""
 
 from __future__ import absolute_import, division, unicode_literals
+from functools import partial
 
 try:  # Python 3
     from urllib.parse import quote_plus, unquote
@@ -10,16 +11,48 @@ except ImportError:  # Python 2
     from urllib import quote_plus, unquote
 
 from data import CHANNELS
-from helperobjects import TitleItem
-from kodiutils import (colour, delete_cached_thumbnail, get_cache, get_setting_bool, get_setting_int, get_url_json, has_addon, has_credentials,
-                       localize, localize_from_data, log, update_cache, url_for)
-from utils import find_entry, from_unicode, reformat_image_url, shorten_link, to_unicode, url_to_program, youtube_to_plugin_url
+from diagnostics import span, timed
+from helperobjects import ScheduleIndex, TitleItem
+from kodiutils import (colour, delete_cached_thumbnail, get_cache, get_cached_url_json, get_setting, get_setting_bool, get_setting_int, get_url_json,
+                       has_addon, has_credentials, invalidate_cache_tags, localize, localize_from_data, log, ttl, update_cache, url_for)
+from utils import (find_entry, from_unicode, iso8601_tz, parse_iso8601, reformat_image_url, run_in_background, shorten_link, to_unicode, url_to_program,
+                   youtube_to_plugin_url)
 from graphql_data import EPISODE_TILE
 
 SCREENSHOT_URL = 'https://www.vrt.be/vrtnu-static/screenshots'
 GRAPHQL_URL = 'https://www.vrt.be/vrtnu-api/graphql/v1'
 RESUMEPOINTS_URL = 'https://ddt.profiel.vrt.be/resumePoints'
 RESUMEPOINTS_MARGIN = 30  # The margin at start/end to consider a video as watched
+GRAPHQL_BATCHING_CACHE = 'graphql_batching.json'
+GRAPHQL_CACHE = 'graphql.{key}.json'
+OFFLINE_LIST_ID = 'dynamic:/vrtnu.model.json@par_list_1624607593_copy_1408213323'  # The 'laatste kans' list of programs going offline soon
+# GraphQL response caching by operation name and list id prefix: (operation name, list id prefix, family, ttl kind)
+# The family is the cache tag, so related responses are invalidated together
+GRAPHQL_CACHE_FAMILIES = (
+    ('ListedEpisodes', 'dynamic:/vrtnu.model.json@resume-list-video', 'continue', 'direct'),
+    ('ListedEpisodes', 'static:/vrtnu/kijk.model.json', 'recent', 'direct'),
+    ('ListedEpisodes', '#', 'search', 'indirect'),
+    ('ListedEpisodes', '', 'episodes', 'indirect'),
+    ('PaginatedPrograms', 'dynamic:/vrtnu.model.json@favorites-list-video', 'favorites', 'direct'),
+    ('PaginatedPrograms', OFFLINE_LIST_ID, 'offline', 'indirect'),
+    ('PaginatedPrograms', '#', 'search', 'indirect'),
+    ('PaginatedPrograms', '', 'programs', 'indirect'),
+    ('VideoProgramPage', None, 'programs', 'indirect'),
+    ('Page', None, 'pages', 'indirect'),
+)
+# Episode and program tiles carry their favorite status, so every cached family changes with the favorites
+FAVORITE_CACHE_FAMILIES = tuple(sorted(set(family for _, _, family, _ in GRAPHQL_CACHE_FAMILIES)))
+# Episode tiles carry their resumepoint and watched status, so every family with episode tiles changes with the resumepoints
+RESUMEPOINT_CACHE_FAMILIES = ('continue', 'episodes', 'pages', 'programs', 'recent', 'search')
+# GraphQL mutations and the cached families they change
+GRAPHQL_MUTATIONS = {
+    'setFavoriteActionItem': FAVORITE_CACHE_FAMILIES,
+    'listDelete': ('continue',),
+    'finishItem': RESUMEPOINT_CACHE_FAMILIES,
+}
+PLAYERDATA_TTL = 60  # Playback start, resumepoints and Up Next all need the same episode data within a minute
+PLAYERDATA_MEMO = {}
+FAVORITES_PAGES_MAX = 10  # The number of pages fetched at most to fill a page of favorites
 
 
 def get_sort(program_type):
@@ -102,14 +135,14 @@ def format_label(program_title, episode_title, program_type, ontime=None, favori
 def format_plot(plot, region, product_placement, mpaa, offtime, permalink):
     """Format plot"""
     from datetime import datetime
-    import dateutil.tz
 
     # Add additional metadata to plot
     plot_meta = ''
     # Only display when a video disappears if it is within the next 3 months
     # Show the remaining days/hours the episode is still available
     if offtime:
-        now = datetime.now(dateutil.tz.tzlocal())
+        # Any timezone will do for the remaining time, so dateutil is not needed to list episodes
+        now = datetime.now(iso8601_tz(0))
         remaining = offtime - now
         if remaining.days / 365 > 5:
             pass  # If it is available for more than 5 years, do not show
@@ -169,7 +202,6 @@ def get_resumepoint_data(episode_id):
 
 def get_next_info(episode_id):
     """ Get up next data"""
-    import dateutil.parser
     next_info = {}
     data_json = get_single_episode_data(episode_id)
     current_ep = data_json.get('data').get('catalogMember')
@@ -195,7 +227,7 @@ def get_next_info(episode_id):
             'season': int(''.join(i for i in current_ep.get('season').get('titleRaw') if i.isdigit()) or 0),
             'episode': int(current_ep.get('episodeNumberRaw') or 0),
             'rating': None,
-            'firstaired': dateutil.parser.parse(current_ep.get('analytics').get('airDate')).strftime('%Y-%m-%d'),
+            'firstaired': parse_iso8601(current_ep.get('analytics').get('airDate')).strftime('%Y-%m-%d'),
             'runtime': int(current_ep.get('durationSeconds')),
         }
 
@@ -217,7 +249,7 @@ def get_next_info(episode_id):
             'season': int(''.join(i for i in next_ep.get('season').get('titleRaw') if i.isdigit()) or 0),
             'episode': int(next_ep.get('episodeNumberRaw') or 0),
             'rating': None,
-            'firstaired': dateutil.parser.parse(next_ep.get('analytics').get('airDate')).strftime('%Y-%m-%d'),
+            'firstaired': parse_iso8601(next_ep.get('analytics').get('airDate')).strftime('%Y-%m-%d'),
             'runtime': int(next_ep.get('durationSeconds')),
         }
         next_info = {
@@ -265,7 +297,33 @@ def get_stream_id_data(vrtmax_url):
 
 
 def get_single_episode_data(episode_id):
-    """Get single episode data from GraphQL API"""
+    """Get single episode data from GraphQL API
+       The result is shortly remembered in memory and on disk, so playback, resumepoints and Up Next share a single request"""
+    from time import time
+    now = time()
+    memo = PLAYERDATA_MEMO.get(episode_id)
+    if memo and now < memo[0] + PLAYERDATA_TTL:
+        return memo[1]
+
+    cache_file = 'playerdata.{episode_id}.json'.format(episode_id=episode_id)
+    data_json = get_cache(cache_file, ttl=PLAYERDATA_TTL)
+    if data_json is None:
+        data_json = api_req(*get_single_episode_query(episode_id))
+        # Failed or empty responses are not remembered, so playback can be retried right away
+        if not data_json or not (data_json.get('data') or {}).get('catalogMember'):
+            return data_json
+        from json import dumps
+        update_cache(cache_file, dumps(data_json), ttl=PLAYERDATA_TTL)
+
+    # Forget expired episodes, the service process lives long
+    for key in [key for key, value in PLAYERDATA_MEMO.items() if now >= value[0] + PLAYERDATA_TTL]:
+        del PLAYERDATA_MEMO[key]
+    PLAYERDATA_MEMO[episode_id] = (now, data_json)
+    return data_json
+
+
+def get_single_episode_query(episode_id):
+    """Return the GraphQL query, operation name and variables for single episode data"""
     graphql_query = """
         query PlayerData($id: ID!) {
           catalogMember(id: $id) {
@@ -340,7 +398,7 @@ def get_single_episode_data(episode_id):
     variables = {
         'id': episode_id,
     }
-    return api_req(graphql_query, operation_name, variables)
+    return graphql_query, operation_name, variables
 
 
 def get_latest_episode_data(program_name):
@@ -653,6 +711,7 @@ def set_resumepoint(video_id, title, position, total):
         data = dumps(payload).encode('utf-8')
         data_json = get_url_json(url='{}/{}'.format(RESUMEPOINTS_URL, video_id), cache=None, headers=headers, data=data, raise_errors='all')
         log(3, '[Resumepoints] Updated resumepoint {data}', data=data_json)
+        invalidate_cache_tags(*RESUMEPOINT_CACHE_FAMILIES)
     return data_json
 
 
@@ -727,6 +786,13 @@ def finish_continue(episode_id):
 
 def get_paginated_episodes(list_id, page_size, end_cursor=''):
     """Get paginated list of episodes from GraphQL API"""
+    api_data = api_req(*get_paginated_episodes_query(list_id, page_size, end_cursor))
+    prefetch_next_page(api_data, partial(get_paginated_episodes_query, list_id, page_size))
+    return api_data
+
+
+def get_paginated_episodes_query(list_id, page_size, end_cursor=''):
+    """Return the GraphQL query, operation name and variables for a paginated list of episodes"""
     graphql_query = """
         query ListedEpisodes(
           $listId: ID!
@@ -766,11 +832,81 @@ def get_paginated_episodes(list_id, page_size, end_cursor=''):
         'endCursor': end_cursor,
         'pageSize': page_size,
     }
-    return api_req(graphql_query, operation_name, variables)
+    return graphql_query, operation_name, variables
 
 
 def get_paginated_programs(list_id, page_size, end_cursor='', client='WEB'):
-    """Get paginated list of episodes from GraphQL API"""
+    """Get paginated list of programs from GraphQL API"""
+    api_data = api_req(*get_paginated_programs_query(list_id, page_size, end_cursor), client=client)
+    prefetch_next_page(api_data, partial(get_paginated_programs_query, list_id, page_size), client=client)
+    return api_data
+
+
+def prefetch_next_page(api_data, get_query, client='WEB'):
+    """Fetch the next page of a paginated list in the background, so it is cached when the 'More...' item is opened"""
+    if not get_setting_bool('usehttpcaching', default=True):
+        return
+    try:
+        page_info = api_data.get('data').get('list').get('paginated').get('pageInfo')
+    except AttributeError:
+        return
+    if not page_info or not page_info.get('hasNextPage') or not page_info.get('endCursor'):
+        return
+    run_in_background(prefetch, get_query(end_cursor=page_info.get('endCursor')), client)
+
+
+def get_favorite_page(get_query, favorited, page_size, end_cursor=''):
+    """Get a page of favorites from a paginated list, pulling successive pages until the page is full or the list ends
+       The returned page continues at the end cursor of the last page that was pulled"""
+    graphql_query, operation_name, variables = get_query(end_cursor=end_cursor)
+    # Filtered pages are cached next to the unfiltered pages of the same list
+    cache_variables = dict(variables, favorites=True)
+    api_data = get_graphql_cache(graphql_query, operation_name, cache_variables)
+    if api_data is not None:
+        return api_data
+    edges = []
+    page_info = None
+    for _ in range(FAVORITES_PAGES_MAX):
+        page = api_req(*get_query(end_cursor=end_cursor))
+        try:
+            paginated = page.get('data').get('list').get('paginated')
+        except AttributeError:
+            break
+        edges.extend(edge for edge in paginated.get('edges') if favorited(edge))
+        page_info = paginated.get('pageInfo') or {}
+        end_cursor = page_info.get('endCursor')
+        if len(edges) >= page_size or not page_info.get('hasNextPage') or not end_cursor:
+            break
+    if page_info is None:
+        return page
+    api_data = {'data': {'list': {'paginated': {'edges': edges, 'pageInfo': page_info}}}}
+    update_graphql_cache(graphql_query, operation_name, cache_variables, api_data)
+    return api_data
+
+
+def favorited_episode(edge):
+    """Whether the episode of a paginated list item is a favorite"""
+    data = edge.get('node') or {}
+    episode = data.get('episode') or data.get('catalogMember') or {}
+    return bool((episode.get('favoriteAction') or {}).get('favorite'))
+
+
+def favorited_program(edge):
+    """Whether the program of a paginated list item is a favorite"""
+    program = (edge.get('node') or {}).get('program') or {}
+    return bool((program.get('favoriteAction') or {}).get('favorite'))
+
+
+def prefetch(operation, client='WEB'):
+    """Cache the response of a GraphQL operation"""
+    try:
+        api_req(*operation, client=client)
+    except Exception as exc:  # pylint: disable=broad-except
+        log(2, 'Failed to prefetch {operation}: {exc}', operation=operation[1], exc=exc)
+
+
+def get_paginated_programs_query(list_id, page_size, end_cursor=''):
+    """Return the GraphQL query, operation name and variables for a paginated list of programs"""
     graphql_query = """
         query PaginatedPrograms(
           $listId: ID!
@@ -846,7 +982,7 @@ def get_paginated_programs(list_id, page_size, end_cursor='', client='WEB'):
         'endCursor': end_cursor,
         'pageSize': page_size,
     }
-    return api_req(graphql_query, operation_name, variables, client)
+    return graphql_query, operation_name, variables
 
 
 def convert_programs(api_data, destination, use_favorites=False, **kwargs):
@@ -887,8 +1023,8 @@ def convert_programs(api_data, destination, use_favorites=False, **kwargs):
             if use_favorites and favorited is False:
                 continue
 
-            # Context menu
-            context_menu = get_context_menu(program_name, program_id, program_title, program_type, favorited)
+            # Context menu, built when the listing is shown
+            context_menu = partial(get_context_menu, program_name, program_id, program_title, program_type, favorited)
 
             # Label
             label = format_label(program_title, episode_title, program_type, ontime, favorited, item_type='program')
@@ -920,9 +1056,8 @@ def convert_programs(api_data, destination, use_favorites=False, **kwargs):
         kwargs = {k: v for k, v in list(kwargs.items()) if v is not None}
         page_info = api_data.get('data').get('list').get('paginated').get('pageInfo')
 
-        # FIXME: find a better way to disable more when favorites are filtered
-        page_size = get_setting_int('itemsperpage', default=50)
-        if len(programs) == page_size and page_info.get('hasNextPage'):
+        # Favorites are filtered by get_favorite_page, so the list only continues when the API says so
+        if page_info.get('hasNextPage'):
             end_cursor = page_info.get('endCursor')
             # Add 'More...' entry at the end
             programs.append(
@@ -939,7 +1074,6 @@ def convert_programs(api_data, destination, use_favorites=False, **kwargs):
 
 def convert_episode(item, destination=None):
     """Convert paginated episode item to TitleItem"""
-    import dateutil.parser
     data = item.get('node') or item.get('data') or item.get('tile')
     episode = data.get('episode') or data.get('catalogMember')
     # FIXME: find a better way to abort when we have no valid api data
@@ -960,8 +1094,8 @@ def convert_episode(item, destination=None):
 
     episode_title = episode.get('title')
 
-    offtime = dateutil.parser.parse(episode.get('offTimeRaw') or '1970-01-01T00:00:00.000+00:00')
-    ontime = dateutil.parser.parse(episode.get('onTimeRaw') or '1970-01-01T00:00:00.000+00:00')
+    offtime = parse_iso8601(episode.get('offTimeRaw') or '1970-01-01T00:00:00.000+00:00')
+    ontime = parse_iso8601(episode.get('onTimeRaw') or '1970-01-01T00:00:00.000+00:00')
     mpaa = episode.get('ageRaw') or ''
     product_placement = episode.get('productPlacementShortValue') == 'pp'
     region = episode.get('regionRaw')
@@ -973,9 +1107,9 @@ def convert_episode(item, destination=None):
     episode_no = int(episode.get('episodeNumberRaw') or 0)
     season_no = int(''.join(i for i in episode.get('season').get('titleRaw') if i.isdigit()) or 0)
     studio = episode.get('brand').title() if episode.get('brand') else 'VRT'
-    aired = dateutil.parser.parse(episode.get('analytics').get('airDate')).strftime('%Y-%m-%d')
+    aired = parse_iso8601(episode.get('analytics').get('airDate')).strftime('%Y-%m-%d')
     dateadded = ontime.strftime('%Y-%m-%d %H:%M:%S')
-    year = int(dateutil.parser.parse(episode.get('onTimeRaw')).strftime('%Y'))
+    year = ontime.year
     tag = [tag.title() for tag in episode.get('analytics').get('categories').split(',') if tag]
 
     # Art
@@ -1000,9 +1134,9 @@ def convert_episode(item, destination=None):
     if destination == 'resumepoints_continue':
         is_continue = True
 
-    # Context menu
-    context_menu = get_context_menu(program_name, program_id, program_title, program_type,
-                                    favorited, is_continue, episode_id)
+    # Context menu, built when the listing is shown
+    context_menu = partial(get_context_menu, program_name, program_id, program_title, program_type,
+                           favorited, is_continue, episode_id)
 
     # Label
     label = format_label(program_title, episode_title, program_type, ontime, favorited)
@@ -1058,6 +1192,7 @@ def convert_episode(item, destination=None):
     )
 
 
+@timed('convert_episodes')
 def convert_episodes(api_data, destination, use_favorites=False, **kwargs):
     """Convert paginated episode list to TitleItems"""
     episodes = []
@@ -1081,9 +1216,8 @@ def convert_episodes(api_data, destination, use_favorites=False, **kwargs):
         kwargs = {k: v for k, v in list(kwargs.items()) if v is not None}
         page_info = api_data.get('data').get('list').get('paginated').get('pageInfo')
 
-        # FIXME: find a better way to disable more when favorites are filtered
-        page_size = get_setting_int('itemsperpage', default=50)
-        if len(episodes) == page_size and page_info.get('hasNextPage'):
+        # Favorites are filtered by get_favorite_page, so the list only continues when the API says so
+        if page_info.get('hasNextPage'):
             end_cursor = page_info.get('endCursor')
             # Add 'More...' entry at the end
             episodes.append(
@@ -1138,8 +1272,7 @@ def get_search(keywords, end_cursor=''):
     destination = None
 
     entity_types = ['video-program', 'video-episode']
-    programs = []
-    episodes = []
+    operations = []
     items = []
 
     for entity_type in entity_types:
@@ -1166,12 +1299,17 @@ def get_search(keywords, end_cursor=''):
         list_id = '#{}'.format(base64.b64encode(list_id.encode('utf-8')).decode('utf-8'))
 
         if entity_type == 'video-program' and not end_cursor:
-            programs_data = get_paginated_programs(list_id=list_id, page_size=page_size, end_cursor=end_cursor)
-            programs = convert_programs(programs_data, destination=destination, keywords=keywords)
-            items.extend(programs)
+            operations.append(get_paginated_programs_query(list_id=list_id, page_size=page_size, end_cursor=end_cursor))
         elif entity_type == 'video-episode':
-            episodes_data = get_paginated_episodes(list_id=list_id, page_size=page_size, end_cursor=end_cursor)
-            episodes, _, _ = convert_episodes(episodes_data, destination=destination, keywords=keywords)
+            operations.append(get_paginated_episodes_query(list_id=list_id, page_size=page_size, end_cursor=end_cursor))
+
+    # Search programs and episodes in a single round trip
+    for (_, operation_name, _), api_data in zip(operations, api_req_batch(operations)):
+        if operation_name == 'PaginatedPrograms':
+            programs = convert_programs(api_data, destination=destination, keywords=keywords)
+            items.extend(programs)
+        else:
+            episodes, _, _ = convert_episodes(api_data, destination=destination, keywords=keywords)
             items.extend(episodes)
     return items
 
@@ -1235,7 +1373,10 @@ def get_recent_episodes(end_cursor='', use_favorites=False):
     """Get recent episodes"""
     page_size = get_setting_int('itemsperpage', default=50)
     list_id = 'static:/vrtnu/kijk.model.json@par_list_copy_copy_copy'
-    api_data = get_paginated_episodes(list_id=list_id, page_size=page_size, end_cursor=end_cursor)
+    if use_favorites:
+        api_data = get_favorite_page(partial(get_paginated_episodes_query, list_id, page_size), favorited_episode, page_size, end_cursor=end_cursor)
+    else:
+        api_data = get_paginated_episodes(list_id=list_id, page_size=page_size, end_cursor=end_cursor)
     destination = 'favorites_recent' if use_favorites else 'recent'
     episodes, sort, ascending = convert_episodes(api_data, destination=destination, use_favorites=use_favorites)
     return episodes, sort, ascending, 'episodes'
@@ -1244,8 +1385,11 @@ def get_recent_episodes(end_cursor='', use_favorites=False):
 def get_offline_programs(end_cursor='', use_favorites=False):
     """Get laatste kans/soon offline programs"""
     page_size = get_setting_int('itemsperpage', default=50)
-    list_id = 'dynamic:/vrtnu.model.json@par_list_1624607593_copy_1408213323'
-    api_data = get_paginated_programs(list_id=list_id, page_size=page_size, end_cursor=end_cursor)
+    list_id = OFFLINE_LIST_ID
+    if use_favorites:
+        api_data = get_favorite_page(partial(get_paginated_programs_query, list_id, page_size), favorited_program, page_size, end_cursor=end_cursor)
+    else:
+        api_data = get_paginated_programs(list_id=list_id, page_size=page_size, end_cursor=end_cursor)
     destination = 'favorites_offline' if use_favorites else 'offline'
     programs = convert_programs(api_data, destination=destination, use_favorites=use_favorites)
     return programs
@@ -1361,8 +1505,62 @@ def get_seasons(program_name):
     return seasons
 
 
+def api_headers(access_token, client='WEB'):
+    """Return GraphQL API request headers"""
+    return {
+        'Accept': 'application/json',
+        'Authorization': 'Bearer ' + access_token,
+        'Content-Type': 'application/json',
+        'x-vrt-client-name': client,
+        'x-vrt-client-version': '1.5.7',
+    }
+
+
+def graphql_cache_family(operation_name, variables):
+    """Return the cache family and ttl kind of a GraphQL operation, or None when its response is not cached"""
+    list_id = variables.get('listId')
+    for family_operation, list_id_prefix, family, ttl_kind in GRAPHQL_CACHE_FAMILIES:
+        if family_operation != operation_name:
+            continue
+        if list_id_prefix is None or (list_id is not None and list_id.startswith(list_id_prefix)):
+            return family, ttl_kind
+    return None
+
+
+def graphql_cache_file(graphql_query, operation_name, variables, client='WEB'):
+    """Return the cache file of a GraphQL operation, keyed by the operation, its variables, the client and the user"""
+    from hashlib import sha1
+    from json import dumps
+    key = dumps([operation_name, variables, client, get_setting('username'), graphql_query], sort_keys=True)
+    return GRAPHQL_CACHE.format(key=sha1(key.encode('utf-8')).hexdigest())
+
+
+def get_graphql_cache(graphql_query, operation_name, variables, client='WEB'):
+    """Return the cached response of a GraphQL operation, or None"""
+    cache_family = graphql_cache_family(operation_name, variables)
+    if cache_family is None:
+        return None
+    return get_cache(graphql_cache_file(graphql_query, operation_name, variables, client), ttl=ttl(cache_family[1]))
+
+
+def update_graphql_cache(graphql_query, operation_name, variables, data_json, client='WEB'):
+    """Cache the response of a GraphQL operation, or invalidate the cached families changed by a mutation"""
+    if operation_name in GRAPHQL_MUTATIONS:
+        invalidate_cache_tags(*GRAPHQL_MUTATIONS.get(operation_name))
+        return
+    cache_family = graphql_cache_family(operation_name, variables)
+    # Only cache complete responses
+    if cache_family is None or not isinstance(data_json, dict) or not data_json.get('data') or data_json.get('errors'):
+        return
+    from json import dumps
+    update_cache(graphql_cache_file(graphql_query, operation_name, variables, client), dumps(data_json), tag=cache_family[0])
+
+
 def api_req(graphql_query, operation_name, variables, client='WEB'):
     """GraphQL API Request"""
+    data_json = get_graphql_cache(graphql_query, operation_name, variables, client)
+    if data_json is not None:
+        return data_json
     from json import dumps
     from tokenresolver import TokenResolver
     access_token = TokenResolver().get_token('vrtnu-site_profile_at')
@@ -1374,17 +1572,68 @@ def api_req(graphql_query, operation_name, variables, client='WEB'):
             'variables': variables,
         }
         data = dumps(payload).encode('utf-8')
-        headers = {
-            'Accept': 'application/json',
-            'Authorization': 'Bearer ' + access_token,
-            'Content-Type': 'application/json',
-            'x-vrt-client-name': client,
-            'x-vrt-client-version': '1.5.7',
-        }
-        data_json = get_url_json(url=GRAPHQL_URL, cache=None, headers=headers, data=data, raise_errors='all')
+        headers = api_headers(access_token, client)
+        with span('api_req.' + operation_name):
+            data_json = get_url_json(url=GRAPHQL_URL, cache=None, headers=headers, data=data, raise_errors='all')
+        update_graphql_cache(graphql_query, operation_name, variables, data_json, client)
     return data_json
 
 
+def api_req_batch(operations, client='WEB'):
+    """GraphQL API Request for multiple operations, returns the results in the same order
+       Operations are sent as a single batched request, or run concurrently when batching is not supported"""
+    cached = [get_graphql_cache(*operation, client=client) for operation in operations]
+    if None not in cached:
+        return cached
+    from json import dumps
+    if len(operations) > 1 and graphql_batching_supported() is not False:
+        from socket import timeout
+        from ssl import SSLError
+        try:  # Python 3
+            from urllib.error import HTTPError, URLError
+        except ImportError:  # Python 2
+            from urllib2 import HTTPError, URLError
+        from tokenresolver import TokenResolver
+        access_token = TokenResolver().get_token('vrtnu-site_profile_at')
+        if not access_token:
+            return [{} for _ in operations]
+        payload = [{
+            'operationName': operation_name,
+            'query': graphql_query,
+            'variables': variables,
+        } for graphql_query, operation_name, variables in operations]
+        data = dumps(payload).encode('utf-8')
+        headers = api_headers(access_token, client)
+        supported = None  # Unknown when the request failed for another reason than batching
+        try:
+            data_json = get_url_json(url=GRAPHQL_URL, cache=None, headers=headers, data=data, raise_errors='network')
+            supported = isinstance(data_json, list) and len(data_json) == len(operations)
+        except HTTPError as exc:
+            # Only a rejection of the array payload means batching is not supported, not an expired token or a server error
+            if exc.code in (400, 405):
+                supported = False
+            log(2, 'Batched GraphQL request failed: HTTP Error {code}', code=exc.code)
+        except (URLError, SSLError, timeout) as exc:
+            log(2, 'Batched GraphQL request failed: {error}', error=getattr(exc, 'reason', exc))
+        if supported is not None:
+            update_cache(GRAPHQL_BATCHING_CACHE, dumps(dict(supported=supported)))
+        if supported:
+            for operation, item in zip(operations, data_json):
+                update_graphql_cache(*operation, data_json=item, client=client)
+            return [item or {} for item in data_json]
+
+    from utils import run_concurrently
+    return run_concurrently(lambda operation: api_req(*operation, client=client), operations)
+
+
+def graphql_batching_supported():
+    """Whether the GraphQL API accepts batched requests, None when unknown"""
+    batching = get_cache(GRAPHQL_BATCHING_CACHE, ttl=24 * 60 * 60)
+    if batching is None:
+        return None
+    return batching.get('supported')
+
+
 def get_featured_data():
     """Get featured data"""
     graphql_query = """
@@ -1713,28 +1962,18 @@ def get_episode_by_air_date(channel_name, start_date, end_date=None):
         schedule_date = onairdate
     schedule_datestr = schedule_date.isoformat().split('T')[0]
     url = 'https://www.vrt.be/bin/epg/schedule.{date}.json'.format(date=schedule_datestr)
-    schedule_json = get_url_json(url, fail={})
-    episodes = schedule_json.get(channel.get('id'), [])
-    if not episodes:
+    schedule_json = get_cached_url_json(url, cache='schedule.{date}.json'.format(date=schedule_datestr), ttl=ttl('indirect'), fail={})
+    schedule_index = ScheduleIndex(schedule_json.get(channel.get('id'), []))
+    if not schedule_index.episodes:
         return None
 
     # Guess the episode
-    episode_guess = None
+    from calendar import timegm
     if not offairdate:
-        mindate = min(abs(onairdate - dateutil.parser.parse(episode.get('startTime'))) for episode in episodes)
-        episode_guess = next((episode for episode in episodes if abs(onairdate - dateutil.parser.parse(episode.get('startTime'))) == mindate), None)
+        idx = schedule_index.nearest_start(timegm(onairdate.utctimetuple()))
     else:
-        duration = offairdate - onairdate
-        midairdate = onairdate + timedelta(seconds=duration.total_seconds() / 2)
-        mindate = min(abs(midairdate
-                          - (dateutil.parser.parse(episode.get('startTime'))
-                             + timedelta(seconds=(dateutil.parser.parse(episode.get('endTime'))
-                                                  - dateutil.parser.parse(episode.get('startTime'))).total_seconds() / 2))) for episode in episodes)
-        episode_guess = next((episode for episode in episodes
-                              if abs(midairdate
-                                     - (dateutil.parser.parse(episode.get('startTime'))
-                                        + timedelta(seconds=(dateutil.parser.parse(episode.get('endTime'))
-                                                             - dateutil.parser.parse(episode.get('startTime'))).total_seconds() / 2))) == mindate), None)
+        idx = schedule_index.nearest_middle((timegm(onairdate.utctimetuple()) + timegm(offairdate.utctimetuple())) / 2)
+    episode_guess = schedule_index.episodes[idx]
     if episode_guess:
         if episode_guess.get('episodeId'):
             episode = get_single_episode_data(episode_guess.get('episodeId'))
@@ -1748,10 +1987,10 @@ def get_episode_by_air_date(channel_name, start_date, end_date=None):
                 return video
 
         # Airdate live2vod feature: use livestream cache of last 24 hours if no video was found
-        offairdate_guess = dateutil.parser.parse(episode_guess.get('endTime'))
-        if now - timedelta(hours=24) <= dateutil.parser.parse(episode_guess.get('endTime')) <= now:
+        offairdate_guess = datetime.fromtimestamp(schedule_index.ends[idx], dateutil.tz.UTC)
+        if now - timedelta(hours=24) <= offairdate_guess <= now:
             start_date = onairdate.astimezone(dateutil.tz.UTC).isoformat()[0:19]
-            end_date = offairdate_guess.astimezone(dateutil.tz.UTC).isoformat()[0:19]
+            end_date = offairdate_guess.isoformat()[0:19]
 
         # Offairdate defined
         if offairdate and now - timedelta(hours=24) <= offairdate <= now:
@@ -1788,8 +2027,10 @@ def get_episode_by_air_date(channel_name, start_date, end_date=None):
 
 def get_channels(channels=None, live=True):
     """Construct a list of channel ListItems, either for Live TV or the TV Guide listing"""
-    from tvguide import TVGuide
-    _tvguide = TVGuide()
+    _tvguide = None
+    if live:  # Only Live TV shows what is playing now
+        from tvguide import TVGuide
+        _tvguide = TVGuide()
 
     channel_items = []
     for channel in CHANNELS:
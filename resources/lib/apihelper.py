@@ -11,7 +11,7 @@ except ImportError:  # Python 2
     from urllib2 import unquote
 
 from data import CHANNELS
-from helperobjects import TitleItem
+from helperobjects import ScheduleIndex, TitleItem
 from kodiutils import (delete_cached_thumbnail, get_cache, get_cached_url_json, get_global_setting,
                        get_setting_bool, get_setting_int, get_url_json, has_addon, localize,
                        localize_from_data, log, ttl, update_cache, url_for)
@@ -438,39 +438,29 @@ class ApiHelper:
         schedule_datestr = schedule_date.isoformat().split('T')[0]
         url = 'https://www.vrt.be/bin/epg/schedule.{date}.json'.format(date=schedule_datestr)
         schedule_json = get_url_json(url, fail={})
-        episodes = schedule_json.get(channel.get('id'), [])
-        if not episodes:
+        schedule_index = ScheduleIndex(schedule_json.get(channel.get('id'), []))
+        if not schedule_index.episodes:
             return None
 
         # Guess the episode
-        episode_guess = None
+        from calendar import timegm
         if not offairdate:
-            mindate = min(abs(onairdate - dateutil.parser.parse(episode.get('startTime'))) for episode in episodes)
-            episode_guess = next((episode for episode in episodes if abs(onairdate - dateutil.parser.parse(episode.get('startTime'))) == mindate), None)
+            idx = schedule_index.nearest_start(timegm(onairdate.utctimetuple()))
         else:
-            duration = offairdate - onairdate
-            midairdate = onairdate + timedelta(seconds=duration.total_seconds() / 2)
-            mindate = min(abs(midairdate
-                              - (dateutil.parser.parse(episode.get('startTime'))
-                                 + timedelta(seconds=(dateutil.parser.parse(episode.get('endTime'))
-                                                      - dateutil.parser.parse(episode.get('startTime'))).total_seconds() / 2))) for episode in episodes)
-            episode_guess = next((episode for episode in episodes
-                                  if abs(midairdate
-                                         - (dateutil.parser.parse(episode.get('startTime'))
-                                            + timedelta(seconds=(dateutil.parser.parse(episode.get('endTime'))
-                                                                 - dateutil.parser.parse(episode.get('startTime'))).total_seconds() / 2))) == mindate), None)
+            idx = schedule_index.nearest_middle((timegm(onairdate.utctimetuple()) + timegm(offairdate.utctimetuple())) / 2)
+        episode_guess = schedule_index.episodes[idx]
 
         if episode_guess:
-            offairdate_guess = dateutil.parser.parse(episode_guess.get('endTime'))
+            offairdate_guess = datetime.fromtimestamp(schedule_index.ends[idx], dateutil.tz.UTC)
             video = self.get_single_episode(episode_id=episode_guess.get('episodeId'))
             if video:
                 return video
 
             # Airdate live2vod feature: use livestream cache of last 24 hours if no video was found
 
-            if now - timedelta(hours=24) <= dateutil.parser.parse(episode_guess.get('endTime')) <= now:
+            if now - timedelta(hours=24) <= offairdate_guess <= now:
                 start_date = onairdate.astimezone(dateutil.tz.UTC).isoformat()[0:19]
-                end_date = offairdate_guess.astimezone(dateutil.tz.UTC).isoformat()[0:19]
+                end_date = offairdate_guess.isoformat()[0:19]
 
             # Offairdate defined
             if offairdate and now - timedelta(hours=24) <= offairdate <= now:
@@ -695,8 +685,10 @@ class ApiHelper:
 
     def list_channels(self, channels=None, live=True):
         """Construct a list of channel ListItems, either for Live TV or the TV Guide listing"""
-        from tvguide import TVGuide
-        _tvguide = TVGuide()
+        _tvguide = None
+        if live:  # Only Live TV shows what is playing now
+            from tvguide import TVGuide
+            _tvguide = TVGuide()
 
         channel_items = []
         for channel in CHANNELS:
@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+# GNU General Public License v3.0 (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+"""Implements a SQLite cache store shared by the VRT MAX plugin and service"""
+
+from __future__ import absolute_import, division, unicode_literals
+import sqlite3
+from threading import Lock
+from time import time
+
+
+class CacheStore:
+    """A cache store that keeps all cache entries in a single SQLite database"""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS cache (
+            namespace TEXT NOT NULL,
+            key TEXT NOT NULL,
+            blob TEXT NOT NULL,
+            updated REAL NOT NULL,
+            ttl REAL,
+            expiry REAL,
+            tag TEXT,
+            PRIMARY KEY (namespace, key)
+        );
+        CREATE INDEX IF NOT EXISTS cache_expiry ON cache (expiry);
+        CREATE INDEX IF NOT EXISTS cache_tag ON cache (tag);
+        CREATE TABLE IF NOT EXISTS refresh_queue (
+            namespace TEXT NOT NULL,
+            key TEXT NOT NULL,
+            url TEXT NOT NULL,
+            headers TEXT,
+            queued REAL NOT NULL,
+            PRIMARY KEY (namespace, key)
+        );
+    """
+
+    def __init__(self, path, timeout=10):
+        """Initialize the cache store, the database is opened when first used"""
+        self._path = path
+        self._timeout = timeout
+        self._conn = None
+        self._lock = Lock()
+
+    def _connection(self):
+        """Return the database connection, create the database when needed"""
+        if self._conn is None:
+            # Autocommit mode, every statement is an atomic transaction
+            conn = sqlite3.connect(self._path, timeout=self._timeout, isolation_level=None, check_same_thread=False)
+            try:
+                # Readers never block the writer, so the plugin and the service can use the cache at the same time
+                conn.execute('PRAGMA journal_mode=WAL')
+            except sqlite3.OperationalError:  # Some filesystems do not support WAL mode
+                pass
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.executescript(self.SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def _execute(self, statement, parameters=()):
+        """Execute a statement and return the cursor"""
+        with self._lock:
+            return self._connection().execute(statement, parameters)
+
+    def get(self, namespace, key, ttl=None):
+        """Return a cached blob if it is still fresh, else None"""
+        row = self._execute('SELECT blob, updated, expiry FROM cache WHERE namespace = ? AND key = ?', (namespace, key)).fetchone()
+        if row is None:
+            return None
+        blob, updated, expiry = row
+        now = time()
+        if ttl is not None:
+            if now >= updated + ttl:
+                return None
+        elif expiry is not None and expiry <= now:
+            return None
+        return blob
+
+    def set(self, namespace, key, blob, ttl=None, expiry=None, tag=None):
+        """Store a blob in the cache, an optional ttl or expiry timestamp bounds its lifetime"""
+        now = time()
+        if expiry is None and ttl is not None:
+            expiry = now + ttl
+        self._execute('INSERT OR REPLACE INTO cache (namespace, key, blob, updated, ttl, expiry, tag) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                      (namespace, key, blob, now, ttl, expiry, tag))
+
+    def touch(self, namespace, key):
+        """Mark a cache entry as updated now, e.g. when the server confirms it did not change"""
+        return self._execute('UPDATE cache SET updated = ? WHERE namespace = ? AND key = ?', (time(), namespace, key)).rowcount
+
+    def delete(self, namespace, key):
+        """Delete a cache entry"""
+        return self._execute('DELETE FROM cache WHERE namespace = ? AND key = ?', (namespace, key)).rowcount
+
+    def invalidate(self, namespace, *patterns):
+        """Delete cache entries matching glob patterns, constant prefixes are looked up using the primary key index"""
+        count = 0
+        for pattern in patterns:
+            count += self._execute('DELETE FROM cache WHERE namespace = ? AND key GLOB ?', (namespace, pattern)).rowcount
+        return count
+
+    def invalidate_tags(self, *tags):
+        """Delete cache entries with one of the given tags"""
+        count = 0
+        for tag in tags:
+            count += self._execute('DELETE FROM cache WHERE tag = ?', (tag,)).rowcount
+        return count
+
+    def clear(self, namespace):
+        """Delete all cache entries of a namespace"""
+        return self._execute('DELETE FROM cache WHERE namespace = ?', (namespace,)).rowcount
+
+    def purge(self, max_age):
+        """Delete expired cache entries and entries that were not updated for max_age seconds"""
+        now = time()
+        return self._execute('DELETE FROM cache WHERE expiry <= ? OR updated <= ?', (now, now - max_age)).rowcount
+
+    def queue_refresh(self, namespace, key, url, headers=None):
+        """Queue a cache entry to be refreshed in the background"""
+        self._execute('INSERT OR REPLACE INTO refresh_queue (namespace, key, url, headers, queued) VALUES (?, ?, ?, ?, ?)',
+                      (namespace, key, url, headers, time()))
+
+    def pop_refreshes(self):
+        """Return and remove all queued cache refreshes"""
+        # Avoid taking the write lock when nothing is queued
+        if self._execute('SELECT 1 FROM refresh_queue LIMIT 1').fetchone() is None:
+            return []
+        with self._lock:
+            conn = self._connection()
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                refreshes = conn.execute('SELECT namespace, key, url, headers FROM refresh_queue ORDER BY queued').fetchall()
+                conn.execute('DELETE FROM refresh_queue')
+            except sqlite3.Error:
+                conn.execute('ROLLBACK')
+                raise
+            conn.execute('COMMIT')
+        return refreshes
+
+    def close(self):
+        """Close the database connection"""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
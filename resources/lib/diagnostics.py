@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+# GNU General Public License v3.0 (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+"""Implements opt-in instrumentation of VRT MAX plugin invocations"""
+
+from __future__ import absolute_import, division, unicode_literals
+from functools import wraps
+from threading import Lock
+from timeit import default_timer
+
+DIAGNOSTICS_FILE = 'diagnostics.json'
+DIAGNOSTICS_HISTORY = 100  # The number of plugin invocations kept in the rolling stats file
+
+ENABLED = False
+SPANS = {}
+COUNTERS = {}
+LOCK = Lock()
+
+
+class Span(object):  # pylint: disable=useless-object-inheritance
+    """Measures the duration of a block of code"""
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name):
+        """Initialize a span"""
+        self.name = name
+        self.start = None
+
+    def __enter__(self):
+        """Start the span"""
+        self.start = default_timer()
+        return self
+
+    def __exit__(self, *exc_info):
+        """Stop the span and add its duration to the aggregated spans"""
+        record(self.name, default_timer() - self.start)
+
+
+class NoSpan(object):  # pylint: disable=useless-object-inheritance
+    """A span that does nothing when instrumentation is disabled"""
+    __slots__ = ()
+
+    def __enter__(self):
+        """Do nothing"""
+        return self
+
+    def __exit__(self, *exc_info):
+        """Do nothing"""
+
+
+NO_SPAN = NoSpan()
+
+
+def span(name):
+    """Return a span for a block of code"""
+    if not ENABLED:
+        return NO_SPAN
+    return Span(name)
+
+
+def timed(name):
+    """Decorator to measure the duration of a function"""
+    def decorator(func):
+        """Wrap a function in a span"""
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            """Run the function in a span"""
+            if not ENABLED:
+                return func(*args, **kwargs)
+            with Span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record(name, duration):
+    """Add a duration to the aggregated spans"""
+    with LOCK:
+        stats = SPANS.get(name)
+        if stats is None:
+            SPANS[name] = [1, duration, duration]
+            return
+        stats[0] += 1
+        stats[1] += duration
+        stats[2] = max(stats[2], duration)
+
+
+def count(name, value=1):
+    """Increase a counter"""
+    if not ENABLED:
+        return
+    with LOCK:
+        COUNTERS[name] = COUNTERS.get(name, 0) + value
+
+
+def start():
+    """Start instrumenting a plugin invocation when enabled in the add-on settings"""
+    global ENABLED  # pylint: disable=global-statement
+    from kodiutils import get_setting_bool
+    with LOCK:
+        SPANS.clear()
+        COUNTERS.clear()
+    ENABLED = get_setting_bool('usediagnostics', default=False)
+    return default_timer()
+
+
+def finish(path, started):
+    """Stop instrumenting a plugin invocation and add it to the rolling stats file"""
+    global ENABLED  # pylint: disable=global-statement
+    if not ENABLED:
+        return
+    ENABLED = False
+    from time import time
+    history = read_history()
+    with LOCK:
+        history.append(dict(
+            route=route_name(path),
+            path=path,
+            time=int(time()),
+            duration=default_timer() - started,
+            spans=dict(SPANS),
+            counters=dict(COUNTERS),
+        ))
+    write_history(history[-DIAGNOSTICS_HISTORY:])
+
+
+def route_name(path):
+    """Return the route of a plugin path, without its arguments"""
+    return '/' + path.strip('/').split('/', 1)[0]
+
+
+def diagnostics_file():
+    """Return the path of the rolling stats file"""
+    from kodiutils import addon_profile
+    return addon_profile() + DIAGNOSTICS_FILE
+
+
+def read_history():
+    """Read the instrumented plugin invocations from the rolling stats file"""
+    from kodiutils import exists, get_json_data, open_file
+    if not exists(diagnostics_file()):
+        return []
+    with open_file(diagnostics_file(), 'r') as fdesc:
+        return get_json_data(fdesc, fail=[])
+
+
+def write_history(history):
+    """Write the instrumented plugin invocations to the rolling stats file"""
+    from json import dump
+    from kodiutils import open_file
+    with open_file(diagnostics_file(), 'w') as fdesc:
+        dump(history, fdesc)
+
+
+def aggregate(history):
+    """Aggregate the routes, spans and counters of instrumented plugin invocations"""
+    routes = {}
+    spans = {}
+    counters = {}
+    for invocation in history:
+        stats = routes.setdefault(invocation.get('route'), [0, 0.0, 0.0])
+        stats[0] += 1
+        stats[1] += invocation.get('duration')
+        stats[2] = max(stats[2], invocation.get('duration'))
+        for name, (calls, total, longest) in invocation.get('spans').items():
+            stats = spans.setdefault(name, [0, 0.0, 0.0])
+            stats[0] += calls
+            stats[1] += total
+            stats[2] = max(stats[2], longest)
+        for name, value in invocation.get('counters').items():
+            counters[name] = counters.get(name, 0) + value
+    return routes, spans, counters
+
+
+def show_diagnostics():
+    """Show the aggregated instrumentation of recent plugin invocations"""
+    from helperobjects import TitleItem
+    from kodiutils import show_listing, url_for
+    routes, spans, counters = aggregate(read_history())
+    diagnostic_items = []
+    for prefix, stats in (('route', routes), ('span', spans)):
+        # Show the routes and spans where most time goes first
+        for name, (calls, total, longest) in sorted(stats.items(), key=lambda item: item[1][1], reverse=True):
+            label = '[B]%s[/B] %s: %d× %.1f ms (max %.1f ms)' % (prefix, name, calls, total * 1000 / calls, longest * 1000)
+            diagnostic_items.append(TitleItem(label=label, path=url_for('noop'), is_playable=False,
+                                              info_dict=dict(plot='%.1f ms in total' % (total * 1000))))
+    for name, value in sorted(counters.items()):
+        diagnostic_items.append(TitleItem(label='[B]counter[/B] %s: %d' % (name, value), path=url_for('noop'), is_playable=False))
+    show_listing(diagnostic_items, category='Diagnostics', content='files', cache=False)
@@ -11,7 +11,7 @@ except ImportError:  # Python 2
     from urllib2 import unquote
 
 from kodiutils import (container_refresh, get_cache, get_setting_bool, get_url_json,
-                       has_credentials, input_down, invalidate_caches, localize,
+                       has_credentials, input_down, invalidate_cache_tags, invalidate_caches, localize,
                        multiselect, notification, ok_dialog, update_cache)
 from utils import url_to_program
 
@@ -72,6 +72,9 @@ class Favorites:
 
         # Update online
         self.set_favorite_graphql(program_id, title, is_favorite)
+        # Cached GraphQL listings carry the favorite status of their items
+        from api import FAVORITE_CACHE_FAMILIES
+        invalidate_cache_tags(*FAVORITE_CACHE_FAMILIES)
         return True
 
     def get_favorites(self):
@@ -5,9 +5,11 @@
 from __future__ import absolute_import, division, unicode_literals
 
 
-class ApiData:
+class ApiData(object):  # pylint: disable=useless-object-inheritance
     """This helper object holds all media information"""
 
+    __slots__ = ('client', 'media_api_url', 'video_id', 'publication_id', 'is_live_stream')
+
     def __init__(self, client, media_api_url, video_id, publication_id, is_live_stream):
         """The constructor for the ApiData class"""
         self.client = client
@@ -17,9 +19,11 @@ class ApiData:
         self.is_live_stream = is_live_stream
 
 
-class StreamURLS:
+class StreamURLS(object):  # pylint: disable=useless-object-inheritance
     """This helper object holds all information to be used when playing streams"""
 
+    __slots__ = ('stream_url', 'subtitle_url', 'license_url', 'license_headers', 'use_inputstream_adaptive', 'video_id')
+
     def __init__(self, stream_url, subtitle_url=None, license_url=None, license_headers=None, use_inputstream_adaptive=False):
         """The constructor for the StreamURLS class"""
         self.stream_url = stream_url
@@ -30,16 +34,130 @@ class StreamURLS:
         self.video_id = None
 
 
-class TitleItem:
+class TitleItem(object):  # pylint: disable=useless-object-inheritance
     """This helper object holds all information to be used with Kodi xbmc's ListItem object"""
 
+    __slots__ = ('label', 'path', 'art_dict', 'info_dict', 'stream_dict', 'prop_dict', '_context_menu', 'is_playable')
+
     def __init__(self, label, path=None, art_dict=None, info_dict=None, stream_dict=None, prop_dict=None, context_menu=None, is_playable=False):
-        """The constructor for the TitleItem class"""
+        """The constructor for the TitleItem class, context_menu can be a callable that builds the context menu when needed"""
         self.label = label
         self.path = path
         self.art_dict = art_dict
         self.info_dict = info_dict
         self.stream_dict = stream_dict
         self.prop_dict = prop_dict
-        self.context_menu = context_menu
+        self._context_menu = context_menu
         self.is_playable = is_playable
+
+    @property
+    def context_menu(self):
+        """Return the context menu, a lazy context menu is built on first use"""
+        if callable(self._context_menu):
+            self._context_menu = self._context_menu()
+        return self._context_menu
+
+    @context_menu.setter
+    def context_menu(self, context_menu):
+        """Set the context menu, or a callable that builds it"""
+        self._context_menu = context_menu
+
+    def to_dict(self):
+        """Return a serializable dict of this TitleItem"""
+        return dict(label=self.label, path=self.path, art_dict=self.art_dict, info_dict=self.info_dict, stream_dict=self.stream_dict,
+                    prop_dict=self.prop_dict, context_menu=self.context_menu, is_playable=self.is_playable)
+
+    @classmethod
+    def from_dict(cls, title_item):
+        """Return a TitleItem from a dict created by to_dict()"""
+        context_menu = title_item.get('context_menu')
+        if context_menu:
+            context_menu = [tuple(entry) for entry in context_menu]
+        return cls(title_item.get('label'), path=title_item.get('path'), art_dict=title_item.get('art_dict'), info_dict=title_item.get('info_dict'),
+                   stream_dict=title_item.get('stream_dict'), prop_dict=title_item.get('prop_dict'), context_menu=context_menu,
+                   is_playable=title_item.get('is_playable'))
+
+
+class ScheduleIndex:
+    """This helper object holds a channel schedule sorted by start time for fast lookups by timestamp"""
+
+    # Parsed start and end timestamps of recently indexed schedules, shared by all instances
+    _intervals = {}
+    _INTERVALS_MAX = 64
+
+    def __init__(self, episodes):
+        """The constructor for the ScheduleIndex class"""
+        times = tuple((episode.get('startTime'), episode.get('endTime')) for episode in episodes)
+        intervals = self._intervals.get(times)
+        if intervals is None:
+            intervals = self._parse_intervals(times)
+            if len(self._intervals) >= self._INTERVALS_MAX:
+                self._intervals.clear()
+            self._intervals[times] = intervals
+        self.episodes = [episodes[pos] for _, _, pos in intervals]
+        self.starts = [start for start, _, _ in intervals]
+        self.ends = [end for _, end, _ in intervals]
+        # Start and end timestamps in the original schedule order
+        self.times = [None] * len(episodes)
+        for start, end, pos in intervals:
+            self.times[pos] = (start, end)
+        self._middles = None
+
+    @staticmethod
+    def _parse_intervals(times):
+        """Return a sorted list of start and end timestamps with the position in the schedule"""
+        from calendar import timegm
+        from utils import parse_iso8601
+        intervals = []
+        for pos, (start_time, end_time) in enumerate(times):
+            if not start_time or not end_time:
+                continue
+            start = timegm(parse_iso8601(start_time).utctimetuple())
+            end = timegm(parse_iso8601(end_time).utctimetuple())
+            intervals.append((start, end, pos))
+        intervals.sort()
+        return intervals
+
+    def playing(self, timestamp):
+        """Return the index of the episode playing at a timestamp, or None"""
+        from bisect import bisect_right
+        idx = bisect_right(self.starts, timestamp) - 1
+        if idx >= 0 and timestamp <= self.ends[idx]:
+            return idx
+        return None
+
+    def upcoming(self, timestamp):
+        """Return the index of the first episode starting after a timestamp, or None"""
+        from bisect import bisect_right
+        idx = bisect_right(self.starts, timestamp)
+        if idx < len(self.starts):
+            return idx
+        return None
+
+    def nearest_start(self, timestamp):
+        """Return the index of the episode with the start time closest to a timestamp, or None"""
+        return self._nearest(self.starts, timestamp)
+
+    def nearest_middle(self, timestamp):
+        """Return the index of the episode with the middle closest to a timestamp, or None"""
+        if self._middles is None:
+            # Overlapping episodes may not be sorted by their middle
+            middles = sorted(((start + end) / 2, idx) for idx, (start, end) in enumerate(zip(self.starts, self.ends)))
+            self._middles = ([middle for middle, _ in middles], [idx for _, idx in middles])
+        pos = self._nearest(self._middles[0], timestamp)
+        if pos is None:
+            return None
+        return self._middles[1][pos]
+
+    @staticmethod
+    def _nearest(values, timestamp):
+        """Return the index of the value closest to a timestamp in a sorted list, the earliest wins a tie"""
+        from bisect import bisect_left
+        if not values:
+            return None
+        idx = bisect_left(values, timestamp)
+        if idx == 0:
+            return 0
+        if idx == len(values) or timestamp - values[idx - 1] <= values[idx] - timestamp:
+            return idx - 1
+        return idx
@@ -7,6 +7,28 @@ from __future__ import absolute_import, division, unicode_literals
 from kodiutils import log, url_for
 
 
+def iterencode(data):
+    """Encode data as JSON fragments, generators of key-value pairs are encoded as JSON objects
+       Every item of a dictionary or list is encoded separately, so the complete JSON document is never built in memory"""
+    from json import JSONEncoder
+    from types import GeneratorType
+    encoder = JSONEncoder()
+    if isinstance(data, (dict, GeneratorType)):
+        yield '{'
+        for idx, (key, value) in enumerate(data.items() if isinstance(data, dict) else data):
+            yield '%s%s: ' % (', ' if idx else '', encoder.encode(key))
+            for fragment in iterencode(value):
+                yield fragment
+        yield '}'
+    elif isinstance(data, (list, tuple)):
+        yield '['
+        for idx, item in enumerate(data):
+            yield '%s%s' % (', ' if idx else '', encoder.encode(item))
+        yield ']'
+    else:
+        yield encoder.encode(data)
+
+
 class IPTVManager:
     """Interface to IPTV Manager"""
 
@@ -19,13 +41,16 @@ class IPTVManager:
 
         def send(self):
             """Decorator to send over a socket"""
-            import json
             import socket
             log(2, "Sending data output to IPTV Manager using port {port}", port=self.port)
             sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             sock.connect(('127.0.0.1', self.port))
             try:
-                sock.sendall(json.dumps(func()).encode())  # pylint: disable=not-callable
+                # Buffer the JSON fragments, so they are sent in large packets
+                writer = sock.makefile('wb')
+                for fragment in iterencode(func()):  # pylint: disable=not-callable
+                    writer.write(fragment.encode())
+                writer.close()
             finally:
                 sock.close()
 
@@ -56,5 +81,4 @@ class IPTVManager:
     def send_epg():  # pylint: disable=no-method-argument
         """Return JSONTV formatted information to IPTV Manager"""
         from tvguide import TVGuide
-        epg_data = TVGuide().get_epg_data()
-        return {'version': 1, 'epg': epg_data}
+        return {'version': 1, 'epg': TVGuide().iter_epg_data()}
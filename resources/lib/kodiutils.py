@@ -4,9 +4,9 @@
 
 from __future__ import absolute_import, division, unicode_literals
 from contextlib import contextmanager
+from functools import partial
 from sys import version_info
-from socket import timeout
-from ssl import SSLError
+from threading import Lock
 
 import xbmc
 import xbmcplugin
@@ -17,17 +17,46 @@ except ImportError:  # Kodi 19 alpha 1 and lower
     from xbmc import translatePath  # pylint: disable=ungrouped-imports
 
 from xbmcaddon import Addon
+from diagnostics import count, span
 from utils import from_unicode, to_unicode
 
 try:  # Python 3
-    from urllib.parse import quote, urlencode
-    from urllib.request import HTTPErrorProcessor
+    from urllib.parse import quote, quote_plus, urlencode
 except ImportError:  # Python 2
-    from urllib import urlencode
-    from urllib2 import quote, HTTPErrorProcessor
+    from urllib import quote, quote_plus, urlencode
 
 ADDON = Addon()
 DEFAULT_CACHE_DIR = 'cache'
+VALIDATORS_CACHE_DIR = 'validators'
+
+# Keep-alive connections shared by all requests, keyed per connection class, host and proxy tunnel
+CONNECTION_POOL = {}
+CONNECTION_POOL_LOCK = Lock()
+CONNECTION_POOL_SIZE = 4
+CONNECTION_MAX_IDLE = 30
+
+CACHE_DATABASE = 'cache.sqlite'
+CACHE_MAX_AGE = 30 * 24 * 60 * 60
+CACHE_GRACE = 24 * 60 * 60
+
+# Snapshot of add-on and Kodi settings, enabled per plugin invocation and in the service
+SETTINGS_SNAPSHOT = None
+
+# Listings are captured instead of shown while the service worker runs a forwarded plugin invocation
+LISTING_CAPTURE = None
+
+# Url templates of plugin routes, by route name, number of positional arguments and keyword argument names
+URL_TEMPLATES = {}
+URL_TEMPLATE_TOKEN = 'VRTMAXURLARG{}X'
+# A value that tells the quoting functions apart, the quoting of every argument is learnt from the router itself
+URL_TEMPLATE_SAMPLE = 'a b/é&=?+%#~'
+URL_ENCODERS = (
+    lambda value: value,
+    quote,
+    partial(quote, safe=''),
+    quote_plus,
+    partial(quote_plus, safe='/'),
+)
 
 SORT_METHODS = {
     # 'date': xbmcplugin.SORT_METHOD_DATE,
@@ -95,15 +124,6 @@ MONTH_SHORT = {
 }
 
 
-class NoRedirection(HTTPErrorProcessor):
-    """Prevent urllib from following http redirects"""
-
-    def http_response(self, request, response):
-        return response
-
-    https_response = http_response
-
-
 class SafeDict(dict):
     """A safe dictionary implementation that does not break down on missing keys"""
     def __missing__(self, key):
@@ -147,18 +167,91 @@ def addon_profile():
 
 
 def url_for(name, *args, **kwargs):
-    """Wrapper for routing.url_for() to lookup by name"""
+    """Wrapper for routing.url_for() to lookup by name, using a compiled url template when possible"""
+    values = args + tuple(kwargs.values())
+    # Other types are converted to text by the router
+    if not all(isinstance(value, type('')) for value in values):
+        return route_url_for(name, *args, **kwargs)
+    key = (name, len(args), tuple(kwargs))
+    template = URL_TEMPLATES.get(key)
+    if template is None:
+        template = URL_TEMPLATES[key] = compile_url_template(route_url_for, name, len(args), tuple(kwargs))
+    if not template:
+        return route_url_for(name, *args, **kwargs)
+    return expand_url_template(template, values)
+
+
+def expand_url_template(template, values):
+    """Return the url of a url template for positional and keyword argument values"""
+    return ''.join(part if encoder is None else encoder(values[part]) for part, encoder in template)
+
+
+def route_url_for(name, *args, **kwargs):
+    """Return the url of a plugin route using the router"""
     import addon
     return addon.plugin.url_for(getattr(addon, name), *args, **kwargs)
 
 
+def compile_url_template(router_url_for, name, positional, keywords):
+    """Return a url template for a plugin route, or False when the urls of the router cannot be reproduced
+       The template is a list of literal parts and argument indices with the quoting function of the argument"""
+    import re
+    tokens = [URL_TEMPLATE_TOKEN.format(idx) for idx in range(positional + len(keywords))]
+
+    def route(values):
+        """Return the url for argument values"""
+        return router_url_for(name, *values[:positional], **dict(zip(keywords, values[positional:])))
+
+    try:
+        url = route(tokens)
+    except Exception:  # pylint: disable=broad-except
+        return False
+
+    # Learn the quoting of every argument, and verify it reproduces the url of the router
+    encoders = {}
+    for idx, token in enumerate(tokens):
+        try:
+            expected = route(tokens[:idx] + [URL_TEMPLATE_SAMPLE] + tokens[idx + 1:])
+        except Exception:  # pylint: disable=broad-except
+            return False
+        for encoder in URL_ENCODERS:
+            try:
+                if url.replace(token, encoder(URL_TEMPLATE_SAMPLE)) == expected:
+                    encoders[idx] = encoder
+                    break
+            except (KeyError, UnicodeError):  # Python 2 does not quote unicode
+                continue
+        else:
+            return False
+
+    template = []
+    for idx, part in enumerate(re.split('(%s)' % URL_TEMPLATE_TOKEN.format(r'\d+'), url)):
+        if idx % 2:
+            template.append((tokens.index(part), encoders.get(tokens.index(part))))
+        elif part:
+            template.append((part, None))
+    return template
+
+
 def show_listing(list_items, category=None, sort='unsorted', ascending=True, content=None, cache=None, selected=None):
     """Show a virtual directory in Kodi"""
-    from xbmcgui import ListItem
     from addon import plugin
+    if LISTING_CAPTURE is not None:
+        # Hand over the listing to the plugin invocation that forwarded this request to the service worker
+        LISTING_CAPTURE.append(dict(path=plugin.path, list_items=[title_item.to_dict() for title_item in list_items], category=category,
+                                    sort=sort, ascending=ascending, content=content, cache=cache, selected=selected))
+        return
+    with span('show_listing'):
+        render_listing(plugin.handle, plugin.path, list_items, category=category, sort=sort, ascending=ascending, content=content,
+                       cache=cache, selected=selected)
+
+
+def render_listing(handle, path, list_items, category=None, sort='unsorted', ascending=True, content=None, cache=None, selected=None):
+    """Render a virtual directory in Kodi for a given plugin handle and path"""
+    from xbmcgui import ListItem
 
-    set_property('container.url', 'plugin://' + addon_id() + plugin.path)
-    xbmcplugin.setPluginFanart(handle=plugin.handle, image=from_unicode(addon_fanart()))
+    set_property('container.url', 'plugin://' + addon_id() + path)
+    xbmcplugin.setPluginFanart(handle=handle, image=from_unicode(addon_fanart()))
 
     usemenucaching = get_setting_bool('usemenucaching', default=True)
     if cache is None:
@@ -168,14 +261,14 @@ def show_listing(list_items, category=None, sort='unsorted', ascending=True, con
 
     if content:
         # content is one of: files, songs, artists, albums, movies, tvshows, episodes, musicvideos
-        xbmcplugin.setContent(plugin.handle, content=content)
+        xbmcplugin.setContent(handle, content=content)
 
     # Jump through hoops to get a stable breadcrumbs implementation
     category_label = ''
     if category:
         if not content:
             category_label = 'VRT MAX / '
-        if plugin.path.startswith(('/favorites/', '/resumepoints/')):
+        if path.startswith(('/favorites/', '/resumepoints/')):
             category_label += localize(30428) + ' / '  # My
         if isinstance(category, int):
             category_label += localize(category)
@@ -183,7 +276,7 @@ def show_listing(list_items, category=None, sort='unsorted', ascending=True, con
             category_label += category
     elif not content:
         category_label = 'VRT MAX'
-    xbmcplugin.setPluginCategory(handle=plugin.handle, category=category_label)
+    xbmcplugin.setPluginCategory(handle=handle, category=category_label)
 
     # FIXME: Since there is no way to influence descending order, we force it here
     if not ascending:
@@ -194,21 +287,30 @@ def show_listing(list_items, category=None, sort='unsorted', ascending=True, con
         sort = 'unsorted'
 
     # Add all sort methods to GUI (start with preferred)
-    xbmcplugin.addSortMethod(handle=plugin.handle, sortMethod=SORT_METHODS[sort])
+    xbmcplugin.addSortMethod(handle=handle, sortMethod=SORT_METHODS[sort])
     for key in sorted(SORT_METHODS):
         if key != sort:
-            xbmcplugin.addSortMethod(handle=plugin.handle, sortMethod=SORT_METHODS[key])
+            xbmcplugin.addSortMethod(handle=handle, sortMethod=SORT_METHODS[key])
 
     # FIXME: This does not appear to be working, we have to order it ourselves
-#    xbmcplugin.setProperty(handle=plugin.handle, key='sort.ascending', value='true' if ascending else 'false')
+#    xbmcplugin.setProperty(handle=handle, key='sort.ascending', value='true' if ascending else 'false')
 #    if ascending:
-#        xbmcplugin.setProperty(handle=plugin.handle, key='sort.order', value=str(SORT_METHODS[sort]))
+#        xbmcplugin.setProperty(handle=handle, key='sort.order', value=str(SORT_METHODS[sort]))
 #    else:
 #        # NOTE: When descending, use unsorted
-#        xbmcplugin.setProperty(handle=plugin.handle, key='sort.order', value=str(SORT_METHODS['unsorted']))
+#        xbmcplugin.setProperty(handle=handle, key='sort.order', value=str(SORT_METHODS['unsorted']))
 
     listing = []
     showfanart = get_setting_bool('showfanart', default=True)
+    # Shared templates, title items and their dicts are never modified so they can be shared as well
+    fanart = addon_fanart()
+    fanart_art_dict = {'fanart': fanart}
+    item_prop_dicts = {
+        # (is_playable, is_folder)
+        (True, False): {'IsInternetStream': 'true', 'IsPlayable': 'true', 'IsFolder': 'true'},
+        (False, True): {'IsInternetStream': 'false', 'IsPlayable': 'false', 'IsFolder': 'false'},
+        (False, False): {'IsInternetStream': 'false', 'IsPlayable': 'false', 'IsFolder': 'true'},
+    }
     for title_item in list_items:
         # Three options:
         #  - item is a virtual directory/folder (not playable, path)
@@ -219,20 +321,14 @@ def show_listing(list_items, category=None, sort='unsorted', ascending=True, con
 
         list_item = ListItem(label=title_item.label)
 
-        prop_dict = {
-            'IsInternetStream': 'true' if is_playable else 'false',
-            'IsPlayable': 'true' if is_playable else 'false',
-            'IsFolder': 'false' if is_folder else 'true',
-        }
+        prop_dict = item_prop_dicts[(is_playable, is_folder)]
         if title_item.prop_dict:
-            title_item.prop_dict.update(prop_dict)
-        else:
-            title_item.prop_dict = prop_dict
+            prop_dict = dict(title_item.prop_dict, **prop_dict)
         # NOTE: The setProperties method is new in Kodi18
         try:
-            list_item.setProperties(title_item.prop_dict)
+            list_item.setProperties(prop_dict)
         except AttributeError:
-            for key, value in list(title_item.prop_dict.items()):
+            for key, value in list(prop_dict.items()):
                 list_item.setProperty(key=key, value=str(value))
 
         # FIXME: The setIsFolder method is new in Kodi18, so we cannot use it just yet
@@ -241,10 +337,11 @@ def show_listing(list_items, category=None, sort='unsorted', ascending=True, con
         if showfanart:
             # Add add-on fanart when fanart is missing
             if not title_item.art_dict:
-                title_item.art_dict = {'fanart': addon_fanart()}
+                list_item.setArt(fanart_art_dict)
             elif not title_item.art_dict.get('fanart'):
-                title_item.art_dict.update(fanart=addon_fanart())
-            list_item.setArt(title_item.art_dict)
+                list_item.setArt(dict(title_item.art_dict, fanart=fanart))
+            else:
+                list_item.setArt(title_item.art_dict)
 
         if title_item.info_dict:
             # type is one of: video, music, pictures, game
@@ -270,8 +367,8 @@ def show_listing(list_items, category=None, sort='unsorted', ascending=True, con
 #        wnd = Window(getCurrentWindowId())
 #        wnd.getControl(wnd.getFocusId()).selectItem(selected)
 
-    succeeded = xbmcplugin.addDirectoryItems(plugin.handle, listing, len(listing))
-    xbmcplugin.endOfDirectory(plugin.handle, succeeded, updateListing=False, cacheToDisc=cache)
+    succeeded = xbmcplugin.addDirectoryItems(handle, listing, len(listing))
+    xbmcplugin.endOfDirectory(handle, succeeded, updateListing=False, cacheToDisc=cache)
 
 
 def play(stream, video=None):
@@ -423,10 +520,19 @@ def localize(string_id, **kwargs):
     """Return the translated string from the .po language files, optionally translating variables"""
     if not isinstance(string_id, int) and not string_id.isdecimal():
         return string_id
+    # Listings use the same strings for every item, so they are kept in the settings snapshot
+    string = get_snapshot_setting('localized', string_id, ADDON.getLocalizedString)
     if kwargs:
+        return safe_format(string, **kwargs)
+    return string
+
+
+def safe_format(template, **kwargs):
+    """Format a string with named variables, unknown variables are kept as placeholders"""
+    if not hasattr(safe_format, 'formatter'):
         from string import Formatter
-        return Formatter().vformat(ADDON.getLocalizedString(string_id), (), SafeDict(**kwargs))
-    return ADDON.getLocalizedString(string_id)
+        safe_format.formatter = Formatter()
+    return safe_format.formatter.vformat(template, (), SafeDict(**kwargs))
 
 
 def localize_time(time):
@@ -484,10 +590,36 @@ def localize_from_data(name, data):
     return next((localize(item.get('msgctxt')) for item in data if item.get('name') == name), name)
 
 
+def snapshot_settings():
+    """Start a new settings snapshot, so every setting and localized string is read from Kodi only once"""
+    global SETTINGS_SNAPSHOT  # pylint: disable=global-statement
+    SETTINGS_SNAPSHOT = {}
+
+
+def get_snapshot_setting(kind, key, getter):
+    """Get a setting from the settings snapshot, or from Kodi when it is not in the snapshot"""
+    # The service and the worker replace or clear the snapshot from other threads, so it is only looked up once
+    snapshot = SETTINGS_SNAPSHOT
+    if snapshot is None:
+        return getter(key)
+    try:
+        return snapshot[(kind, key)]
+    except KeyError:
+        value = snapshot[(kind, key)] = getter(key)
+        return value
+
+
+def clear_snapshot_settings():
+    """Clear the settings snapshot after changing a setting"""
+    snapshot = SETTINGS_SNAPSHOT
+    if snapshot:
+        snapshot.clear()
+
+
 def get_setting(key, default=None):
     """Get an add-on setting as string"""
     try:
-        value = to_unicode(ADDON.getSetting(key))
+        value = to_unicode(get_snapshot_setting('string', key, ADDON.getSetting))
     except RuntimeError:  # Occurs when the add-on is disabled
         return default
     if value == '' and default is not None:
@@ -498,7 +630,7 @@ def get_setting(key, default=None):
 def get_setting_bool(key, default=None):
     """Get an add-on setting as boolean"""
     try:
-        return ADDON.getSettingBool(key)
+        return get_snapshot_setting('bool', key, ADDON.getSettingBool)
     except (AttributeError, TypeError):  # On Krypton or older, or when not a boolean
         value = get_setting(key, default)
         if value not in ('false', 'true'):
@@ -511,7 +643,7 @@ def get_setting_bool(key, default=None):
 def get_setting_int(key, default=None):
     """Get an add-on setting as integer"""
     try:
-        return ADDON.getSettingInt(key)
+        return get_snapshot_setting('int', key, ADDON.getSettingInt)
     except (AttributeError, TypeError):  # On Krypton or older, or when not an integer
         value = get_setting(key, default)
         try:
@@ -535,11 +667,13 @@ def get_setting_float(key, default=None):
 
 def set_setting(key, value):
     """Set an add-on setting"""
+    clear_snapshot_settings()
     return ADDON.setSetting(key, from_unicode(str(value)))
 
 
 def set_setting_bool(key, value):
     """Set an add-on setting as boolean"""
+    clear_snapshot_settings()
     try:
         return ADDON.setSettingBool(key, value)
     except (AttributeError, TypeError):  # On Krypton or older, or when not a boolean
@@ -552,6 +686,7 @@ def set_setting_bool(key, value):
 
 def set_setting_int(key, value):
     """Set an add-on setting as integer"""
+    clear_snapshot_settings()
     try:
         return ADDON.setSettingInt(key, value)
     except (AttributeError, TypeError):  # On Krypton or older, or when not an integer
@@ -560,6 +695,7 @@ def set_setting_int(key, value):
 
 def set_setting_float(key, value):
     """Set an add-on setting"""
+    clear_snapshot_settings()
     try:
         return ADDON.setSettingNumber(key, value)
     except (AttributeError, TypeError):  # On Krypton or older, or when not a float
@@ -573,8 +709,7 @@ def open_settings():
 
 def get_global_setting(key):
     """Get a Kodi setting"""
-    result = jsonrpc(method='Settings.GetSettingValue', params={'setting': key})
-    return result.get('result', {}).get('value')
+    return get_snapshot_setting('global', key, lambda key: jsonrpc(method='Settings.GetSettingValue', params={'setting': key}).get('result', {}).get('value'))
 
 
 def get_advanced_setting(key, default=None):
@@ -789,6 +924,11 @@ def themecolour(kind):
 
 def colour(text):
     """Convert stub color bbcode into colors from the settings"""
+    return get_snapshot_setting('colour', text, apply_colour_theme)
+
+
+def apply_colour_theme(text):
+    """Convert stub color bbcode into the colors of the current theme"""
     theme = get_setting('colour_theme', 'dark')
     try:
         text = text.format(**COLOUR_THEMES.get(theme))
@@ -797,20 +937,45 @@ def colour(text):
     return text
 
 
-def get_cache_path(cache_file, cache_dir=DEFAULT_CACHE_DIR):
-    """Return a specified cache path"""
-    import os
-    cache_dir = get_cache_dir(cache_dir)
-    return os.path.join(cache_dir, cache_file)
-
-
 def get_cache_dir(cache_dir=DEFAULT_CACHE_DIR):
-    """Create and return a specified cache directory"""
+    """Return a specified legacy cache directory"""
     import os
     cache_dir = os.path.join(addon_profile(), cache_dir, '')
     return cache_dir
 
 
+def get_cache_store():
+    """Return the cache store, and use a static variable to remember"""
+    if hasattr(get_cache_store, 'cached'):
+        return getattr(get_cache_store, 'cached')
+    import os
+    from cachestore import CacheStore
+    profile = addon_profile()
+    if not exists(profile):
+        mkdirs(profile)
+    path = os.path.join(profile, CACHE_DATABASE)
+    is_new = not exists(path)
+    get_cache_store.cached = CacheStore(translate_path(path))
+    if is_new:
+        migrate_cache_files(get_cache_store.cached)
+    return get_cache_store.cached
+
+
+def migrate_cache_files(store):
+    """Move cache files from the legacy cache directories into the cache store"""
+    for cache_dir in (DEFAULT_CACHE_DIR, 'tokens'):
+        directory = get_cache_dir(cache_dir)
+        if not exists(directory):
+            continue
+        _, files = listdir(directory)
+        for filename in files:
+            with open_file(directory + filename, 'r') as fdesc:
+                data = fdesc.read()
+            store.set(cache_dir, filename, to_unicode(data), expiry=get_expiry(data))
+            delete(directory + filename)
+        log(2, "Migrated {count} cache files from '{path}'", count=len(files), path=directory)
+
+
 def get_addon_info(key):
     """Return addon information"""
     return to_unicode(ADDON.getAddonInfo(key))
@@ -944,6 +1109,9 @@ def execute_builtin(builtin):
 def end_of_directory():
     """Close a virtual directory, required to avoid a waiting Kodi"""
     from addon import plugin
+    if LISTING_CAPTURE is not None:
+        LISTING_CAPTURE.append(dict(end_of_directory=True))
+        return
     xbmcplugin.endOfDirectory(handle=plugin.handle, succeeded=False, updateListing=False, cacheToDisc=False)
 
 
@@ -972,8 +1140,7 @@ def log(level=1, message='', **kwargs):
     if not debug_logging and not (level <= max_log_level and max_log_level != 0):
         return
     if kwargs:
-        from string import Formatter
-        message = Formatter().vformat(message, (), SafeDict(**kwargs))
+        message = safe_format(message, **kwargs)
     message = '[{addon}] {message}'.format(addon=addon_id(), message=message)
     xbmc.log(from_unicode(message), level % 3 if debug_logging else 2)
 
@@ -986,8 +1153,7 @@ def log_access(argv):
 def log_error(message, **kwargs):
     """Log error messages to Kodi"""
     if kwargs:
-        from string import Formatter
-        message = Formatter().vformat(message, (), SafeDict(**kwargs))
+        message = safe_format(message, **kwargs)
     message = '[{addon}] {message}'.format(addon=addon_id(), message=message)
     xbmc.log(from_unicode(message), 4)
 
@@ -1041,79 +1207,54 @@ def get_cache(cache_file, ttl=None, cache_dir=DEFAULT_CACHE_DIR):  # pylint: dis
     if not get_setting_bool('usehttpcaching', default=True):
         return None
 
-    fullpath = get_cache_path(cache_file, cache_dir)
-    if not exists(fullpath):
+    with span('get_cache'):
+        data = get_cache_store().get(cache_dir, cache_file, ttl=ttl)
+    if data is None:
+        count('cache.miss')
         return None
+    count('cache.hit')
 
-    if ttl is not None:
-        from time import localtime, mktime
-        mtime = stat_file(fullpath).st_mtime()
-        now = mktime(localtime())
-        if now >= mtime + ttl:
-            return None
-
-#    if ttl is None:
-#        log(3, "Cache '{path}' is forced from cache.", path=path)
-#    else:
-#        log(3, "Cache '{path}' is fresh, expires in {time}.", path=path, time=human_delta(mtime + ttl - now))
-    with open_file(fullpath, 'r') as fdesc:
-        json = get_json_data(fdesc)
-
-    if json is None:
+    from json import loads
+    try:
+        with span('json.decode'):
+            json = loads(data)
+    except ValueError as exc:  # No JSON object could be decoded
+        log_error('JSON ValueError: {exc}', exc=exc)
         return None
-
-    if ttl is None and isinstance(json, dict):
-        expiration_date = json.get('expirationDate', None)
-        if expiration_date:
-            from datetime import datetime
-            import dateutil.parser
-            import dateutil.tz
-            now = datetime.now(dateutil.tz.tzlocal())
-            exp = dateutil.parser.parse(expiration_date)
-            if exp <= now:
-                log(2, "Cache expired: '{path}'", path=fullpath)
-                return None
-    log(2, "Got item from cache '{path}'", path=fullpath)
+    log(2, "Got item from cache '{dir}/{file}'", dir=cache_dir, file=cache_file)
     return json
 
 
-def update_cache(cache_file, data, cache_dir=DEFAULT_CACHE_DIR):
+def update_cache(cache_file, data, cache_dir=DEFAULT_CACHE_DIR, tag=None, ttl=None):  # pylint: disable=redefined-outer-name
     """Update the cache, if necessary"""
     if not get_setting_bool('usehttpcaching', default=True):
         return
 
-    fullpath = get_cache_path(cache_file, cache_dir)
-    if not exists(fullpath):
-        # Create cache directory if missing
-        directory = get_cache_dir(cache_dir)
-        if not exists(directory):
-            mkdirs(directory)
-        write_cache(fullpath, data)
-        return
+    log(3, "Write cache '{dir}/{file}'.", dir=cache_dir, file=cache_file)
+    with span('update_cache'):
+        get_cache_store().set(cache_dir, cache_file, to_unicode(data), ttl=ttl, expiry=get_expiry(data), tag=tag)
 
-    with open_file(fullpath, 'r') as fdesc:
-        cache = fdesc.read()
-
-    # Avoid writes if possible (i.e. SD cards)
-    if cache == data:
-        update_timestamp(fullpath)
-        return
 
-    write_cache(fullpath, data)
-
-
-def write_cache(fullpath, data):
-    """Write data to cache"""
-    log(3, "Write cache '{path}'.", path=fullpath)
-    with open_file(fullpath, 'w') as fdesc:
-        fdesc.write(data)
+def get_expiry(data):
+    """Return the expirationDate of cached data as a timestamp, or None"""
+    if 'expirationDate' not in data:
+        return None
+    from json import loads
+    try:
+        expiration_date = loads(data).get('expirationDate')
+    except (AttributeError, ValueError):
+        return None
+    if not expiration_date:
+        return None
+    from calendar import timegm
+    from utils import parse_iso8601
+    return timegm(parse_iso8601(expiration_date).utctimetuple())
 
 
-def update_timestamp(fullpath):
-    """Update a file's timestamp"""
-    from os import utime
-    log(3, "Cache '{path}' has not changed, updating mtime only.", path=fullpath)
-    utime(fullpath, None)
+def purge_caches():
+    """Remove expired and abandoned entries from the cache store"""
+    purged = get_cache_store().purge(CACHE_MAX_AGE)
+    log(2, 'Purged {count} cache entries', count=purged)
 
 
 def ttl(kind='direct'):
@@ -1125,16 +1266,146 @@ def ttl(kind='direct'):
     return 5 * 60
 
 
+def acquire_connection(key):
+    """Return an idle keep-alive connection from the connection pool, or None"""
+    from time import time
+    now = time()
+    with CONNECTION_POOL_LOCK:
+        entries = CONNECTION_POOL.get(key, [])
+        for entry in list(entries):
+            conn, response, last_used = entry
+            # Connections are only reusable when the previous response was read completely
+            if not response.isclosed():
+                continue
+            entries.remove(entry)
+            if conn.sock is None or now - last_used > CONNECTION_MAX_IDLE:
+                conn.close()
+                continue
+            return conn
+    return None
+
+
+def release_connection(key, conn, response):
+    """Return a keep-alive connection to the connection pool"""
+    from time import time
+    if response.will_close:
+        return
+    with CONNECTION_POOL_LOCK:
+        entries = CONNECTION_POOL.setdefault(key, [])
+        entries.append((conn, response, time()))
+        # Forget the oldest connections, they are closed when their response is garbage collected
+        del entries[:-CONNECTION_POOL_SIZE]
+
+
+def close_connections():
+    """Close all idle keep-alive connections"""
+    with CONNECTION_POOL_LOCK:
+        for entries in CONNECTION_POOL.values():
+            for conn, response, _ in entries:
+                if response.isclosed():
+                    conn.close()
+        CONNECTION_POOL.clear()
+
+
+def url_handlers():
+    """Return the urllib handler classes, they are only defined when a plugin invocation opens a url"""
+    if hasattr(url_handlers, 'cached'):
+        return url_handlers.cached
+    try:  # Python 3
+        from http.client import HTTPConnection, HTTPSConnection
+        from urllib.request import HTTPErrorProcessor, HTTPHandler, HTTPSHandler
+    except ImportError:  # Python 2
+        from httplib import HTTPConnection, HTTPSConnection
+        from urllib2 import HTTPErrorProcessor, HTTPHandler, HTTPSHandler
+
+    class NoRedirection(HTTPErrorProcessor):
+        """Prevent urllib from following http redirects"""
+
+        def http_response(self, request, response):
+            return response
+
+        https_response = http_response
+
+    class KeepAliveHTTPHandler(HTTPHandler):
+        """Open http connections using the shared keep-alive connection pool"""
+
+        def http_open(self, req):
+            return keepalive_open(self, HTTPConnection, req)
+
+    class KeepAliveHTTPSHandler(HTTPSHandler):
+        """Open https connections using the shared keep-alive connection pool"""
+
+        def https_open(self, req):
+            return keepalive_open(self, HTTPSConnection, req, context=getattr(self, '_context', None))
+
+    url_handlers.cached = NoRedirection, KeepAliveHTTPHandler, KeepAliveHTTPSHandler
+    return url_handlers.cached
+
+
+def keepalive_open(handler, http_class, req, **http_conn_args):
+    """Send a request over a pooled HTTP/1.1 keep-alive connection"""
+    if version_info < (3, 6, 0):  # Keep-alive connections require Python 3.6+
+        return handler.do_open(http_class, req, **http_conn_args)
+    from http.client import HTTPException
+    from urllib.error import URLError
+
+    host = req.host
+    if not host:
+        raise URLError('no host given')
+
+    headers = dict(req.unredirected_hdrs)
+    headers.update({key: val for key, val in req.headers.items() if key not in headers})
+    headers['Connection'] = 'keep-alive'
+    headers = {name.title(): val for name, val in headers.items()}
+
+    tunnel_headers = {}
+    if req._tunnel_host and 'Proxy-Authorization' in headers:  # pylint: disable=protected-access
+        tunnel_headers['Proxy-Authorization'] = headers.pop('Proxy-Authorization')
+
+    key = (http_class.__name__, host, req._tunnel_host)  # pylint: disable=protected-access
+    while True:
+        conn = acquire_connection(key)
+        reused = conn is not None
+        if conn is None:
+            conn = http_class(host, timeout=req.timeout, **http_conn_args)
+            if req._tunnel_host:  # pylint: disable=protected-access
+                conn.set_tunnel(req._tunnel_host, headers=tunnel_headers)  # pylint: disable=protected-access
+        try:
+            try:
+                conn.request(req.get_method(), req.selector, req.data, headers, encode_chunked=req.has_header('Transfer-encoding'))
+            except OSError as exc:  # timeout error
+                raise URLError(exc)
+            response = conn.getresponse()
+        except (HTTPException, OSError) as exc:
+            conn.close()
+            # The server may have closed an idle keep-alive connection, retry once on a new connection
+            if reused and isinstance(getattr(exc, 'reason', exc), (ConnectionError, HTTPException)):
+                log(3, 'Retrying request on a new connection: {url}', url=req.get_full_url())
+                continue
+            raise
+        break
+
+    release_connection(key, conn, response)
+    response.url = req.get_full_url()
+    response.msg = response.reason
+    return response
+
+
 def open_url(url, data=None, headers=None, method=None, cookiejar=None, follow_redirects=True, raise_errors=None):
-    """Return a urllib http response"""
+    """Return a urllib http response
+       raise_errors is a list of HTTP error codes to raise, 'all' to raise every HTTP error,
+       or 'network' to also raise connection errors instead of showing a dialog"""
+    from socket import timeout
+    from ssl import SSLError
     try:  # Python 3
         from urllib.error import HTTPError, URLError
         from urllib.parse import unquote
         from urllib.request import build_opener, HTTPCookieProcessor, ProxyHandler, Request
     except ImportError:  # Python 2
-        from urllib2 import build_opener, HTTPError, HTTPCookieProcessor, ProxyHandler, Request, URLError, unquote
+        from urllib2 import build_opener, HTTPError, HTTPCookieProcessor, ProxyHandler, Request, unquote, URLError
 
-    opener_args = []
+    NoRedirection, KeepAliveHTTPHandler, KeepAliveHTTPSHandler = url_handlers()  # pylint: disable=invalid-name
+    opener_args = [KeepAliveHTTPHandler(), KeepAliveHTTPSHandler()]
     if not follow_redirects:
         opener_args.append(NoRedirection)
     if cookiejar is not None:
@@ -1164,9 +1435,10 @@ def open_url(url, data=None, headers=None, method=None, cookiejar=None, follow_r
     if raise_errors is None:
         raise_errors = []
     try:
-        return opener.open(req)
+        with span('open_url'):
+            return opener.open(req)
     except HTTPError as exc:
-        if isinstance(raise_errors, list) and 401 in raise_errors or raise_errors == 'all':
+        if isinstance(raise_errors, list) and 401 in raise_errors or raise_errors in ('all', 'network'):
             raise
         if hasattr(req, 'selector'):  # Python 3.4+
             url_length = len(req.selector)
@@ -1197,10 +1469,14 @@ def open_url(url, data=None, headers=None, method=None, cookiejar=None, follow_r
         log_error('HTTP Error {code}: {reason}', code=exc.code, reason=exc.reason)
         return None
     except URLError as exc:
+        if raise_errors == 'network':
+            raise
         ok_dialog(heading=localize(30968), message=localize(30969))
         log_error('URLError: {error}\nurl: {url}', error=exc.reason, url=url)
         return None
     except SSLError as exc:
+        if raise_errors == 'network':
+            raise
         # TODO: Include the error message in the notification window
         ok_dialog(heading=localize(30968), message=localize(30969))
         if hasattr(exc, 'reason'):  # Python 2.7.9+, but still failed on Python 2.7.16
@@ -1211,6 +1487,8 @@ def open_url(url, data=None, headers=None, method=None, cookiejar=None, follow_r
             log_error('SSLError: {error}\nurl: {url}', error=str(exc), url=url)
         return None
     except timeout as exc:
+        if raise_errors == 'network':
+            raise
         ok_dialog(heading=localize(30968), message=localize(30969))
         log_error('Timeout: {error}\nurl: {url}', error=exc, url=url)
         return None
@@ -1218,11 +1496,14 @@ def open_url(url, data=None, headers=None, method=None, cookiejar=None, follow_r
 
 def get_json_data(response, fail=None):
     """Return json object from HTTP response"""
-    from json import load, loads
+    from json import loads
     try:
+        data = response.read()
+        count('json.bytes', len(data))
         if (3, 0, 0) <= version_info < (3, 6, 0):  # the JSON object must be str, not 'bytes'
-            return loads(to_unicode(response.read()))
-        return load(response)
+            data = to_unicode(data)
+        with span('json.decode'):
+            return loads(data)
     except TypeError as exc:  # 'NoneType' object is not callable
         log_error('JSON TypeError: {exc}', exc=exc)
         return fail
@@ -1252,38 +1533,117 @@ def generate_expiration_date(hours=2):
 
 
 def delete_cache(cache_file, cache_dir=DEFAULT_CACHE_DIR):
-    """Delete a cached file"""
-    path = get_cache_path(cache_file, cache_dir)
-    if exists(path):
-        delete(path)
+    """Delete a cache entry"""
+    return get_cache_store().delete(cache_dir, cache_file)
+
 
+def clear_caches(cache_dir=DEFAULT_CACHE_DIR):
+    """Delete all cache entries from a cache namespace"""
+    return get_cache_store().clear(cache_dir)
 
-def get_cached_url_json(url, cache, headers=None, ttl=None, fail=None):  # pylint: disable=redefined-outer-name
+
+def get_cached_url_json(url, cache, headers=None, ttl=None, fail=None, grace=CACHE_GRACE):  # pylint: disable=redefined-outer-name
     """Return data from cache, if any, else make an HTTP request"""
     # Get api data from cache if it is fresh
     json_data = get_cache(cache, ttl=ttl)
     if json_data is not None:
         return json_data
+    # Stale-while-revalidate: return expired data within the grace period and let the service refresh it
+    if ttl is not None and grace:
+        json_data = get_cache(cache, ttl=ttl + grace)
+        if json_data is not None:
+            queue_cache_refresh(url, cache, headers=headers)
+            return json_data
     return get_url_json(url, cache=cache, headers=headers, fail=fail)
 
 
+def get_conditional_url_json(url, cache, headers=None, ttl=None, fail=None):  # pylint: disable=redefined-outer-name
+    """Return data from cache if it is fresh, else revalidate the cached data using a conditional HTTP request"""
+    try:  # Python 3
+        from urllib.error import HTTPError
+    except ImportError:  # Python 2
+        from urllib2 import HTTPError
+    from json import dumps
+    json_data = get_cache(cache, ttl=ttl)
+    if json_data is not None:
+        return json_data
+
+    # The server only sends the data again when it changed since it was cached
+    stale_data = get_cache(cache)
+    request_headers = dict(headers or {})
+    validators = get_cache(cache, cache_dir=VALIDATORS_CACHE_DIR) if stale_data is not None else None
+    if validators:
+        if validators.get('etag'):
+            request_headers['If-None-Match'] = validators.get('etag')
+        if validators.get('last_modified'):
+            request_headers['If-Modified-Since'] = validators.get('last_modified')
+    try:
+        response = open_url(url, headers=request_headers, raise_errors='all')
+    except HTTPError as exc:
+        if exc.code == 304:
+            log(2, "Cache '{cache}' was not modified", cache=cache)
+            get_cache_store().touch(DEFAULT_CACHE_DIR, cache)
+            return stale_data
+        log_error('HTTP Error {code}: {reason}\nurl: {url}', code=exc.code, reason=exc.reason, url=url)
+        return fail if stale_data is None else stale_data
+    if not response:
+        return fail if stale_data is None else stale_data
+
+    json_data = get_json_data(response, fail=fail)
+    if json_data:
+        update_cache(cache, dumps(json_data))
+        etag = response.info().get('ETag')
+        last_modified = response.info().get('Last-Modified')
+        if etag or last_modified:
+            update_cache(cache, dumps(dict(etag=etag, last_modified=last_modified)), cache_dir=VALIDATORS_CACHE_DIR)
+    return json_data
+
+
+def queue_cache_refresh(url, cache, headers=None):
+    """Queue a stale cache to be refreshed by the service"""
+    from json import dumps
+    log(2, "Queue refresh of stale cache '{cache}'", cache=cache)
+    get_cache_store().queue_refresh(DEFAULT_CACHE_DIR, cache, url, dumps(headers or {}))
+
+
+def refresh_queued_caches():
+    """Refresh the stale caches that were queued for a refresh"""
+    from socket import timeout
+    from ssl import SSLError
+    try:  # Python 3
+        from urllib.error import HTTPError, URLError
+    except ImportError:  # Python 2
+        from urllib2 import HTTPError, URLError
+    from json import loads
+    for _, cache, url, headers in get_cache_store().pop_refreshes():
+        log(2, "Refresh stale cache '{cache}'", cache=cache)
+        # This runs in the background, so failures are logged instead of shown in a dialog
+        try:
+            get_url_json(url, cache=cache, headers=loads(headers), raise_errors='network')
+        except HTTPError as exc:
+            log_error("Failed to refresh cache '{cache}': HTTP Error {code}", cache=cache, code=exc.code)
+        except (URLError, SSLError, timeout) as exc:
+            log_error("Failed to refresh cache '{cache}': {error}", cache=cache, error=getattr(exc, 'reason', exc))
+
+
 def refresh_caches(cache_file=None):
     """Invalidate the needed caches and refresh container"""
     files = ['favorites.json', 'oneoff.json', 'resume_points.json']
     if cache_file and cache_file not in files:
         files.append(cache_file)
     invalidate_caches(*files)
+    from api import FAVORITE_CACHE_FAMILIES
+    invalidate_cache_tags(*FAVORITE_CACHE_FAMILIES)
     container_refresh()
     notification(message=localize(30981))
 
 
 def invalidate_caches(*caches):
-    """Invalidate multiple cache files"""
-    import fnmatch
-    _, files = listdir(get_cache_dir())
+    """Invalidate multiple cache entries using glob patterns"""
     # Invalidate caches related to menu list refreshes
-    removes = set()
-    for expr in caches:
-        removes.update(fnmatch.filter(files, expr))
-    for filename in removes:
-        delete(get_cache_path(filename))
+    get_cache_store().invalidate(DEFAULT_CACHE_DIR, *caches)
+
+
+def invalidate_cache_tags(*tags):
+    """Invalidate all cache entries with the given tags"""
+    get_cache_store().invalidate_tags(*tags)
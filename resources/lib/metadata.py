@@ -13,7 +13,7 @@ except ImportError:  # Python 2
 
 from data import CHANNELS, SECONDS_MARGIN
 from kodiutils import colour, get_setting_bool, localize, localize_datelong, log, url_for
-from utils import (find_entry, from_unicode, html_to_kodi, reformat_url,
+from utils import (find_entry, from_unicode, html_to_kodi, parse_iso8601, reformat_url,
                    reformat_image_url, shorten_link, to_unicode, unescape)
 
 
@@ -237,9 +237,8 @@ class Metadata:
         # VRT MAX Schedule API (some are missing vrt.whatson-id)
         if api_data.get('vrt.whatson-id') or api_data.get('startTime'):
             from datetime import timedelta
-            import dateutil.parser
-            start_time = dateutil.parser.parse(api_data.get('startTime'))
-            end_time = dateutil.parser.parse(api_data.get('endTime'))
+            start_time = parse_iso8601(api_data.get('startTime'))
+            end_time = parse_iso8601(api_data.get('endTime'))
             if end_time < start_time:
                 end_time = end_time + timedelta(days=1)
             return (end_time - start_time).total_seconds()
@@ -250,7 +249,6 @@ class Metadata:
     def get_plot(self, api_data, season=False, date=None):
         """Get plot string from single item json api data"""
         from datetime import datetime
-        import dateutil.parser
         import dateutil.tz
 
         # VRT MAX Search API
@@ -269,7 +267,7 @@ class Metadata:
             plot_meta = ''
             # Only display when a video disappears if it is within the next 3 months
             if api_data.get('offTime'):
-                offtime = dateutil.parser.parse(api_data.get('offTime'))
+                offtime = parse_iso8601(api_data.get('offTime'))
 
                 # Show the remaining days/hours the episode is still available
                 if offtime:
@@ -425,8 +423,7 @@ class Metadata:
 
         # VRT MAX Search API
         if api_data.get('episodeType'):
-            import dateutil.parser
-            return dateutil.parser.parse(api_data.get('onTime')).strftime('%d.%m.%Y')
+            return parse_iso8601(api_data.get('onTime')).strftime('%d.%m.%Y')
 
         # VRT MAX Suggest API
         if api_data.get('type') == 'program':
@@ -461,10 +458,8 @@ class Metadata:
 
         # VRT MAX Schedule API (some are missing vrt.whatson-id)
         if api_data.get('vrt.whatson-id') or api_data.get('startTime'):
-            from datetime import datetime
-            import dateutil.parser
             import dateutil.tz
-            aired = dateutil.parser.parse(api_data.get('startTime')).astimezone(dateutil.tz.UTC).strftime('%Y-%m-%d')
+            aired = parse_iso8601(api_data.get('startTime')).astimezone(dateutil.tz.UTC).strftime('%Y-%m-%d')
             return aired
 
         # Not Found
@@ -476,8 +471,7 @@ class Metadata:
 
         # VRT MAX Search API
         if api_data.get('episodeType'):
-            import dateutil.parser
-            return dateutil.parser.parse(api_data.get('onTime')).strftime('%Y-%m-%d %H:%M:%S')
+            return parse_iso8601(api_data.get('onTime')).strftime('%Y-%m-%d %H:%M:%S')
 
         # VRT MAX Suggest API
         if api_data.get('type') == 'program':
@@ -708,8 +702,7 @@ class Metadata:
                     ascending = False
 
             elif titletype == 'daily':
-                import dateutil.parser
-                label = '%s - %s' % (dateutil.parser.parse(api_data.get('onTime')).strftime('%d/%m'), label)
+                label = '%s - %s' % (parse_iso8601(api_data.get('onTime')).strftime('%d/%m'), label)
                 ascending = False
                 sort = 'dateadded'
 
@@ -762,7 +755,6 @@ class Metadata:
             It also compensates for TV-guides covering from 6AM to 6AM
        """
         from datetime import timedelta
-        import dateutil.parser
 
         if date == 'today':
             if now.hour < 6:
@@ -776,4 +768,4 @@ class Metadata:
             if now.hour < 6:
                 return now
             return now + timedelta(days=1)
-        return dateutil.parser.parse(date)
+        return parse_iso8601(date)
@@ -11,8 +11,8 @@ except ImportError:  # Python 2
     from urllib2 import HTTPError
 
 from data import SECONDS_MARGIN
-from kodiutils import (container_refresh, get_cache, get_setting_bool, get_url_json, has_credentials, invalidate_caches,
-                       localize, log, log_error, notification, open_url, update_cache)
+from kodiutils import (container_refresh, get_cache, get_setting_bool, get_url_json, has_credentials, invalidate_cache_tags,
+                       invalidate_caches, localize, log, log_error, notification, open_url, update_cache)
 
 
 class ResumePoints:
@@ -25,7 +25,7 @@ class ResumePoints:
 
     def __init__(self):
         """Initialize resumepoints, relies on XBMC vfs and a special VRT token"""
-        self._resumepoints = {}  # Our internal Resumepoints representation
+        self._resumepoints = {}  # Our internal Resumepoints representation, a mediaId to [position, total] index
         self._continue = {}  # Our internal continue status representation
 
     @staticmethod
@@ -43,14 +43,29 @@ class ResumePoints:
         if not self.is_activated():
             return
         resumepoints_json = get_cache(self.RESUMEPOINTS_CACHE_FILE, ttl)
-        if not resumepoints_json:
+        if resumepoints_json is None:
             resumepoints_url = self.RESUMEPOINTS_URL + '?max=500&sortBy=-updated'
             headers = self.resumepoints_headers()
             if not headers:
                 return
-            resumepoints_json = get_url_json(url=resumepoints_url, cache=self.RESUMEPOINTS_CACHE_FILE, headers=headers)
+            resumepoints_json = get_url_json(url=resumepoints_url, headers=headers)
+            if resumepoints_json is not None:
+                resumepoints_json = self._compact(resumepoints_json)
+                self._update_cache(resumepoints_json)
         if resumepoints_json is not None:
-            self._resumepoints = resumepoints_json
+            self._resumepoints = self._compact(resumepoints_json)
+
+    @staticmethod
+    def _compact(resumepoints_json):
+        """Return the compact resumepoints representation of a VRT MAX resumepoints response"""
+        if 'items' not in resumepoints_json:
+            return resumepoints_json
+        return {item.get('mediaId'): [item.get('at', 0), item.get('total', 100)] for item in resumepoints_json.get('items') or []}
+
+    def _update_cache(self, resumepoints_json):
+        """Store the compact resumepoints representation"""
+        from json import dumps
+        update_cache(self.RESUMEPOINTS_CACHE_FILE, dumps(resumepoints_json, separators=(',', ':')))
 
     def refresh_continue(self, ttl=None):
         """Get a cached copy or a newer continue list from VRT, or fall back to a cached file"""
@@ -128,21 +143,19 @@ class ResumePoints:
                 return False
 
             # Update local
-            for idx, item in enumerate(self._resumepoints.get('items')):
-                if item.get('mediaId') == video_id:
-                    self._resumepoints.get('items')[idx] = resumepoint_json
-                    break
-            update_cache(self.RESUMEPOINTS_CACHE_FILE, dumps(self._resumepoints))
+            resumepoint_json = resumepoint_json or {}
+            self._resumepoints[video_id] = [resumepoint_json.get('at', position), resumepoint_json.get('total', total)]
+            self._update_cache(self._resumepoints)
             if menu_caches:
                 invalidate_caches(*menu_caches)
+                self.invalidate_episode_caches()
         else:
 
             # Delete
             log(3, "[Resumepoints] Delete resumepoint '{asset_str}' {position}/{total}", asset_str=asset_str, position=position, total=total)
 
             # Do nothing if there is no resumepoint for this video_id
-            from json import dumps
-            if video_id not in dumps(self._resumepoints):
+            if video_id not in self._resumepoints:
                 log(3, "[Resumepoints] '{video_id}' not present, nothing to delete", video_id=video_id)
                 return True
 
@@ -159,24 +172,29 @@ class ResumePoints:
                 return False
 
             # Delete local representation and cache
-            for item in self._resumepoints.get('items'):
-                if item.get('mediaId') == video_id:
-                    self._resumepoints.get('items').remove(item)
-                    break
-
-            update_cache(self.RESUMEPOINTS_CACHE_FILE, dumps(self._resumepoints))
+            del self._resumepoints[video_id]
+            self._update_cache(self._resumepoints)
             if menu_caches:
                 invalidate_caches(*menu_caches)
+                self.invalidate_episode_caches()
         return True
 
+    @staticmethod
+    def invalidate_episode_caches():
+        """Invalidate the cached GraphQL listings that carry the resumepoints of their episodes"""
+        from api import RESUMEPOINT_CACHE_FAMILIES
+        invalidate_cache_tags(*RESUMEPOINT_CACHE_FAMILIES)
+
     def delete_continue(self, episode_id):
         """Delete a continue item from continue menu"""
         self._delete_continue_graphql(episode_id)
+        invalidate_cache_tags('continue')
         container_refresh()
 
     def finish_continue(self, episode_id):
         """Finish a continue item from continue menu"""
         self._finish_continue_graphql(episode_id)
+        self.invalidate_episode_caches()
         container_refresh()
 
     def _delete_continue_graphql(self, episode_id):
@@ -354,21 +372,11 @@ class ResumePoints:
 
     def get_position(self, video_id):
         """Return the stored position of a video"""
-        items = self._resumepoints.get('items')
-        if items:
-            for item in items:
-                if item.get('mediaId') == video_id:
-                    return item.get('at', 0)
-        return 0
+        return self._resumepoints.get(video_id, (0, 100))[0]
 
     def get_total(self, video_id):
         """Return the stored total length of a video"""
-        items = self._resumepoints.get('items')
-        if items:
-            for item in items:
-                if item.get('mediaId') == video_id:
-                    return item.get('total', 100)
-        return 100
+        return self._resumepoints.get(video_id, (0, 100))[1]
 
     def continue_ids(self):
         """Return all continue episode_id's"""
@@ -5,11 +5,12 @@
 from __future__ import absolute_import, division, unicode_literals
 from xbmc import Monitor
 from favorites import Favorites
-from kodiutils import container_refresh, log
+from kodiutils import container_refresh, get_setting_bool, log, purge_caches, refresh_queued_caches, snapshot_settings
 from playerinfo import PlayerInfo
 from resumepoints import ResumePoints
 from tokenresolver import TokenResolver
 from utils import to_unicode
+from worker import PluginWorker
 
 
 class VrtMonitor(Monitor, object):  # pylint: disable=useless-object-inheritance
@@ -17,17 +18,36 @@ class VrtMonitor(Monitor, object):  # pylint: disable=useless-object-inheritance
 
     def __init__(self):
         """VRT Monitor initialisation"""
+        snapshot_settings()
+        self._tokenresolver = TokenResolver()
         self._resumepoints = ResumePoints()
         self._playerinfo = None
         self._favorites = None
+        self._worker = PluginWorker()
         self.init_watching_activity()
         super(VrtMonitor, self).__init__()
 
     def run(self):
         """Main loop"""
+        purge_caches()
+        self.init_worker()
         while not self.abortRequested():
             if self.waitForAbort(10):
                 break
+            # Kodi does not notify about changes to global settings, so refresh the snapshot regularly
+            snapshot_settings()
+            # Refresh stale caches that plugin invocations served from cache
+            refresh_queued_caches()
+            # Refresh tokens before they expire, so plugin invocations never wait for the SSO service
+            self._tokenresolver.refresh_tokens()
+        self._worker.stop()
+
+    def init_worker(self):
+        """Start or stop the plugin worker depending on the settings"""
+        if get_setting_bool('usebackgroundworker', default=False):
+            self._worker.start()
+        else:
+            self._worker.stop()
 
     def init_watching_activity(self):
         """Only load components for watching activity when needed"""
@@ -61,11 +81,13 @@ class VrtMonitor(Monitor, object):  # pylint: disable=useless-object-inheritance
     def onSettingsChanged(self):  # pylint: disable=invalid-name
         """Handler for changes to settings"""
 
+        snapshot_settings()
         log(1, 'Settings changed')
-        TokenResolver().refresh_login()
+        self._tokenresolver.refresh_login()
 
         # Init watching activity again when settings change
         self.init_watching_activity()
+        self.init_worker()
 
         # Refresh container when settings change
         container_refresh()
@@ -125,8 +125,8 @@ class StreamService:
             is_single_start_timestamp = bool(re.match(rgx, begin))
             if begin and is_single_start_timestamp:
                 from datetime import datetime, timedelta
-                import dateutil.parser
-                begin_time = dateutil.parser.parse(begin)
+                from utils import parse_iso8601
+                begin_time = parse_iso8601(begin)
                 # Calculate end_time with a safety margin
                 end_time = begin_time + duration + timedelta(seconds=10)
                 # Add stop timestamp if a program is broadcasted completely
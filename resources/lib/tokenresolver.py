@@ -3,11 +3,12 @@
 """This module contains all functionality for VRT MAX API authentication."""
 
 from __future__ import absolute_import, division, unicode_literals
-from kodiutils import (addon_profile, delete, delete_cache, exists, get_cache, get_cache_dir, get_setting, open_url,
-                       get_url_json, has_credentials, invalidate_caches, listdir,
+from time import time
+from kodiutils import (addon_profile, clear_caches, clear_property, delete, delete_cache, get_cache, get_property,
+                       get_setting, open_url, get_url_json, has_credentials, invalidate_caches, listdir,
                        localize, log, log_error, notification, ok_dialog,
-                       open_settings, set_setting, update_cache)
-from utils import from_unicode
+                       open_settings, set_property, set_setting, update_cache)
+from utils import from_unicode, parse_iso8601
 
 try:  # Python 3
     from urllib.error import HTTPError
@@ -23,10 +24,21 @@ class TokenResolver:
     _SSO_REFRESH_URL = 'https://www.vrt.be/vrtnu/sso/refresh'
     _PLAYERTOKEN_URL = 'https://media-services-public.vrt.be/vualto-video-aggregator-web/rest/external/v2/tokens'
     _TOKEN_CACHE_DIR = 'tokens'
-
-    def __init__(self):
-        """Initialize Token Resolver class"""
-        self.token_dict = {}
+    # Tokens handed over from the service to plugin invocations using a window property
+    # Other add-ons can read window properties, so only short-lived tokens that expire are shared, never the long-lived video token
+    _SHARED_TOKENS = ('vrtnu-site_profile_at', 'vrtPlayerToken')
+    _SHARED_TOKENS_PROPERTY = 'vrtmax_tokens'
+    # Tokens the service refreshes before they expire
+    _REFRESH_TOKENS = (('vrtnu-site_profile_at', None), ('vrtPlayerToken', 'live'), ('vrtPlayerToken', 'ondemand'))
+    _REFRESH_MARGIN = 300
+    _REFRESH_RETRY = 120
+    # The key material of the VRT web player only changes with a new player release
+    _PLAYER_KEYS_CACHE = 'player_keys.json'
+    _PLAYER_KEYS_TTL = 7 * 24 * 60 * 60
+
+    # Shared by all instances, Kodi reuses the Python interpreter for plugin invocations
+    token_dict = {}
+    refresh_attempts = {}
 
     @staticmethod
     def _get_token_filename(name, variant=None):
@@ -46,37 +58,108 @@ class TokenResolver:
         name = keys[0]
 
         # Save to memory
-        self.token_dict[name] = token
+        cache_file = self._get_token_filename(name, variant)
+        expiry = self._get_token_expiry(token)
+        self.token_dict[cache_file] = (token, expiry)
+
+        # Hand over to other processes
+        if name in self._SHARED_TOKENS:
+            self._share_token(cache_file, token, expiry)
 
         # Save to disk
-        cache_file = self._get_token_filename(name, variant)
         from json import dumps
         update_cache(cache_file, dumps(token), self._TOKEN_CACHE_DIR)
 
+    def _share_token(self, cache_file, token, expiry):
+        """Hand over a token to other processes using a window property"""
+        if expiry is None:
+            return
+        shared_tokens = self._get_shared_tokens()
+        shared_tokens[cache_file] = dict(token=token, expiry=expiry)
+        from json import dumps
+        set_property(self._SHARED_TOKENS_PROPERTY, dumps(shared_tokens))
+
+    def _get_shared_tokens(self):
+        """Return the tokens handed over by other processes"""
+        shared_tokens = get_property(self._SHARED_TOKENS_PROPERTY)
+        if not shared_tokens:
+            return {}
+        from json import loads
+        try:
+            return loads(shared_tokens)
+        except ValueError:
+            return {}
+
+    @staticmethod
+    def _get_token_expiry(token):
+        """Return the expirationDate of a token as a timestamp"""
+        expiration_date = token.get('expirationDate')
+        if not expiration_date:
+            return None
+        from calendar import timegm
+        return timegm(parse_iso8601(expiration_date).utctimetuple())
+
     def _get_cached_token(self, name, variant=None):
         """Return a cached token"""
 
+        cache_file = self._get_token_filename(name, variant)
+        now = time()
+
         # Get from memory
-        if self.token_dict.get(name):
-            expiration_date = self.token_dict.get(name).get('expirationDate', None)
-            if expiration_date:
-                from datetime import datetime
-                import dateutil.parser
-                import dateutil.tz
-                now = datetime.now(dateutil.tz.tzlocal())
-                exp = dateutil.parser.parse(expiration_date)
-                if exp <= now:
-                    log(2, "Memory token expired: '{name}'", name=name)
-                    return None
-            return self.token_dict.get(name)
+        token, expiry = self.token_dict.get(cache_file, (None, None))
+        if token:
+            if expiry is None or expiry > now:
+                return token
+            log(2, "Memory token expired: '{name}'", name=name)
+            del self.token_dict[cache_file]
+
+        # Get from the service
+        if name in self._SHARED_TOKENS:
+            shared_token = self._get_shared_tokens().get(cache_file)
+            if shared_token and shared_token.get('expiry') and shared_token.get('expiry') > now:
+                self.token_dict[cache_file] = (shared_token.get('token'), shared_token.get('expiry'))
+                return shared_token.get('token')
 
         # Get from disk
-        cache_file = self._get_token_filename(name, variant)
         token = get_cache(cache_file, cache_dir=self._TOKEN_CACHE_DIR)
         if token:
+            expiry = self._get_token_expiry(token)
+            self.token_dict[cache_file] = (token, expiry)
+            if name in self._SHARED_TOKENS:
+                self._share_token(cache_file, token, expiry)
             return token
         return None
 
+    def _expires_soon(self, name, variant=None):
+        """Whether a cached token expires within the refresh margin, None if there is no cached token"""
+        token = self._get_cached_token(name, variant)
+        if not token:
+            return None
+        _, expiry = self.token_dict.get(self._get_token_filename(name, variant), (None, None))
+        return expiry is not None and expiry - time() < self._REFRESH_MARGIN
+
+    def refresh_tokens(self):
+        """Refresh cached tokens before they expire, this is run by the service"""
+        if not has_credentials():
+            return
+        # Tokens may have been renewed or deleted by a plugin invocation
+        self.token_dict.clear()
+        for name, variant in self._REFRESH_TOKENS:
+            if not self._expires_soon(name, variant):
+                continue
+            # Do not hammer the SSO service when refreshing fails
+            cache_file = self._get_token_filename(name, variant)
+            if time() - self.refresh_attempts.get(cache_file, 0) < self._REFRESH_RETRY:
+                continue
+            self.refresh_attempts[cache_file] = time()
+            log(2, "Refresh token '{name}' before it expires", name=cache_file)
+            if name == 'vrtPlayerToken':
+                self._get_playertoken(variant, roaming=False)
+                continue
+            refresh_token = self._get_cached_token('vrtnu-site_profile_rt')
+            if refresh_token:
+                self._get_fresh_token(refresh_token.get('vrtnu-site_profile_rt'), name)
+
     def _extract_tokens(self, response):
         """Extract tokens from http response"""
         tokens = []
@@ -101,7 +184,6 @@ class TokenResolver:
             return None
 
         # Get token dict from http header
-        import dateutil.parser
         cookie_name = cookie_data.split('=')[0]
         cookie_info = cookie_data.split(cookie_name + '=')[1].split('; ')
         expires = None
@@ -118,7 +200,7 @@ class TokenResolver:
 
         token_dictionary = {
             cookie_name: cookie_info[0],
-            'expirationDate': dateutil.parser.parse(expires).strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+            'expirationDate': parse_iso8601(expires).strftime('%Y-%m-%dT%H:%M:%S.%fZ')
         }
         return token_dictionary
 
@@ -246,6 +328,9 @@ class TokenResolver:
             response = open_url(self._SSO_REFRESH_URL, headers=headers, raise_errors=[401])
         except HTTPError:
             ok_dialog(heading=localize(30970), message=localize(30971))
+            return None
+        if not response:
+            return None
         tokens = self._extract_tokens(response)
         for token in tokens:
             if token.get(name):
@@ -256,128 +341,152 @@ class TokenResolver:
         """Get a vrtPlayerToken"""
         from json import dumps
         headers = {'Content-Type': 'application/json'}
-        playerinfo = self._generate_playerinfo()
-        payload = {
-            'playerInfo': playerinfo
-        }
+        payload = {}
         if roaming or variant == 'ondemand':
             if roaming:
                 # Delete cached vrtPlayerToken
                 cache_file = self._get_token_filename('vrtPlayerToken', variant)
+                self.token_dict.pop(cache_file, None)
                 delete_cache(cache_file, self._TOKEN_CACHE_DIR)
             videotoken = self.get_token('vrtnu-site_profile_vt')
             if videotoken is None:
                 return None
             payload['identityToken'] = videotoken
-        data = dumps(payload).encode()
-        playertoken = get_url_json(url=self._PLAYERTOKEN_URL, headers=headers, data=data)
-        if playertoken:
-            # Cache token
-            self._set_cached_token(playertoken, variant)
-            return playertoken
+        # Sign using the cached player keys first, rescrape the player only when signing fails
+        cached_keys = get_cache(self._PLAYER_KEYS_CACHE, ttl=self._PLAYER_KEYS_TTL)
+        for player_keys in (cached_keys, None) if cached_keys else (None,):
+            if player_keys is None:
+                player_keys = self._get_player_keys()
+                if player_keys is None:
+                    return None
+            payload['playerInfo'] = self._generate_playerinfo(player_keys)
+            data = dumps(payload).encode()
+            playertoken = get_url_json(url=self._PLAYERTOKEN_URL, headers=headers, data=data)
+            if playertoken and playertoken.get('vrtPlayerToken'):
+                # Cache token
+                self._set_cached_token(playertoken, variant)
+                return playertoken
+            log(2, 'Failed to get a vrtPlayerToken using player version {version}', version=player_keys.get('version'))
         return None
 
+    def _get_player_keys(self):
+        """Scrape and cache the key material of the VRT web player"""
+        player_keys = self._scrape_player_keys()
+        if player_keys:
+            from json import dumps
+            update_cache(self._PLAYER_KEYS_CACHE, dumps(player_keys))
+        return player_keys
+
     @staticmethod
-    def _generate_playerinfo():
-        """Generate playerinfo json for playertoken request"""
-        import time
-        from json import dumps
+    def _scrape_player_keys():
+        """Scrape the key id, secret and player version from the VRT web player scripts"""
         import base64
-        import hmac
-        import hashlib
         import re
+        from utils import run_concurrently
 
-        playerinfo = None
-        seen_urls = set()
-        result_urls = []
         base_url = 'https://player.vrt.be/vrtmax/js/player-lib.js'
         folder = '/'.join(base_url.split('/')[:-1])
-        player_version = '5.2.2'
-        atobs = None
-        kid = None
-        secret = None
-
-        main_script = open_url(base_url).read().decode('utf-8')
-        first_level_pattern = r'"\.(/[a-z0-9-/]+[a-z0-9]{8}\.js)";'
-        first_level_paths = re.findall(first_level_pattern, main_script)
-
-        for path in first_level_paths:
-            script_url = folder + path
-            if script_url in seen_urls:
-                continue
-            seen_urls.add(script_url)
 
-            if 'drm' in script_url or 'bootstrapper' in script_url:
-                result_urls.append(script_url)
+        def read_script(url):
+            """Return the content of a script"""
+            response = open_url(url)
+            if response is None:
+                return ''
+            return response.read().decode('utf-8')
+
+        def unique_urls(paths, seen_urls):
+            """Return the urls of unseen script paths"""
+            urls = []
+            for path in paths:
+                url = folder + path
+                if url not in seen_urls:
+                    seen_urls.add(url)
+                    urls.append(url)
+            return urls
 
-            script_content = open_url(script_url).read().decode('utf-8')
-            second_level_pattern = r'import\(\"\.(/[a-z0-9-]+\.js)\"\)'
-            second_level_paths = re.findall(second_level_pattern, script_content)
+        seen_urls = set()
+        main_script = read_script(base_url)
+        first_level_pattern = r'"\.(/[a-z0-9-/]+[a-z0-9]{8}\.js)";'
+        first_level_urls = unique_urls(re.findall(first_level_pattern, main_script), seen_urls)
 
-            for sub_path in second_level_paths:
-                sub_script_url = folder + sub_path
-                if sub_script_url in seen_urls:
-                    continue
-                seen_urls.add(sub_script_url)
+        second_level_pattern = r'import\(\"\.(/[a-z0-9-]+\.js)\"\)'
+        second_level_paths = []
+        for script_content in run_concurrently(read_script, first_level_urls):
+            second_level_paths.extend(re.findall(second_level_pattern, script_content))
+        second_level_urls = unique_urls(second_level_paths, seen_urls)
 
-                if 'drm' in sub_script_url or 'bootstrapper' in sub_script_url:
-                    result_urls.append(sub_script_url)
+        result_urls = [url for url in first_level_urls + second_level_urls if 'drm' in url or 'bootstrapper' in url]
 
+        player_version = '5.2.2'
+        atobs = None
         pattern_version = re.compile(r'\s"(\d{1}\.\d{1}\.\d{1}-[a-zA-Z0-9\-:]*)"')
         pattern_atob = re.compile(r'atob\(\"(==[A-Za-z0-9+/]*)\"')
-
-        for url in result_urls:
-            content = open_url(url).read().decode('utf-8')
+        for content in run_concurrently(read_script, result_urls):
             version_match = pattern_version.search(content)
             if version_match:
                 player_version = version_match.group(1)
-            atobs = pattern_atob.findall(content)
+            atobs = pattern_atob.findall(content) or atobs
 
-        if atobs:
+        if not atobs:
+            log_error('Failed to scrape the VRT web player keys')
+            return None
+        return dict(
             # first atob reversed
-            kid = base64.b64decode(atobs[0][::-1]).decode('utf-8')
+            kid=base64.b64decode(atobs[0][::-1]).decode('utf-8'),
             # last atob reversed
-            secret = base64.b64decode(atobs[-1][::-1]).decode('utf-8')
+            secret=base64.b64decode(atobs[-1][::-1]).decode('utf-8'),
+            version=player_version,
+        )
+
+    @staticmethod
+    def _generate_playerinfo(player_keys):
+        """Generate playerinfo json for playertoken request"""
+        from json import dumps
+        import base64
+        import hmac
+        import hashlib
 
-            log(2, kid)
-            log(2, secret)
+        kid = player_keys.get('kid')
+        secret = player_keys.get('secret')
+        log(2, kid)
+        log(2, secret)
 
-            # Generate JWT
-            segments = []
-            header = {
-                'alg': 'HS256',
-                'kid': kid
-            }
-            payload = {
-                'drm': {
-                    'widevine': 'L3'
-                },
-                'exp': round(time.time() + 3600, 3),
-                'platform': 'desktop',
-                'app': {
-                    'type': 'browser',
-                    'name': 'Firefox',
-                    'version': '137.0',
-                },
-                'device': 'undefined (undefined)',
-                'os': {
-                    'name': 'Linux',
-                    'version': 'x86_64',
-                },
-                'player': {
-                    'name': 'VRT web player',
-                    'version': player_version,
-                }
+        # Generate JWT
+        segments = []
+        header = {
+            'alg': 'HS256',
+            'kid': kid
+        }
+        payload = {
+            'drm': {
+                'widevine': 'L3'
+            },
+            'exp': round(time() + 3600, 3),
+            'platform': 'desktop',
+            'app': {
+                'type': 'browser',
+                'name': 'Firefox',
+                'version': '137.0',
+            },
+            'device': 'undefined (undefined)',
+            'os': {
+                'name': 'Linux',
+                'version': 'x86_64',
+            },
+            'player': {
+                'name': 'VRT web player',
+                'version': player_keys.get('version'),
             }
-            json_header = dumps(header).encode()
-            json_payload = dumps(payload).encode()
-            segments.append(base64.urlsafe_b64encode(json_header).rstrip(b'=').decode('utf-8'))
-            segments.append(base64.urlsafe_b64encode(json_payload).rstrip(b'=').decode('utf-8'))
-            signing_input = '.'.join(segments).encode()
-            signature = hmac.new(secret.encode(), signing_input, hashlib.sha256).digest()
-            segments.append(base64.urlsafe_b64encode(signature).rstrip(b'=').decode('utf-8'))
-            playerinfo = '.'.join(segments)
-            log(2, playerinfo)
+        }
+        json_header = dumps(header).encode()
+        json_payload = dumps(payload).encode()
+        segments.append(base64.urlsafe_b64encode(json_header).rstrip(b'=').decode('utf-8'))
+        segments.append(base64.urlsafe_b64encode(json_payload).rstrip(b'=').decode('utf-8'))
+        signing_input = '.'.join(segments).encode()
+        signature = hmac.new(secret.encode(), signing_input, hashlib.sha256).digest()
+        segments.append(base64.urlsafe_b64encode(signature).rstrip(b'=').decode('utf-8'))
+        playerinfo = '.'.join(segments)
+        log(2, playerinfo)
         return playerinfo
 
     def delete_tokens(self):
@@ -386,14 +495,13 @@ class TokenResolver:
         # FIXME: Deprecate and simplify this part in a future version
         _, files = listdir(addon_profile())
         token_files = [item for item in files if item.endswith('.tkn')]
-        # Empty userdata/tokens/ directory
-        tokens_path = get_cache_dir(self._TOKEN_CACHE_DIR)
-        if exists(tokens_path):
-            _, files = listdir(tokens_path)
-            token_files += ['tokens/' + item for item in files]
-        if token_files:
-            for item in token_files:
-                delete(addon_profile() + item)
+        for item in token_files:
+            delete(addon_profile() + item)
+        # Forget tokens in memory and tokens handed over by the service
+        self.token_dict.clear()
+        clear_property(self._SHARED_TOKENS_PROPERTY)
+        # Empty tokens cache
+        if clear_caches(self._TOKEN_CACHE_DIR) or token_files:
             notification(message=localize(30985))
 
     def refresh_login(self):
@@ -5,29 +5,52 @@
 
 from __future__ import absolute_import, division, unicode_literals
 from datetime import datetime, timedelta
-import dateutil.parser
-import dateutil.tz
+from time import time
 
 from data import CHANNELS, RELATIVE_DATES
-from favorites import Favorites
-from helperobjects import TitleItem
-from kodiutils import (colour, get_cached_url_json, get_url_json, has_addon, localize,
-                       localize_datelong, show_listing, themecolour, ttl, url_for)
-from metadata import Metadata
-from resumepoints import ResumePoints
-from utils import add_https_proto, find_entry, html_to_kodi, url_to_program
+from helperobjects import ScheduleIndex, TitleItem
+from kodiutils import (colour, get_cache, get_cached_url_json, get_conditional_url_json, get_setting_int, get_url_json, has_addon, localize,
+                       localize_datelong, show_listing, themecolour, ttl, update_cache, url_for)
+from utils import add_https_proto, find_entry, html_to_kodi, parse_iso8601, run_concurrently, url_to_program
+
+
+def localnow():
+    """Return the current local time, dateutil is only imported when the TV guide needs it"""
+    import dateutil.tz
+    return datetime.now(dateutil.tz.tzlocal())
 
 
 class TVGuide:
     """This implements a VRT TV-guide that offers Kodi menus and TV guide info"""
 
     VRT_TVGUIDE = 'https://www.vrt.be/bin/epg/schedule.%Y-%m-%d.json'
+    # Schedules are cached per date, so a stale schedule never outlives its date
+    SCHEDULE_CACHE = 'schedule.%Y-%m-%d.json'
+    # The converted EPG per date, with a hash of the schedule it was converted from
+    EPG_CACHE = 'epg.%Y-%m-%d.json'
+    STREAM_IDS_CACHE = 'stream_ids.json'
+    STREAM_IDS_BATCH = 50
+    STREAM_IDS_MAX = 5000
+    EPG_DAYS_BEFORE = 1
+    EPG_DAYS_AFTER = 1
 
     def __init__(self):
         """Initializes TV-guide object"""
-        self._favorites = Favorites()
-        self._resumepoints = ResumePoints()
-        self._metadata = Metadata(self._favorites, self._resumepoints)
+        self._favorites = None
+        self._resumepoints = None
+        self._metadata = None
+        self._stream_ids = None
+
+    def get_metadata(self):
+        """Return the metadata helper, favorites and resumepoints are only loaded for episode listings"""
+        if self._metadata is None:
+            from favorites import Favorites
+            from metadata import Metadata
+            from resumepoints import ResumePoints
+            self._favorites = Favorites()
+            self._resumepoints = ResumePoints()
+            self._metadata = Metadata(self._favorites, self._resumepoints)
+        return self._metadata
 
     def show_tvguide(self, date=None, channel=None):
         """Offer a menu depending on the information provided"""
@@ -58,7 +81,7 @@ class TVGuide:
     def get_date_items(channel=None):
         """Offer a menu to select the TV-guide date"""
 
-        epg = datetime.now(dateutil.tz.tzlocal())
+        epg = localnow()
         # Daily EPG information shows information from 6AM until 6AM
         if epg.hour < 6:
             epg += timedelta(days=-1)
@@ -87,7 +110,7 @@ class TVGuide:
             else:
                 path = url_for('tvguide', date=date)
 
-            cache_file = 'schedule.{date}.json'.format(date=date)
+            cache_file = day.strftime(TVGuide.SCHEDULE_CACHE)
             date_items.append(TitleItem(
                 label=label,
                 path=path,
@@ -103,7 +126,7 @@ class TVGuide:
     def get_channel_items(self, date=None, channel=None):
         """Offer a menu to select the channel"""
         if date:
-            now = datetime.now(dateutil.tz.tzlocal())
+            now = localnow()
             epg = self.parse(date, now)
             datelong = localize_datelong(epg)
 
@@ -150,14 +173,15 @@ class TVGuide:
 
     def get_episode_items(self, date, channel):
         """Show episodes for a given date and channel"""
-        now = datetime.now(dateutil.tz.tzlocal())
+        now = localnow()
         epg = self.parse(date, now)
         epg_url = epg.strftime(self.VRT_TVGUIDE)
 
+        metadata = self.get_metadata()
         self._favorites.refresh(ttl=ttl('indirect'))
         self._resumepoints.refresh(ttl=ttl('indirect'))
 
-        cache_file = 'schedule.{date}.json'.format(date=date)
+        cache_file = epg.strftime(self.SCHEDULE_CACHE)
         if date in ('today', 'yesterday', 'tomorrow'):
             schedule = get_cached_url_json(url=epg_url, cache=cache_file, ttl=ttl('indirect'), fail={})
         else:
@@ -168,11 +192,14 @@ class TVGuide:
             episodes = schedule.get(entry.get('id'), [])
         else:
             episodes = []
+        self.resolve_stream_ids([episode.get('episodeId') for episode in episodes if episode.get('url')])
+        schedule_index = ScheduleIndex(episodes)
+        timestamp = time()
         episode_items = []
-        for episode in episodes:
+        for pos, episode in enumerate(episodes):
             program = url_to_program(episode.get('url', ''))
-            context_menu, favorite_marker = self._metadata.get_context_menu(episode, program, cache_file)
-            label = self._metadata.get_label(episode)
+            context_menu, favorite_marker = metadata.get_context_menu(episode, program, cache_file)
+            label = metadata.get_label(episode)
             path = self.get_episode_path(episode, channel)
             # Playable item
             if '/play/' in path:
@@ -184,61 +211,88 @@ class TVGuide:
                 label = '[COLOR={greyedout}]%s[/COLOR]' % label
 
             # Now playing
-            start_date = dateutil.parser.parse(episode.get('startTime'))
-            end_date = dateutil.parser.parse(episode.get('endTime'))
-            if start_date <= now <= end_date:
+            start, end = schedule_index.times[pos] or (None, None)
+            if start is not None and start <= timestamp <= end:
                 if is_playable:
                     label = '[COLOR={highlighted}]%s[/COLOR] %s' % (label, localize(30301))
                 else:
                     label += localize(30301)
 
-            info_labels = self._metadata.get_info_labels(episode, date=date, channel=entry)
+            info_labels = metadata.get_info_labels(episode, date=date, channel=entry)
             # FIXME: Due to a bug in Kodi, ListItem.Title is used when Sort methods are used, not ListItem.Label
             info_labels['title'] = colour(label)
 
             episode_items.append(TitleItem(
                 label=colour(label),
                 path=path,
-                art_dict=self._metadata.get_art(episode),
+                art_dict=metadata.get_art(episode),
                 info_dict=info_labels,
                 context_menu=context_menu,
                 is_playable=is_playable,
             ))
         return episode_items
 
+    def get_stream_ids(self, episode_id=None):
+        """Get videoId and publicationId using VRT MAX GraphQL API"""
+        return self.resolve_stream_ids([episode_id]).get(episode_id, (None, None))
+
+    def resolve_stream_ids(self, episode_ids):
+        """Resolve videoId and publicationId for a list of episodeIds using batched GraphQL queries"""
+        if self._stream_ids is None:
+            self._stream_ids = get_cache(self.STREAM_IDS_CACHE) or {}
+
+        missing = []
+        for episode_id in episode_ids:
+            if episode_id and episode_id not in self._stream_ids and episode_id not in missing:
+                missing.append(episode_id)
+
+        resolved = {}
+        for idx in range(0, len(missing), self.STREAM_IDS_BATCH):
+            resolved.update(self.get_stream_ids_batch(missing[idx:idx + self.STREAM_IDS_BATCH]))
+
+        if resolved:
+            from json import dumps
+            self._stream_ids.update(resolved)
+            # Keep the id-mapping cache bounded, the oldest entries are dropped first
+            for episode_id in list(self._stream_ids)[:max(0, len(self._stream_ids) - self.STREAM_IDS_MAX)]:
+                del self._stream_ids[episode_id]
+            update_cache(self.STREAM_IDS_CACHE, dumps(self._stream_ids))
+
+        return {episode_id: tuple(self._stream_ids.get(episode_id, (None, None))) for episode_id in episode_ids}
+
     @staticmethod
-    def get_stream_ids(episode_id=None):
-        """Get videoId and publicationId using VRT MAX REST API"""
+    def get_stream_ids_batch(episode_ids):
+        """Get videoId and publicationId for multiple episodes with a single multi-alias GraphQL query"""
         from api import api_req
-        video_id = None
-        publication_id = None
         graphql_query = """
-            query Stream($id: ID!) {
-              catalogMember(id: $id) {
-                ...stream
-              }
-            }
-            fragment stream on Episode {
-              watchAction {
+            query StreamBatch({arguments}) {{
+              {aliases}
+            }}
+            fragment stream on Episode {{
+              watchAction {{
                 videoId
                 publicationId
-              }
-            }
-        """
-        operation_name = 'Stream'
-        variables = {
-            'id': episode_id
-        }
-        episode = api_req(graphql_query, operation_name, variables).get('data').get('catalogMember')
-        if episode:
-            video_id = episode.get('watchAction').get('videoId')
-            publication_id = episode.get('watchAction').get('publicationId')
-        return video_id, publication_id
+              }}
+            }}
+        """.format(
+            arguments=', '.join('$id%d: ID!' % idx for idx in range(len(episode_ids))),
+            aliases='\n'.join('e%d: catalogMember(id: $id%d) { ...stream }' % (idx, idx) for idx in range(len(episode_ids))),
+        )
+        operation_name = 'StreamBatch'
+        variables = {'id%d' % idx: episode_id for idx, episode_id in enumerate(episode_ids)}
+        data = (api_req(graphql_query, operation_name, variables) or {}).get('data') or {}
+        stream_ids = {}
+        for idx, episode_id in enumerate(episode_ids):
+            watch_action = (data.get('e%d' % idx) or {}).get('watchAction') or {}
+            # Only store resolved episodes, episodes that are not yet available are resolved again later
+            if watch_action.get('videoId'):
+                stream_ids[episode_id] = [watch_action.get('videoId'), watch_action.get('publicationId')]
+        return stream_ids
 
     def get_episode_path(self, episode, channel):
         """Return a playable plugin:// path for an episode"""
-        now = datetime.now(dateutil.tz.tzlocal())
-        end_date = dateutil.parser.parse(episode.get('endTime'))
+        now = localnow()
+        end_date = parse_iso8601(episode.get('endTime'))
         if episode.get('url') and episode.get('episodeId'):
             video_id, publication_id = self.get_stream_ids(episode_id=episode.get('episodeId'))
             return url_for('play_id', video_id=video_id, publication_id=publication_id)
@@ -246,40 +300,115 @@ class TVGuide:
             return url_for('play_air_date', channel, episode.get('startTime')[:19], episode.get('endTime')[:19])
         return url_for('noop', episode_id=episode.get('episodeId', ''))
 
-    def get_epg_data(self):
+    def get_epg_data(self, days_before=None, days_after=None):
         """Return EPG data"""
-        now = datetime.now(dateutil.tz.tzlocal())
+        return dict(self.iter_epg_data(days_before=days_before, days_after=days_after))
+
+    def iter_epg_data(self, days_before=None, days_after=None):
+        """Yield the EPG data one channel at a time, so the EPG of all channels is never built in memory"""
+        from json import dumps
+        if days_before is None:
+            days_before = get_setting_int('iptv.epg_days_before', default=self.EPG_DAYS_BEFORE)
+        if days_after is None:
+            days_after = get_setting_int('iptv.epg_days_after', default=self.EPG_DAYS_AFTER)
+        today = self.parse('today', localnow())
+        days = [today + timedelta(days=offset) for offset in range(-days_before, days_after + 1)]
+        epg_days = run_concurrently(lambda epg: self.get_epg_day(epg, today), days)
+
+        # Only convert the days that changed since they were stored
+        changed = [(epg, epg_day) for epg, epg_day in zip(days, epg_days) if epg_day.get('schedule') is not None]
+        if changed:
+            # Resolve the stream ids of all changed days up front instead of one GraphQL request per EPG entry
+            stream_ids = self.resolve_stream_ids([episode.get('episodeId')
+                                                  for _, epg_day in changed for episodes in epg_day.get('schedule').values() for episode in episodes
+                                                  if episode.get('url') and episode.get('episodeId')])
+            for epg, epg_day in changed:
+                schedule = epg_day.pop('schedule')
+                epg_day.update(self.convert_epg_day(schedule, stream_ids))
+                # An empty or failed schedule is not stored, so the day is fetched again on the next refresh
+                if schedule:
+                    update_cache(epg.strftime(self.EPG_CACHE), dumps(epg_day))
+
+        epg_ids = []
+        for epg_day in epg_days:
+            for epg_id in epg_day.get('epg_ids'):
+                if epg_id not in epg_ids:
+                    epg_ids.append(epg_id)
+
+        for epg_id in epg_ids:
+            programmes = []
+            for epg_day in epg_days:
+                programmes.extend(epg_day.get('channels').get(epg_id, []))
+            yield epg_id, programmes
+
+    def get_epg_day(self, epg, today):
+        """Return the stored EPG of a day, or its schedule when the stored EPG is outdated"""
+        from hashlib import sha1
+        from json import dumps
+        # Past schedules never change, so a complete EPG of a past day that was stored after the day ended is final
+        if epg.date() < today.date():
+            epg_day = get_cache(epg.strftime(self.EPG_CACHE), ttl=self.since_day_end(epg))
+            if epg_day and epg_day.get('complete'):
+                return epg_day
+        epg_day = get_cache(epg.strftime(self.EPG_CACHE))
+
+        schedule = self.get_schedule(epg, today)
+        # Keep the stored EPG when the schedule could not be fetched
+        if not schedule and epg_day:
+            return epg_day
+        schedule_hash = sha1(dumps(schedule, sort_keys=True).encode('utf-8')).hexdigest()
+        if epg_day and epg_day.get('complete') and epg_day.get('hash') == schedule_hash:
+            return epg_day
+        return dict(hash=schedule_hash, schedule=schedule)
 
-        epg_data = {}
-        for date in ['yesterday', 'today', 'tomorrow']:
-            epg = self.parse(date, now)
-            epg_url = epg.strftime(self.VRT_TVGUIDE)
-            schedule = get_url_json(url=epg_url, fail={})
-            for channel_id, episodes in list(schedule.items()):
-                channel = find_entry(CHANNELS, 'id', channel_id)
-                epg_id = channel.get('epg_id')
-                if epg_id not in epg_data:
-                    epg_data[epg_id] = []
-                for episode in episodes:
-                    if episode.get('url') and episode.get('episodeId'):
-                        video_id, publication_id = self.get_stream_ids(episode_id=episode.get('episodeId'))
-                        path = url_for('play_id', video_id=video_id, publication_id=publication_id)
-                    else:
-                        path = None
-                    epg_data[epg_id].append({
-                        'start': episode.get('startTime'),
-                        'stop': episode.get('endTime'),
-                        'image': add_https_proto(episode.get('image', '')),
-                        'title': episode.get('title'),
-                        'subtitle': html_to_kodi(episode.get('subtitle', '')),
-                        'description': html_to_kodi(episode.get('description', '')),
-                        'stream': path,
-                    })
-        return epg_data
+    @staticmethod
+    def convert_epg_day(schedule, stream_ids):
+        """Convert the schedule of a day to the IPTV Manager EPG format"""
+        epg_ids = []
+        channels = {}
+        complete = bool(schedule)
+        for channel_id, episodes in list(schedule.items()):
+            epg_id = find_entry(CHANNELS, 'id', channel_id).get('epg_id')
+            if epg_id not in channels:
+                epg_ids.append(epg_id)
+                channels[epg_id] = []
+            for episode in episodes:
+                if episode.get('url') and episode.get('episodeId'):
+                    video_id, publication_id = stream_ids.get(episode.get('episodeId'))
+                    # Episodes that are not yet available are resolved again on the next refresh
+                    complete = complete and video_id is not None
+                    path = url_for('play_id', video_id=video_id, publication_id=publication_id)
+                else:
+                    path = None
+                channels[epg_id].append({
+                    'start': episode.get('startTime'),
+                    'stop': episode.get('endTime'),
+                    'image': add_https_proto(episode.get('image', '')),
+                    'title': episode.get('title'),
+                    'subtitle': html_to_kodi(episode.get('subtitle', '')),
+                    'description': html_to_kodi(episode.get('description', '')),
+                    'stream': path,
+                })
+        return dict(epg_ids=epg_ids, channels=channels, complete=complete)
+
+    def get_schedule(self, epg, today):
+        """Return the schedule of an EPG day"""
+        epg_url = epg.strftime(self.VRT_TVGUIDE)
+        cache_file = epg.strftime(self.SCHEDULE_CACHE)
+        if epg.date() < today.date():
+            # Past schedules never change once the day ended, a schedule cached before that is revalidated once
+            return get_conditional_url_json(url=epg_url, cache=cache_file, ttl=self.since_day_end(epg), fail={})
+        return get_conditional_url_json(url=epg_url, cache=cache_file, ttl=ttl('indirect'), fail={})
+
+    @staticmethod
+    def since_day_end(epg):
+        """Return the number of seconds since an EPG day ended, EPG days run from 6AM until 6AM"""
+        day_end = epg.replace(hour=6, minute=0, second=0, microsecond=0) + timedelta(days=1)
+        return max(0, int((localnow() - day_end).total_seconds()))
 
     def playing_now(self, channel):
         """Return the EPG information for what is playing now"""
-        now = datetime.now(dateutil.tz.tzlocal())
+        now = localnow()
         epg = now
         # Daily EPG information shows information from 6AM until 6AM
         if epg.hour < 6:
@@ -289,20 +418,17 @@ class TVGuide:
         if not entry:
             return ''
 
+        schedule_index = self.get_schedule_index(epg, entry.get('id'))
+        idx = schedule_index.playing(time())
+        if idx is None:
+            return ''
+        return schedule_index.episodes[idx].get('title')
+
+    def get_schedule_index(self, epg, channel_id):
+        """Return a schedule index of a channel for the EPG day of a given date"""
         epg_url = epg.strftime(self.VRT_TVGUIDE)
-        schedule = get_cached_url_json(url=epg_url, cache='schedule.today.json', ttl=ttl('indirect'), fail={})
-        episodes = iter(schedule.get(entry.get('id'), []))
-
-        while True:
-            try:
-                episode = next(episodes)
-            except StopIteration:
-                break
-            start_date = dateutil.parser.parse(episode.get('startTime'))
-            end_date = dateutil.parser.parse(episode.get('endTime'))
-            if start_date <= now <= end_date:  # Now playing
-                return episode.get('title')
-        return ''
+        schedule = get_cached_url_json(url=epg_url, cache=epg.strftime(self.SCHEDULE_CACHE), ttl=ttl('indirect'), fail={})
+        return ScheduleIndex(schedule.get(channel_id, []))
 
     @staticmethod
     def episode_description(episode):
@@ -311,7 +437,7 @@ class TVGuide:
 
     def live_description(self, channel):
         """Return the EPG information for current and next live program"""
-        now = datetime.now(dateutil.tz.tzlocal())
+        now = localnow()
         epg = now
         # Daily EPG information shows information from 6AM until 6AM
         if epg.hour < 6:
@@ -321,36 +447,25 @@ class TVGuide:
         if not entry:
             return ''
 
-        epg_url = epg.strftime(self.VRT_TVGUIDE)
-        schedule = get_cached_url_json(url=epg_url, cache='schedule.today.json', ttl=ttl('indirect'), fail={})
-        episodes = iter(schedule.get(entry.get('id'), []))
+        schedule_index = self.get_schedule_index(epg, entry.get('id'))
+        episodes = schedule_index.episodes
+        timestamp = time()
 
         description = ''
-        episode = None
-        while True:
-            try:
-                episode = next(episodes)
-            except StopIteration:
-                break
-            start_date = dateutil.parser.parse(episode.get('startTime'))
-            end_date = dateutil.parser.parse(episode.get('endTime'))
-            if start_date <= now <= end_date:  # Now playing
-                description = '[COLOR={highlighted}][B]%s[/B] %s[/COLOR]\n' % (localize(30421), self.episode_description(episode))
-                try:
-                    description += '[B]%s[/B] %s' % (localize(30422), self.episode_description(next(episodes)))
-                except StopIteration:
-                    break
-                break
-            if now < start_date:  # Nothing playing now, but this may be next
-                description = '[B]%s[/B] %s\n' % (localize(30422), self.episode_description(episode))
-                try:
-                    description += '[B]%s[/B] %s' % (localize(30422), self.episode_description(next(episodes)))
-                except StopIteration:
-                    break
-                break
-        if episode and not description:
+        idx = schedule_index.playing(timestamp)
+        if idx is not None:  # Now playing
+            description = '[COLOR={highlighted}][B]%s[/B] %s[/COLOR]\n' % (localize(30421), self.episode_description(episodes[idx]))
+            if idx + 1 < len(episodes):
+                description += '[B]%s[/B] %s' % (localize(30422), self.episode_description(episodes[idx + 1]))
+        else:
+            idx = schedule_index.upcoming(timestamp)
+            if idx is not None:  # Nothing playing now, but this may be next
+                description = '[B]%s[/B] %s\n' % (localize(30422), self.episode_description(episodes[idx]))
+                if idx + 1 < len(episodes):
+                    description += '[B]%s[/B] %s' % (localize(30422), self.episode_description(episodes[idx + 1]))
+        if episodes and not description:
             # Add a final 'No transmission' program
-            description = '[COLOR={highlighted}][B]%s[/B] %s - 06:00\n» %s[/COLOR]' % (localize(30421), episode.get('end'), localize(30423))
+            description = '[COLOR={highlighted}][B]%s[/B] %s - 06:00\n» %s[/COLOR]' % (localize(30421), episodes[-1].get('end'), localize(30423))
         return colour(description)
 
     @staticmethod
@@ -361,7 +476,7 @@ class TVGuide:
        """
         entry = find_entry(RELATIVE_DATES, 'id', date)
         if not entry:
-            return dateutil.parser.parse(date)
+            return parse_iso8601(date)
 
         offset = entry.get('offset')
         if now.hour < 6:
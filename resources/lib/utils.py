@@ -28,6 +28,8 @@ HTML_MAPPING = [
     (re.compile('(&nbsp;\n){2,}', re.I), '\n'),  # Remove repeating non-blocking spaced newlines
 ]
 
+BACKGROUND_THREADS = []  # Threads started by run_in_background
+
 
 def to_unicode(text, encoding='utf-8', errors='strict'):
     """Force text to unicode"""
@@ -235,3 +237,108 @@ def youtube_to_plugin_url(url):
     if not url.endswith('/'):
         url += '/'
     return url
+
+
+def run_concurrently(func, items, max_workers=4):
+    """Call func for every item on a small pool of threads and return the results in order"""
+    from threading import Thread
+    items = list(items)
+    results = [None] * len(items)
+    if len(items) <= 1 or max_workers <= 1:
+        return [func(item) for item in items]
+
+    queue = list(enumerate(items))
+    errors = []
+
+    def worker():
+        """Process queued items until the queue is empty"""
+        while True:
+            try:
+                idx, item = queue.pop(0)
+            except IndexError:
+                return
+            try:
+                results[idx] = func(item)
+            except Exception as exc:  # pylint: disable=broad-except
+                errors.append(exc)
+
+    threads = [Thread(target=worker) for _ in range(min(max_workers, len(items)))]
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # Raise the first exception in the calling thread, like a sequential loop would
+    if errors:
+        raise errors[0]
+    return results
+
+
+def run_in_background(func, *args):
+    """Call func on a daemon thread, plugin invocations wait for it briefly using wait_for_background"""
+    from threading import Thread
+    thread = Thread(target=func, args=args)
+    thread.daemon = True
+    thread.start()
+    # The long-running service never waits for its threads, so forget the finished ones
+    BACKGROUND_THREADS[:] = [background for background in BACKGROUND_THREADS if background.is_alive()]
+    BACKGROUND_THREADS.append(thread)
+    return thread
+
+
+def wait_for_background(timeout):
+    """Wait for background threads until they are done or the timeout expires"""
+    from timeit import default_timer
+    deadline = default_timer() + timeout
+    while BACKGROUND_THREADS:
+        BACKGROUND_THREADS.pop(0).join(max(0, deadline - default_timer()))
+
+
+ISO8601_PATTERN = re.compile(r'^(\d{4})-(\d{2})-(\d{2})(?:[T ](\d{2}):(\d{2})(?::(\d{2})(?:[.,](\d{1,6})\d*)?)?)?(?:(Z)|([+-])(\d{2}):?(\d{2}))?$')
+ISO8601_CACHE_SIZE = 4096
+
+
+def iso8601_tz(offset):
+    """Return a fixed offset timezone for an offset in minutes"""
+    if not hasattr(iso8601_tz, 'cached'):
+        iso8601_tz.cached = {}
+    tzinfo = iso8601_tz.cached.get(offset)
+    if tzinfo is None:
+        try:  # Python 3
+            from datetime import timedelta, timezone
+            tzinfo = timezone.utc if offset == 0 else timezone(timedelta(minutes=offset))
+        except ImportError:  # Python 2
+            import dateutil.tz
+            tzinfo = dateutil.tz.UTC if offset == 0 else dateutil.tz.tzoffset(None, offset * 60)
+        iso8601_tz.cached[offset] = tzinfo
+    return tzinfo
+
+
+def parse_iso8601(value):
+    """Parse an ISO 8601 timestamp as returned by the VRT APIs, other formats are parsed by dateutil"""
+    if not hasattr(parse_iso8601, 'cached'):
+        parse_iso8601.cached = {}
+    result = parse_iso8601.cached.get(value)
+    if result is not None:
+        return result
+
+    match = ISO8601_PATTERN.match(value)
+    if match:
+        from datetime import datetime
+        year, month, day, hour, minute, second, fraction, utc, sign, tz_hour, tz_minute = match.groups()
+        tzinfo = None
+        if utc:
+            tzinfo = iso8601_tz(0)
+        elif sign:
+            offset = int(tz_hour) * 60 + int(tz_minute)
+            tzinfo = iso8601_tz(-offset if sign == '-' else offset)
+        result = datetime(int(year), int(month), int(day), int(hour or 0), int(minute or 0), int(second or 0),
+                          int((fraction or '0').ljust(6, '0')), tzinfo)
+    else:
+        import dateutil.parser
+        result = dateutil.parser.parse(value)
+
+    if len(parse_iso8601.cached) >= ISO8601_CACHE_SIZE:
+        parse_iso8601.cached.clear()
+    parse_iso8601.cached[value] = result
+    return result
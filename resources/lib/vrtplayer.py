@@ -294,13 +294,31 @@ class VRTPlayer:
         """A wrapper for playing video items"""
         from tokenresolver import TokenResolver
         from streamservice import StreamService
+        prefetch = None
+        if video.get('episode_id') and VRTPlayer.resumepoints_is_activated():
+            # The service needs this episode's data for resumepoints and Up Next, so fetch it while resolving the stream
+            from threading import Thread
+            prefetch = Thread(target=VRTPlayer.prefetch_episode_data, args=(video.get('episode_id'),))
+            prefetch.daemon = True
+            prefetch.start()
         _tokenresolver = TokenResolver()
         _streamservice = StreamService(_tokenresolver)
         stream = _streamservice.get_stream(video)
-        if stream is None:
+        if stream is not None:
+            play(stream, video.get('listitem'))
+        else:
             end_of_directory()
-            return
-        play(stream, video.get('listitem'))
+        if prefetch:
+            prefetch.join(10)
+
+    @staticmethod
+    def prefetch_episode_data(episode_id):
+        """Fetch episode data, so it can be shared with the service"""
+        from api import get_single_episode_data
+        try:
+            get_single_episode_data(episode_id)
+        except Exception as exc:  # pylint: disable=broad-except
+            log_error('Prefetching episode data for {episode_id} failed: {exc}', episode_id=episode_id, exc=exc)
 
     @staticmethod
     def favorites_is_activated():
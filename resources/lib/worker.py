@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+# GNU General Public License v3.0 (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+"""Implements a plugin worker in the VRT MAX service and the client that forwards plugin invocations to it"""
+
+from __future__ import absolute_import, division, unicode_literals
+import re
+from threading import Lock, Thread
+
+WORKER_PROPERTY = 'vrtmax_worker'
+WORKER_HOST = '127.0.0.1'
+WORKER_CONNECT_TIMEOUT = 0.5
+WORKER_TIMEOUT = 30
+
+# Only listings without side-effects are forwarded, everything else runs in the plugin invocation itself
+WORKER_ROUTES = re.compile(r'^/(favorites(/(programs|recent|offline)(/[^/]+)?)?|resumepoints/continue(/[^/]+)?'
+                           r'|programs/.+|categories(/.+)?|channels(/.+)?|livetv|recent(/[^/]+)?|offline(/[^/]+)?'
+                           r'|featured(/.+)?|tvguide(/.+)?)?$')
+
+
+def read_message(conn):
+    """Read a newline terminated JSON message from a socket"""
+    from json import loads
+    data = b''
+    while not data.endswith(b'\n'):
+        chunk = conn.recv(65536)
+        if not chunk:
+            break
+        data += chunk
+    if not data:
+        return None
+    return loads(data.decode('utf-8'))
+
+
+def write_message(conn, message):
+    """Write a newline terminated JSON message to a socket"""
+    from json import dumps
+    conn.sendall(dumps(message).encode('utf-8') + b'\n')
+
+
+class PluginWorker:
+    """A worker in the service process that runs forwarded plugin invocations with warm module state and caches"""
+
+    def __init__(self):
+        """Initialize the plugin worker, the worker is not listening until started"""
+        self._sock = None
+        self._secret = None
+        self._thread = None
+        self._lock = Lock()
+
+    def is_running(self):
+        """Whether the worker is listening for plugin invocations"""
+        return self._sock is not None
+
+    def start(self):
+        """Start listening on a local port and publish it for plugin invocations"""
+        if self.is_running():
+            return
+        import socket
+        from binascii import hexlify
+        from os import urandom
+        from kodiutils import log, set_property
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.bind((WORKER_HOST, 0))
+        sock.listen(5)
+        self._sock = sock
+        # Only plugin invocations that can read the window property can use the worker
+        self._secret = hexlify(urandom(16)).decode('ascii')
+        self._thread = Thread(target=self.serve, args=(sock,))
+        self._thread.daemon = True
+        self._thread.start()
+        set_property(WORKER_PROPERTY, '%d:%s' % (sock.getsockname()[1], self._secret))
+        log(2, 'Plugin worker listening on port {port}', port=sock.getsockname()[1])
+
+    def stop(self):
+        """Stop listening and withdraw the published port"""
+        from kodiutils import clear_property
+        clear_property(WORKER_PROPERTY)
+        sock, self._sock = self._sock, None
+        if sock is not None:
+            sock.close()
+
+    def serve(self, sock):
+        """Accept plugin invocations until the worker is stopped"""
+        import socket
+        while self._sock is sock:
+            try:
+                conn, _ = sock.accept()
+            except (OSError, socket.error):  # The listening socket was closed
+                break
+            Thread(target=self.handle, args=(conn,)).start()
+
+    def handle(self, conn):
+        """Run a forwarded plugin invocation and return the captured listing"""
+        from kodiutils import log_error
+        try:
+            conn.settimeout(WORKER_TIMEOUT)
+            request = read_message(conn)
+            response = dict(fallback=True)
+            if request and request.get('secret') == self._secret:
+                response = self.run(request.get('argv'))
+            write_message(conn, response)
+        except Exception as exc:  # pylint: disable=broad-except
+            log_error('Plugin worker failed: {exc}', exc=exc)
+        finally:
+            conn.close()
+
+    def run(self, argv):
+        """Run a plugin invocation and return the response for the forwarding plugin invocation"""
+        if not argv or not forwardable(argv[0]):
+            return dict(fallback=True)
+        import sys
+        import kodiutils
+        # The router keeps the path and arguments of the current invocation, so run invocations one at a time
+        with self._lock:
+            # The router reads the plugin handle from sys.argv when it is first imported
+            service_argv = sys.argv
+            sys.argv = list(argv)
+            kodiutils.LISTING_CAPTURE = []
+            try:
+                from addon import run
+                run(argv)
+                directives = kodiutils.LISTING_CAPTURE
+            except Exception as exc:  # pylint: disable=broad-except
+                kodiutils.log_error('Plugin worker failed to run {url}: {exc}', url=argv[0], exc=exc)
+                return dict(fallback=True)
+            finally:
+                kodiutils.LISTING_CAPTURE = None
+                sys.argv = service_argv
+        if not directives:
+            # The route ran, but only showed a dialog or a notification, so there is nothing to replay
+            return dict(handled=True)
+        return dict(directive=directives[-1])
+
+
+def forwardable(url):
+    """Whether a plugin url can be handled by the service worker"""
+    try:  # Python 3
+        from urllib.parse import urlsplit
+    except ImportError:  # Python 2
+        from urlparse import urlsplit
+    return bool(WORKER_ROUTES.match(urlsplit(url).path or '/'))
+
+
+def forward(argv):
+    """Forward a plugin invocation to the service worker and replay its listing, return False to run it in-process"""
+    from kodiutils import get_property
+    worker = get_property(WORKER_PROPERTY)
+    if not worker or len(argv) < 2 or not forwardable(argv[0]):
+        return False
+    # Only import socket when a worker is listening, this runs for every plugin invocation
+    import socket
+    port, secret = worker.split(':', 1)
+    try:
+        conn = socket.create_connection((WORKER_HOST, int(port)), timeout=WORKER_CONNECT_TIMEOUT)
+    except (OSError, socket.error, ValueError):
+        return False
+    try:
+        conn.settimeout(WORKER_TIMEOUT)
+        try:
+            write_message(conn, dict(argv=list(argv), secret=secret))
+        except (OSError, socket.error):
+            return False
+        try:
+            response = read_message(conn)
+        except (OSError, socket.error, ValueError) as exc:
+            # The worker may still be running the route, running it again would show its dialogs twice
+            from kodiutils import log_error
+            log_error('Plugin worker did not respond to {url}: {exc}', url=argv[0], exc=exc)
+            replay(int(argv[1]), dict(end_of_directory=True))
+            return True
+    finally:
+        conn.close()
+    if not response or response.get('fallback'):
+        return False
+    if response.get('directive'):
+        replay(int(argv[1]), response.get('directive'))
+    return True
+
+
+def replay(handle, directive):
+    """Replay a listing captured by the service worker"""
+    if directive.get('end_of_directory'):
+        import xbmcplugin
+        xbmcplugin.endOfDirectory(handle=handle, succeeded=False, updateListing=False, cacheToDisc=False)
+        return
+    from helperobjects import TitleItem
+    from kodiutils import render_listing
+    render_listing(handle, directive.get('path'), [TitleItem.from_dict(title_item) for title_item in directive.get('list_items')],
+                   category=directive.get('category'), sort=directive.get('sort'), ascending=directive.get('ascending'),
+                   content=directive.get('content'), cache=directive.get('cache'), selected=directive.get('selected'))
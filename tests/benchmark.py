@@ -0,0 +1,286 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# GNU General Public License v3.0 (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+"""Benchmark VRT MAX plugin routes offline by replaying recorded HTTP responses"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+import hashlib
+import json
+import os
+import re
+import sys
+from contextlib import contextmanager
+from timeit import default_timer
+
+# Add current working directory to import paths
+CWD = os.path.abspath(os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir, 'resources/lib'))
+sys.path.insert(0, CWD)
+
+FIXTURES = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'fixtures', 'replay')
+
+# The major routes, /iptv/epg sends its output to a local socket
+ROUTES = (
+    '/',
+    '/recent',
+    '/programs/de-ideale-wereld',
+    '/tvguide/date/today/een',
+    '/search/query/journaal',
+    '/iptv/epg',
+)
+
+# Modules that bind open_url at import time
+OPEN_URL_MODULES = ('kodiutils', 'resumepoints', 'streamservice', 'tokenresolver')
+
+# Relative dates end up in schedule urls and GraphQL variables, so recordings are matched regardless of the date
+DATE_PATTERN = re.compile(r'\d{4}-\d{2}-\d{2}')
+
+# Recordings are committed, so cookies, credentials and tokens are removed before they are stored
+SENSITIVE_HEADERS = ('authorization', 'cookie', 'set-cookie')
+SENSITIVE_KEY_PATTERN = re.compile(r'token|password|secret|^vrtnu-site_profile_', re.IGNORECASE)
+JWT_PATTERN = re.compile(r'eyJ[\w-]+\.[\w-]+\.[\w-]*')
+REDACTED = 'REDACTED'
+
+# Replays run without credentials, an access token in memory lets the GraphQL requests through
+REPLAY_TOKEN = {'vrtnu-site_profile_at': REDACTED, 'expirationDate': '2052-01-01T06:00:00.000Z'}
+
+
+def fixture_path(route):
+    """Return the fixture file of a route"""
+    name = route.strip('/').replace('/', '_') or 'main_menu'
+    return os.path.join(FIXTURES, name + '.json')
+
+
+def request_key(url, data=None, method=None):
+    """Return a stable key for an HTTP request"""
+    if isinstance(data, bytes):
+        data = data.decode('utf-8')
+    method = method or ('POST' if data else 'GET')
+    digest = hashlib.sha1(DATE_PATTERN.sub('YYYY-MM-DD', data or '').encode('utf-8')).hexdigest()
+    return '%s %s %s' % (method, DATE_PATTERN.sub('YYYY-MM-DD', url), digest)
+
+
+def make_response(url, recording):
+    """Build a urllib response from a recorded response"""
+    from email import message_from_string
+    from http.client import HTTPMessage
+    from io import BytesIO
+    from urllib.error import HTTPError
+    from urllib.response import addinfourl
+    headers = message_from_string(''.join('%s: %s\n' % tuple(header) for header in recording.get('headers')), _class=HTTPMessage)
+    body = BytesIO(recording.get('body').encode('utf-8'))
+    if recording.get('raised'):
+        return HTTPError(url, recording.get('status'), recording.get('reason'), headers, body)
+    return addinfourl(body, headers, url, recording.get('status'))
+
+
+def scrub_json(data):
+    """Redact the tokens and credentials in a JSON document"""
+    if isinstance(data, dict):
+        return {key: REDACTED if SENSITIVE_KEY_PATTERN.search(key) and isinstance(value, type('')) else scrub_json(value) for key, value in data.items()}
+    if isinstance(data, list):
+        return [scrub_json(item) for item in data]
+    return data
+
+
+def scrub(recording):
+    """Return a recorded response without cookies, credentials and tokens, request headers are never recorded"""
+    headers = [(name, value) for name, value in recording.get('headers') if name.lower() not in SENSITIVE_HEADERS]
+    body = recording.get('body')
+    try:
+        body = json.dumps(scrub_json(json.loads(body)))
+    except ValueError:  # Not a JSON response
+        pass
+    return dict(recording, headers=headers, body=JWT_PATTERN.sub(REDACTED, body))
+
+
+@contextmanager
+def replay_token():
+    """Provide a synthetic access token, without storing it in the token cache"""
+    from tokenresolver import TokenResolver
+    resolver = TokenResolver()
+    cache_file = resolver._get_token_filename('vrtnu-site_profile_at')  # pylint: disable=protected-access
+    resolver.token_dict[cache_file] = (REPLAY_TOKEN, None)
+    try:
+        yield
+    finally:
+        resolver.token_dict.pop(cache_file, None)
+
+
+@contextmanager
+def patched_open_url(open_url):
+    """Replace open_url in all modules that use it"""
+    import kodiutils
+    original = kodiutils.open_url
+    for name in OPEN_URL_MODULES:
+        __import__(name)
+    try:
+        for name in OPEN_URL_MODULES:
+            sys.modules[name].open_url = open_url
+        yield
+    finally:
+        for name in OPEN_URL_MODULES:
+            sys.modules[name].open_url = original
+
+
+def recorder(recordings):
+    """Return an open_url that records responses from the VRT APIs"""
+    import kodiutils
+    from urllib.error import HTTPError
+    original = kodiutils.open_url
+
+    def open_url(url, data=None, headers=None, method=None, **kwargs):
+        """Record the response of an HTTP request"""
+        try:
+            response = original(url, data=data, headers=headers, method=method, **kwargs)
+        except HTTPError as exc:
+            recording = dict(status=exc.code, reason=exc.reason, headers=list(exc.headers.items()), body=exc.read().decode('utf-8'), raised=True)
+            recordings[request_key(url, data, method)] = scrub(recording)
+            raise make_response(url, recording)
+        if response is None:
+            recordings[request_key(url, data, method)] = None
+            return None
+        recording = dict(status=response.getcode(), reason='', headers=list(response.info().items()), body=response.read().decode('utf-8'))
+        recordings[request_key(url, data, method)] = scrub(recording)
+        return make_response(url, recording)
+
+    return open_url
+
+
+def replayer(recordings, misses):
+    """Return an open_url that replays recorded responses"""
+
+    def open_url(url, data=None, headers=None, method=None, **kwargs):  # pylint: disable=unused-argument
+        """Replay the response of an HTTP request"""
+        key = request_key(url, data, method)
+        if key not in recordings:
+            misses.append(key)
+            return None
+        recording = recordings.get(key)
+        if recording is None:
+            return None
+        response = make_response(url, recording)
+        if recording.get('raised'):
+            raise response
+        return response
+
+    return open_url
+
+
+@contextmanager
+def quiet():
+    """Suppress the listings printed by the Kodi stubs"""
+    stdout = sys.stdout
+    with open(os.devnull, 'w') as devnull:
+        sys.stdout = devnull
+        try:
+            yield
+        finally:
+            sys.stdout = stdout
+
+
+def iptv_receiver():
+    """Listen for the output of an IPTV Manager route, return the port"""
+    import socket
+    from threading import Thread
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.bind(('127.0.0.1', 0))
+    sock.listen(1)
+
+    def receive():
+        """Drain a single connection"""
+        conn, _ = sock.accept()
+        while conn.recv(65536):
+            pass
+        conn.close()
+        sock.close()
+
+    thread = Thread(target=receive)
+    thread.daemon = True
+    thread.start()
+    return sock.getsockname()[1]
+
+
+def run_route(route):
+    """Run a plugin route"""
+    import addon
+    args = ''
+    if route.startswith('/iptv/'):
+        args = 'port=%d' % iptv_receiver()
+    addon.run(['plugin://plugin.video.vrt.nu' + route, '0', '?' + args if args else ''])
+
+
+def clear_caches():
+    """Start every run with empty caches, so routes always convert the API responses"""
+    import kodiutils
+    kodiutils.get_cache_store().clear(kodiutils.DEFAULT_CACHE_DIR)
+
+
+def record(routes):
+    """Record the HTTP responses of routes"""
+    if not os.path.isdir(FIXTURES):
+        os.makedirs(FIXTURES)
+    for route in routes:
+        recordings = {}
+        clear_caches()
+        with patched_open_url(recorder(recordings)), quiet():
+            run_route(route)
+        with open(fixture_path(route), 'w') as fdesc:
+            json.dump(recordings, fdesc, indent=1, sort_keys=True)
+        print('Recorded %d responses for %s' % (len(recordings), route))
+
+
+def benchmark(route, repeat=5, profile=None):
+    """Replay a route, return the best time in seconds and the missing recordings"""
+    with open(fixture_path(route)) as fdesc:
+        recordings = json.load(fdesc)
+    misses = []
+    timings = []
+    profiler = None
+    if profile:
+        from cProfile import Profile
+        profiler = Profile()
+    with patched_open_url(replayer(recordings, misses)), replay_token(), quiet():
+        for _ in range(repeat):
+            clear_caches()
+            start = default_timer()
+            if profiler:
+                profiler.enable()
+            run_route(route)
+            if profiler:
+                profiler.disable()
+            timings.append(default_timer() - start)
+    if profiler:
+        profiler.dump_stats(os.path.join(profile, fixture_path(route).rsplit(os.sep, 1)[1].replace('.json', '.bin')))
+    return min(timings), sorted(set(misses))
+
+
+def main():
+    """Record or benchmark plugin routes"""
+    from argparse import ArgumentParser
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument('--record', action='store_true', help='record the HTTP responses from the VRT APIs (requires network access)')
+    parser.add_argument('--repeat', type=int, default=5, help='number of replays per route, the best time is reported')
+    parser.add_argument('--profile', metavar='DIR', help='store cProfile stats per route, use tests/read_profiling_stats.py to read them')
+    parser.add_argument('routes', nargs='*', default=ROUTES, help='routes to run')
+    args = parser.parse_args()
+
+    if args.record:
+        record(args.routes)
+        return 0
+
+    status = 0
+    for route in args.routes:
+        if not os.path.exists(fixture_path(route)):
+            print('%-32s no recording, run %s --record %s' % (route, sys.argv[0], route))
+            status = 1
+            continue
+        best, misses = benchmark(route, repeat=args.repeat, profile=args.profile)
+        print('%-32s %8.1f ms' % (route, best * 1000))
+        for key in misses:
+            print('  missing recording: %s' % key)
+            status = 1
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
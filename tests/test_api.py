@@ -6,9 +6,9 @@
 
 from __future__ import absolute_import, division, print_function, unicode_literals
 import unittest
-from api import (delete_continue, finish_continue, get_continue_episodes, get_episodes, get_favorite_programs, get_latest_episode,
-                 get_next_info, get_online_categories, get_offline_programs, get_programs, get_recent_episodes,
-                 get_resumepoint_data, get_search, get_single_episode, set_resumepoint, valid_categories)
+from api import (delete_continue, finish_continue, get_continue_episodes, get_episodes, get_favorite_page, get_favorite_programs, get_graphql_cache,
+                 get_latest_episode, get_next_info, get_online_categories, get_offline_programs, get_programs, get_recent_episodes, get_resumepoint_data,
+                 get_search, get_single_episode, get_single_episode_data, graphql_cache_family, set_resumepoint, update_graphql_cache, valid_categories)
 from data import CATEGORIES
 from xbmcextra import kodi_to_ansi
 
@@ -140,6 +140,15 @@ class TestApi(unittest.TestCase):
         media_id, _ = get_resumepoint_data(episode_id)
         self.assertEqual(media_id, video_id)
 
+    def test_shared_player_data(self):
+        """Test sharing player data between resumepoints and Up Next (de-ideale-wereld)"""
+        episode_id = '1728252310175'
+        player_data = get_single_episode_data(episode_id)
+        self.assertTrue(player_data)
+        get_resumepoint_data(episode_id)
+        get_next_info(episode_id)
+        self.assertIs(get_single_episode_data(episode_id), player_data)
+
     def test_get_continue_episodes(self):
         """Test getting continue watching list"""
 
@@ -182,5 +191,254 @@ class TestApi(unittest.TestCase):
         self.assertEqual(online_categories, local_categories)
 
 
+class TestGraphQLCache(unittest.TestCase):
+    """TestCase class"""
+
+    def test_graphql_cache_family(self):
+        """Test the cache families of GraphQL operations"""
+        self.assertEqual(graphql_cache_family('ListedEpisodes', {'listId': 'dynamic:/vrtnu.model.json@resume-list-video'}), ('continue', 'direct'))
+        self.assertEqual(graphql_cache_family('ListedEpisodes', {'listId': 'static:/vrtnu/a-z/winteruur/1.episodes-list.json'}), ('episodes', 'indirect'))
+        self.assertEqual(graphql_cache_family('PaginatedPrograms', {'listId': '#dGwtcGFnLXNyY2g='}), ('search', 'indirect'))
+        self.assertEqual(graphql_cache_family('Page', {'pageId': '/vrtmax/'}), ('pages', 'indirect'))
+        self.assertEqual(graphql_cache_family('PaginatedPrograms', {'listId': 'dynamic:/vrtnu.model.json@par_list_1624607593_copy_1408213323'}),
+                         ('offline', 'indirect'))
+        self.assertEqual(graphql_cache_family('PaginatedPrograms', {'listId': 'dynamic:/vrtnu.model.json@par_list_1'}), ('programs', 'indirect'))
+        self.assertIsNone(graphql_cache_family('setFavoriteActionItem', {'input': {}}))
+        self.assertIsNone(graphql_cache_family('StreamId', {'id': 'vid-1'}))
+
+    def test_graphql_cache(self):
+        """Test caching GraphQL responses and invalidating them with mutations"""
+        operation = ('query ListedEpisodes { }', 'ListedEpisodes', {'listId': 'dynamic:/vrtnu.model.json@resume-list-video', 'endCursor': '', 'pageSize': 50})
+        data_json = {'data': {'list': {'paginated': {'edges': []}}}}
+        update_graphql_cache(*operation, data_json={'errors': [{'message': 'Internal error'}]})
+        self.assertIsNone(get_graphql_cache(*operation))
+        update_graphql_cache(*operation, data_json=data_json)
+        self.assertEqual(get_graphql_cache(*operation), data_json)
+        self.assertIsNone(get_graphql_cache(*operation, client='MobileAndroid'))
+        update_graphql_cache('mutation finishItem { }', 'finishItem', {'input': {'id': 'vid-1'}}, data_json={})
+        self.assertIsNone(get_graphql_cache(*operation))
+
+    def test_graphql_cache_favorites(self):
+        """Test invalidating every cached listing that carries favorite status when favoriting a program"""
+        operations = [
+            ('query VideoProgramPage { }', 'VideoProgramPage', {'pageId': '/vrtmax/a-z/thuis/'}),
+            ('query ListedEpisodes { }', 'ListedEpisodes', {'listId': 'static:/vrtnu/a-z/thuis/1.episodes-list.json', 'endCursor': '', 'pageSize': 50}),
+            ('query PaginatedPrograms { }', 'PaginatedPrograms', {'listId': '#dGwtcGFnLXNyY2g=', 'endCursor': '', 'pageSize': 50}),
+            ('query Page { }', 'Page', {'pageId': '/vrtmax/'}),
+        ]
+        data_json = {'data': {'page': {}}}
+        for operation in operations:
+            update_graphql_cache(*operation, data_json=data_json)
+            self.assertEqual(get_graphql_cache(*operation), data_json)
+        update_graphql_cache('mutation setFavoriteActionItem { }', 'setFavoriteActionItem', {'input': {'id': '1459955889901'}}, data_json={})
+        for operation in operations:
+            self.assertIsNone(get_graphql_cache(*operation))
+
+    def test_graphql_cache_resumepoints(self):
+        """Test invalidating every cached listing with episode tiles when a resumepoint changes"""
+        import api
+        from tokenresolver import TokenResolver
+        operations = [
+            ('query ListedEpisodes { }', 'ListedEpisodes',
+             {'listId': 'static:/vrtnu/kijk.model.json@par_list_copy_copy_copy', 'endCursor': '', 'pageSize': 50}),
+            ('query ListedEpisodes { }', 'ListedEpisodes', {'listId': 'static:/vrtnu/a-z/thuis/1.episodes-list.json', 'endCursor': '', 'pageSize': 50}),
+            ('query VideoProgramPage { }', 'VideoProgramPage', {'pageId': '/vrtmax/a-z/thuis/'}),
+            ('query Page { }', 'Page', {'pageId': '/vrtmax/'}),
+        ]
+        data_json = {'data': {'page': {}}}
+        get_url_json, get_token = api.get_url_json, TokenResolver.get_token
+        api.get_url_json = lambda url, **kwargs: {'at': 600, 'total': 1800}
+        TokenResolver.get_token = lambda self, name: 'token'
+        try:
+            for operation in operations:
+                update_graphql_cache(*operation, data_json=data_json)
+            set_resumepoint('vid-1', 'Thuis', 600, 1800)
+            for operation in operations:
+                self.assertIsNone(get_graphql_cache(*operation))
+            for operation in operations:
+                update_graphql_cache(*operation, data_json=data_json)
+            update_graphql_cache('mutation finishItem { }', 'finishItem', {'input': {'id': 'vid-1'}}, data_json={})
+            for operation in operations:
+                self.assertIsNone(get_graphql_cache(*operation))
+        finally:
+            api.get_url_json, TokenResolver.get_token = get_url_json, get_token
+
+    def test_favorite_page(self):
+        """Test filling a page of favorites from successive cached pages"""
+        from functools import partial
+        from api import favorited_episode, get_paginated_episodes_query
+        from kodiutils import invalidate_cache_tags
+        get_query = partial(get_paginated_episodes_query, 'static:/vrtnu/kijk.model.json@par_list_copy_copy_copy', 3)
+
+        def edge(episode_id, favorite):
+            """Return a paginated list item"""
+            return {'node': {'episode': {'id': episode_id, 'favoriteAction': {'favorite': favorite}}}}
+
+        pages = (
+            ('', [edge('1', False), edge('2', True), edge('3', False)], {'endCursor': 'c1', 'hasNextPage': True}),
+            ('c1', [edge('4', True), edge('5', False), edge('6', True)], {'endCursor': 'c2', 'hasNextPage': True}),
+        )
+        for end_cursor, edges, page_info in pages:
+            update_graphql_cache(*get_query(end_cursor=end_cursor), data_json={'data': {'list': {'paginated': {'edges': edges, 'pageInfo': page_info}}}})
+        api_data = get_favorite_page(get_query, favorited_episode, 3)
+        paginated = api_data.get('data').get('list').get('paginated')
+        self.assertEqual([item.get('node').get('episode').get('id') for item in paginated.get('edges')], ['2', '4', '6'])
+        self.assertEqual(paginated.get('pageInfo'), {'endCursor': 'c2', 'hasNextPage': True})
+        # Filtered pages are invalidated with the list they are filtered from
+        graphql_query, operation_name, variables = get_query(end_cursor='')
+        self.assertIsNotNone(get_graphql_cache(graphql_query, operation_name, dict(variables, favorites=True)))
+        invalidate_cache_tags('recent')
+        self.assertIsNone(get_graphql_cache(graphql_query, operation_name, dict(variables, favorites=True)))
+
+
+class TestPlayerData(unittest.TestCase):
+    """TestCase class"""
+
+    def test_player_data_retry(self):
+        """Test retrying player data after a failed request"""
+        import api
+        from kodiutils import delete_cache
+        responses = [{}, {'data': {'catalogMember': {'id': '1571140659165'}}}]
+        original = api.api_req
+        api.api_req = lambda *args, **kwargs: responses.pop(0)
+        try:
+            self.assertEqual(api.get_single_episode_data('test-retry'), {})
+            self.assertEqual(api.get_single_episode_data('test-retry'), {'data': {'catalogMember': {'id': '1571140659165'}}})
+            self.assertEqual(api.get_single_episode_data('test-retry'), {'data': {'catalogMember': {'id': '1571140659165'}}})
+        finally:
+            api.api_req = original
+            api.PLAYERDATA_MEMO.pop('test-retry', None)
+            delete_cache('playerdata.test-retry.json')
+
+
+class TestPrefetch(unittest.TestCase):
+    """TestCase class"""
+
+    @staticmethod
+    def page(has_next_page=True, end_cursor='cursor-2'):
+        """Return a paginated list response"""
+        return {'data': {'list': {'paginated': {'edges': [], 'pageInfo': {'hasNextPage': has_next_page, 'endCursor': end_cursor}}}}}
+
+    @staticmethod
+    def get_query(end_cursor=''):
+        """Return a stubbed paginated list query"""
+        return 'query PaginatedEpisodes { }', 'PaginatedEpisodes', {'endCursor': end_cursor}
+
+    def prefetch_next_page(self, api_data, usehttpcaching=True):
+        """Prefetch the next page with stubbed background threads, return the background calls"""
+        import api
+        calls = []
+        originals = (api.run_in_background, api.get_setting_bool)
+        try:
+            api.run_in_background = lambda func, *args: calls.append((func, args))
+            api.get_setting_bool = lambda key, default=None: usehttpcaching if key == 'usehttpcaching' else default
+            api.prefetch_next_page(api_data, self.get_query)
+        finally:
+            api.run_in_background, api.get_setting_bool = originals
+        return calls
+
+    def test_prefetch_next_page(self):
+        """Test prefetching only a next page that exists"""
+        import api
+        operation = self.get_query(end_cursor='cursor-2')
+        self.assertEqual(self.prefetch_next_page(self.page()), [(api.prefetch, (operation, 'WEB'))])
+        self.assertEqual(self.prefetch_next_page(self.page(has_next_page=False)), [])
+        self.assertEqual(self.prefetch_next_page(self.page(end_cursor=None)), [])
+        self.assertEqual(self.prefetch_next_page({'data': {'list': None}}), [])
+        self.assertEqual(self.prefetch_next_page(None), [])
+
+    def test_prefetch_without_caching(self):
+        """Test not prefetching when HTTP caching is disabled"""
+        self.assertEqual(self.prefetch_next_page(self.page(), usehttpcaching=False), [])
+
+    def test_prefetch_failure(self):
+        """Test logging a failing prefetch instead of raising from the background thread"""
+        import api
+        logged = []
+
+        def api_req(*args, **kwargs):  # pylint: disable=unused-argument
+            """Fail like an unreachable GraphQL API"""
+            raise ValueError('unreachable')
+
+        originals = (api.api_req, api.log)
+        try:
+            api.api_req = api_req
+            api.log = lambda level, message, **kwargs: logged.append((level, message.format(**kwargs)))
+            api.prefetch(self.get_query(end_cursor='cursor-2'))
+        finally:
+            api.api_req, api.log = originals
+        self.assertEqual(logged, [(2, 'Failed to prefetch PaginatedEpisodes: unreachable')])
+
+
+class TestGraphQLBatching(unittest.TestCase):
+    """TestCase class"""
+
+    operations = [('query StreamId { }', 'StreamId', {'id': 'vid-1'}), ('query StreamId { }', 'StreamId', {'id': 'vid-2'})]
+
+    def batch(self, response):
+        """Run batched operations with a stubbed GraphQL API, return the results, the fallback requests and the stored batching support"""
+        import api
+        from kodiutils import delete_cache
+        from tokenresolver import TokenResolver
+        fallback = []
+
+        def get_url_json(**kwargs):  # pylint: disable=unused-argument
+            """Return or raise the stubbed response"""
+            if isinstance(response, Exception):
+                raise response
+            return response
+
+        def api_req(graphql_query, operation_name, variables, client='WEB'):  # pylint: disable=unused-argument
+            """Return a result per operation"""
+            fallback.append(variables.get('id'))
+            return {'data': variables.get('id')}
+
+        stubs = dict(get_url_json=get_url_json, api_req=api_req)
+        originals = {name: getattr(api, name) for name in stubs}
+        get_token = TokenResolver.get_token
+        delete_cache(api.GRAPHQL_BATCHING_CACHE)
+        try:
+            for name, stub in stubs.items():
+                setattr(api, name, stub)
+            TokenResolver.get_token = lambda self, name: 'token'
+            results = api.api_req_batch(self.operations)
+            return results, sorted(fallback), api.graphql_batching_supported()
+        finally:
+            for name, original in originals.items():
+                setattr(api, name, original)
+            TokenResolver.get_token = get_token
+            delete_cache(api.GRAPHQL_BATCHING_CACHE)
+
+    @staticmethod
+    def http_error(code):
+        """Return an HTTP error"""
+        try:  # Python 3
+            from urllib.error import HTTPError
+        except ImportError:  # Python 2
+            from urllib2 import HTTPError
+        return HTTPError('https://www.vrt.be/vrtnu-api/graphql/v1', code, 'Error', {}, None)
+
+    def test_batched(self):
+        """Test a batched request"""
+        self.assertEqual(self.batch([{'data': 1}, {'data': 2}]), ([{'data': 1}, {'data': 2}], [], True))
+
+    def test_batching_rejected(self):
+        """Test falling back when the GraphQL API rejects batched requests"""
+        expected = [{'data': 'vid-1'}, {'data': 'vid-2'}]
+        self.assertEqual(self.batch(self.http_error(400)), (expected, ['vid-1', 'vid-2'], False))
+        self.assertEqual(self.batch({'errors': [{'message': 'Must provide query string.'}]}), (expected, ['vid-1', 'vid-2'], False))
+
+    def test_batching_failed(self):
+        """Test falling back without disabling batching when a batched request fails"""
+        try:  # Python 3
+            from urllib.error import URLError
+        except ImportError:  # Python 2
+            from urllib2 import URLError
+        expected = [{'data': 'vid-1'}, {'data': 'vid-2'}]
+        self.assertEqual(self.batch(self.http_error(401)), (expected, ['vid-1', 'vid-2'], None))
+        self.assertEqual(self.batch(self.http_error(503)), (expected, ['vid-1', 'vid-2'], None))
+        self.assertEqual(self.batch(URLError('timed out')), (expected, ['vid-1', 'vid-2'], None))
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+# GNU General Public License v3.0 (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+"""Unit tests for the SQLite cache store"""
+
+# pylint: disable=invalid-name
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+import os
+import shutil
+import tempfile
+from time import time
+import unittest
+
+from cachestore import CacheStore
+
+
+class TestCacheStore(unittest.TestCase):
+    """TestCase class"""
+
+    def setUp(self):
+        """Build up function for TestCase class"""
+        self._tmpdir = tempfile.mkdtemp()
+        self._path = os.path.join(self._tmpdir, 'cache.sqlite')
+        self._store = CacheStore(self._path)
+
+    def tearDown(self):
+        """Clean up function for TestCase class"""
+        self._store.close()
+        shutil.rmtree(self._tmpdir)
+
+    def test_get_set(self):
+        """Test storing and retrieving cache entries"""
+        self.assertIsNone(self._store.get('cache', 'missing.json'))
+        self._store.set('cache', 'favorites.json', '{"foo": "bar"}')
+        self.assertEqual(self._store.get('cache', 'favorites.json'), '{"foo": "bar"}')
+        self.assertIsNone(self._store.get('tokens', 'favorites.json'))
+        self._store.set('cache', 'favorites.json', '{"foo": "baz"}')
+        self.assertEqual(self._store.get('cache', 'favorites.json'), '{"foo": "baz"}')
+
+    def test_freshness(self):
+        """Test ttl and expiry of cache entries"""
+        self._store.set('cache', 'fresh.json', '{}')
+        self.assertEqual(self._store.get('cache', 'fresh.json', ttl=60), '{}')
+        self.assertIsNone(self._store.get('cache', 'fresh.json', ttl=0))
+        self._store.set('tokens', 'expired.tkn', '{}', expiry=time() - 1)
+        self.assertIsNone(self._store.get('tokens', 'expired.tkn'))
+        self._store.set('tokens', 'valid.tkn', '{}', expiry=time() + 60)
+        self.assertEqual(self._store.get('tokens', 'valid.tkn'), '{}')
+        self.assertEqual(self._store.purge(max_age=60), 1)
+        self._store.set('cache', 'stale.json', '{}')
+        self.assertIsNone(self._store.get('cache', 'stale.json', ttl=-1))
+        self.assertEqual(self._store.touch('cache', 'stale.json'), 1)
+        self.assertEqual(self._store.get('cache', 'stale.json', ttl=60), '{}')
+
+    def test_invalidate(self):
+        """Test invalidating cache entries"""
+        for key in ('my-recent-1.json', 'my-recent-2.json', 'my-offline-1.json', 'favorites.json'):
+            self._store.set('cache', key, '{}')
+        self._store.set('tokens', 'my-recent-1.json', '{}')
+        self.assertEqual(self._store.invalidate('cache', 'my-recent-*.json'), 2)
+        self.assertEqual(self._store.get('tokens', 'my-recent-1.json'), '{}')
+        self.assertEqual(self._store.invalidate('cache', 'my-*.json', 'favorites.json'), 2)
+        self._store.set('cache', 'search.json', '{}', tag='graphql')
+        self._store.set('cache', 'episodes.json', '{}', tag='graphql')
+        self.assertEqual(self._store.invalidate_tags('graphql'), 2)
+        self.assertEqual(self._store.clear('tokens'), 1)
+
+    def test_refresh_queue(self):
+        """Test queueing cache refreshes"""
+        self.assertEqual(self._store.pop_refreshes(), [])
+        self._store.queue_refresh('cache', 'schedule.json', 'https://www.vrt.be/schedule.json', '{}')
+        self._store.queue_refresh('cache', 'schedule.json', 'https://www.vrt.be/schedule.json', '{}')
+        self.assertEqual(self._store.pop_refreshes(), [('cache', 'schedule.json', 'https://www.vrt.be/schedule.json', '{}')])
+        self.assertEqual(self._store.pop_refreshes(), [])
+
+    def test_shared_database(self):
+        """Test two cache stores sharing the same database"""
+        other = CacheStore(self._path)
+        self._store.set('cache', 'shared.json', '{"shared": true}')
+        self.assertEqual(other.get('cache', 'shared.json'), '{"shared": true}')
+        other.delete('cache', 'shared.json')
+        self.assertIsNone(self._store.get('cache', 'shared.json'))
+        other.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
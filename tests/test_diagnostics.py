@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+# GNU General Public License v3.0 (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+"""Unit tests for the instrumentation of plugin invocations"""
+
+# pylint: disable=invalid-name
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+import unittest
+
+import diagnostics
+
+
+class TestDiagnostics(unittest.TestCase):
+    """TestCase class"""
+
+    def tearDown(self):
+        """Clean up function for TestCase class"""
+        diagnostics.ENABLED = False
+
+    def test_disabled(self):
+        """Test that nothing is recorded when instrumentation is disabled"""
+        started = diagnostics.start()
+        diagnostics.ENABLED = False
+        with diagnostics.span('open_url'):
+            diagnostics.count('cache.hit')
+        self.assertEqual(diagnostics.SPANS, {})
+        self.assertEqual(diagnostics.COUNTERS, {})
+        diagnostics.finish('/recent', started)
+
+    def test_spans(self):
+        """Test recording spans and counters"""
+        diagnostics.start()
+        diagnostics.ENABLED = True
+
+        @diagnostics.timed('convert')
+        def convert(value):
+            """Convert a value"""
+            return value * 2
+
+        for _ in range(3):
+            with diagnostics.span('open_url'):
+                diagnostics.count('json.bytes', 100)
+        self.assertEqual(convert(21), 42)
+        self.assertEqual(diagnostics.SPANS.get('open_url')[0], 3)
+        self.assertEqual(diagnostics.SPANS.get('convert')[0], 1)
+        self.assertEqual(diagnostics.COUNTERS, {'json.bytes': 300})
+
+    def test_aggregate(self):
+        """Test aggregating the rolling stats"""
+        history = [
+            dict(route='/recent', duration=0.5, spans={'open_url': [2, 0.2, 0.15]}, counters={'cache.miss': 2}),
+            dict(route='/recent', duration=0.3, spans={'open_url': [1, 0.1, 0.1]}, counters={'cache.hit': 1}),
+            dict(route='/programs', duration=0.2, spans={}, counters={'cache.miss': 1}),
+        ]
+        routes, spans, counters = diagnostics.aggregate(history)
+        self.assertEqual(routes.get('/recent')[0], 2)
+        self.assertAlmostEqual(routes.get('/recent')[1], 0.8)
+        self.assertEqual(routes.get('/recent')[2], 0.5)
+        self.assertEqual(spans.get('open_url')[0], 3)
+        self.assertEqual(counters, {'cache.miss': 3, 'cache.hit': 1})
+        self.assertEqual(diagnostics.route_name('/programs/de-ideale-wereld/'), '/programs')
+        self.assertEqual(diagnostics.route_name('/'), '/')
+
+
+if __name__ == '__main__':
+    unittest.main()
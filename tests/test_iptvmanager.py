@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+# GNU General Public License v3.0 (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+"""Unit tests for IPTV Manager functionality"""
+
+# pylint: disable=invalid-name
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+import json
+import unittest
+
+from iptvmanager import iterencode
+
+
+class TestIPTVManager(unittest.TestCase):
+    """TestCase class"""
+
+    def test_iterencode(self):
+        """Test encoding JSON fragments"""
+        programmes = [dict(start='2019-05-11T19:00:00.000+02:00', title='Het Journaal', stream=None), dict(title='Dé Weerman')]
+        epg = ((epg_id, programmes) for epg_id in ('een.be', 'canvas.be'))
+        fragments = list(iterencode({'version': 1, 'epg': epg}))
+        self.assertTrue(len(fragments) > 10)
+        self.assertEqual(json.loads(''.join(fragments)), {'version': 1, 'epg': {'een.be': programmes, 'canvas.be': programmes}})
+        self.assertEqual(json.loads(''.join(iterencode({'streams': []}))), {'streams': []})
+        self.assertEqual(''.join(iterencode(None)), 'null')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -5,9 +5,15 @@
 # pylint: disable=invalid-name,line-too-long
 
 from __future__ import absolute_import, division, print_function, unicode_literals
+from threading import Thread
 import unittest
 import kodiutils
 
+try:  # Python 3
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+except ImportError:  # Python 2
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+
 xbmc = __import__('xbmc')
 xbmcaddon = __import__('xbmcaddon')
 xbmcgui = __import__('xbmcgui')
@@ -17,6 +23,64 @@ xbmcvfs = __import__('xbmcvfs')
 addon = xbmcaddon.Addon()
 
 
+def router_url_for(name, *args, **kwargs):
+    """Return a url like the router does, path arguments are quoted and other arguments end up in the query string"""
+    try:  # Python 3
+        from urllib.parse import quote, urlencode
+    except ImportError:  # Python 2
+        from urllib import quote, urlencode
+    path = '/'.join(quote(arg) for arg in (name,) + args + tuple(kwargs.pop(key) for key in ('program_name', 'season_name') if key in kwargs))
+    return 'plugin://plugin.video.vrt.nu/' + path + ('?' + urlencode(kwargs) if kwargs else '')
+
+
+class KeepAliveRequestHandler(BaseHTTPRequestHandler):
+    """A minimal HTTP/1.1 request handler that counts connections"""
+    protocol_version = 'HTTP/1.1'
+    connections = 0
+
+    def setup(self):
+        """Count new connections"""
+        KeepAliveRequestHandler.connections += 1
+        BaseHTTPRequestHandler.setup(self)
+
+    def do_GET(self):
+        """Return a small JSON document"""
+        body = b'{"ok": true}'
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        """Do not log requests"""
+
+
+class ConditionalRequestHandler(BaseHTTPRequestHandler):
+    """A minimal HTTP/1.1 request handler that supports conditional requests"""
+    protocol_version = 'HTTP/1.1'
+    not_modified = 0
+
+    def do_GET(self):
+        """Return a small JSON document, unless the client has it already"""
+        if self.headers.get('If-None-Match') == '"v1"':
+            ConditionalRequestHandler.not_modified += 1
+            self.send_response(304)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        body = b'{"ok": true}'
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', '"v1"')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        """Do not log requests"""
+
+
 class TestKodiUtils(unittest.TestCase):
     """TestCase class"""
 
@@ -41,6 +105,173 @@ class TestKodiUtils(unittest.TestCase):
         #self.assertEqual(msg, "There is a problem with this VRT MAX MPEG-DASH stream. Try again with Widevine DRM enabled or try to play this program from the VRT MAX website. Please report this problem at https://www.vrt.be/vrtmax/help/")  # noqa
         self.assertEqual(msg, "Er is een probleem met deze VRT MAX MPEG-DASH-stream. Probeer het opnieuw met Widevine DRM enabled of probeer dit programma af te spelen vanaf de VRT MAX-website. Meld dit probleem op https://www.vrt.be/vrtmax/help/")  # noqa
 
+    def test_keepalive_connection_pool(self):
+        """Test reusing keep-alive connections"""
+        KeepAliveRequestHandler.connections = 0
+        server = HTTPServer(('127.0.0.1', 0), KeepAliveRequestHandler)
+        thread = Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        url = 'http://127.0.0.1:{port}/'.format(port=server.server_port)
+        for _ in range(3):
+            self.assertEqual(kodiutils.get_url_json(url), dict(ok=True))
+        kodiutils.close_connections()
+        server.shutdown()
+        server.server_close()
+        self.assertEqual(KeepAliveRequestHandler.connections, 1)
+
+    def test_stale_while_revalidate(self):
+        """Test serving stale cache entries and refreshing them in the background"""
+        server = HTTPServer(('127.0.0.1', 0), KeepAliveRequestHandler)
+        thread = Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        url = 'http://127.0.0.1:{port}/'.format(port=server.server_port)
+        kodiutils.update_cache('stale.json', '{"ok": false}')
+        self.assertEqual(kodiutils.get_cached_url_json(url, 'stale.json', ttl=0, grace=60), dict(ok=False))
+        kodiutils.refresh_queued_caches()
+        self.assertEqual(kodiutils.get_cached_url_json(url, 'stale.json', ttl=60, grace=60), dict(ok=True))
+        kodiutils.delete_cache('stale.json')
+        kodiutils.close_connections()
+        server.shutdown()
+        server.server_close()
+
+    def test_refresh_offline(self):
+        """Test refreshing queued caches without a network connection"""
+        import socket
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.bind(('127.0.0.1', 0))
+        url = 'http://127.0.0.1:{port}/'.format(port=sock.getsockname()[1])
+        sock.close()
+        dialogs = []
+        ok_dialog = kodiutils.ok_dialog
+        kodiutils.ok_dialog = lambda **kwargs: dialogs.append(kwargs)
+        try:
+            kodiutils.get_cache_store().queue_refresh(kodiutils.DEFAULT_CACHE_DIR, 'offline.json', url, '{}')
+            kodiutils.refresh_queued_caches()
+        finally:
+            kodiutils.ok_dialog = ok_dialog
+        self.assertEqual(dialogs, [])
+        self.assertEqual(kodiutils.get_cache_store().pop_refreshes(), [])
+
+    def test_conditional_request(self):
+        """Test revalidating cache entries using conditional requests"""
+        ConditionalRequestHandler.not_modified = 0
+        server = HTTPServer(('127.0.0.1', 0), ConditionalRequestHandler)
+        thread = Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        url = 'http://127.0.0.1:{port}/'.format(port=server.server_port)
+        kodiutils.delete_cache('conditional.json')
+        self.assertEqual(kodiutils.get_conditional_url_json(url, 'conditional.json', ttl=0), dict(ok=True))
+        self.assertEqual(kodiutils.get_conditional_url_json(url, 'conditional.json', ttl=0), dict(ok=True))
+        self.assertEqual(ConditionalRequestHandler.not_modified, 1)
+        self.assertEqual(kodiutils.get_conditional_url_json(url, 'conditional.json', ttl=60), dict(ok=True))
+        self.assertEqual(ConditionalRequestHandler.not_modified, 1)
+        kodiutils.delete_cache('conditional.json')
+        kodiutils.delete_cache('conditional.json', cache_dir=kodiutils.VALIDATORS_CACHE_DIR)
+        kodiutils.close_connections()
+        server.shutdown()
+        server.server_close()
+
+    def test_settings_snapshot(self):
+        """Test reading settings from the settings snapshot"""
+        kodiutils.snapshot_settings()
+        try:
+            addon.settings['max_log_level'] = '3'
+            self.assertEqual(kodiutils.get_setting_int('max_log_level'), 3)
+            addon.settings['max_log_level'] = '0'
+            self.assertEqual(kodiutils.get_setting_int('max_log_level'), 3)
+            kodiutils.set_setting('max_log_level', '1')
+            self.assertEqual(kodiutils.get_setting_int('max_log_level'), 1)
+            xbmc.settings['debug.showloginfo'] = True
+            self.assertTrue(kodiutils.get_global_setting('debug.showloginfo'))
+            xbmc.settings['debug.showloginfo'] = False
+            self.assertTrue(kodiutils.get_global_setting('debug.showloginfo'))
+            kodiutils.snapshot_settings()
+            self.assertFalse(kodiutils.get_global_setting('debug.showloginfo'))
+        finally:
+            kodiutils.SETTINGS_SNAPSHOT = None
+
+    def test_replaced_snapshot(self):
+        """Test reading a setting while another thread replaces the settings snapshot"""
+
+        def getter(key):
+            """Replace the snapshot while the setting is read"""
+            kodiutils.SETTINGS_SNAPSHOT = {}
+            return key.upper()
+
+        kodiutils.snapshot_settings()
+        try:
+            self.assertEqual(kodiutils.get_snapshot_setting('string', 'value', getter), 'VALUE')
+        finally:
+            kodiutils.SETTINGS_SNAPSHOT = None
+
+    def test_localize_snapshot(self):
+        """Test reading localized strings and colours from the settings snapshot"""
+        colour_theme = addon.settings.get('colour_theme')
+        kodiutils.snapshot_settings()
+        try:
+            label = kodiutils.localize(30300)
+            self.assertEqual(kodiutils.SETTINGS_SNAPSHOT.get(('localized', 30300)), label)
+            self.assertIs(kodiutils.localize(30300), label)
+            addon.settings['colour_theme'] = 'light'
+            marker = kodiutils.colour('[COLOR={highlighted}]ᵛ[/COLOR]')
+            self.assertEqual(marker, '[COLOR={highlighted}]ᵛ[/COLOR]'.format(**kodiutils.COLOUR_THEMES.get('light')))
+            addon.settings['colour_theme'] = 'dark'
+            self.assertEqual(kodiutils.colour('[COLOR={highlighted}]ᵛ[/COLOR]'), marker)
+        finally:
+            kodiutils.SETTINGS_SNAPSHOT = None
+            addon.settings['colour_theme'] = colour_theme
+
+    def test_url_template(self):
+        """Test compiling url templates that reproduce the urls of the router"""
+        for args, kwargs in ((('winteruur',), {}), ((), dict(program_name='de ideale wereld', end_cursor='YXJyYXljb25uZWN0aW9uOjQ5')),
+                             ((), dict(program_name='ü/&?', season_name='parsys_1', end_cursor='a+b=c'))):
+            template = kodiutils.compile_url_template(router_url_for, 'programs', len(args), tuple(kwargs))
+            self.assertTrue(template)
+            for values in (args + tuple(kwargs.values()), tuple('%s #%d é/+&' % (value, idx) for idx, value in enumerate(args + tuple(kwargs.values())))):
+                self.assertEqual(kodiutils.expand_url_template(template, values),
+                                 router_url_for('programs', *values[:len(args)], **dict(zip(kwargs, values[len(args):]))))
+
+        def lowercase_url_for(name, *args, **kwargs):
+            """Return a url that cannot be reproduced by quoting"""
+            return router_url_for(name, *args, **kwargs).lower()
+
+        self.assertFalse(kodiutils.compile_url_template(lowercase_url_for, 'programs', 1, ()))
+
+    def test_url_for_templates(self):
+        """Test that the router is only used to compile the url template of each route and arguments"""
+        calls = []
+
+        def counting_url_for(name, *args, **kwargs):
+            """Return the url of the router and count the calls"""
+            calls.append(name)
+            return router_url_for(name, *args, **kwargs)
+
+        url_templates = dict(kodiutils.URL_TEMPLATES)
+        route_url_for = kodiutils.route_url_for
+        kodiutils.URL_TEMPLATES.clear()
+        kodiutils.route_url_for = counting_url_for
+        try:
+            calls_compiled = {}
+            for idx in range(3):
+                for name, args, kwargs in (('programs', (), dict(program_name='pano-%d' % idx)),
+                                           ('programs', (), dict(program_name='de ideale wereld', season_name='%d' % idx)),
+                                           ('recent', ('page %d' % idx,), {})):
+                    key = (name, len(args), tuple(kwargs))
+                    url = kodiutils.url_for(name, *args, **kwargs)
+                    self.assertEqual(url, router_url_for(name, *args, **dict(kwargs)))
+                    calls_compiled.setdefault(key, len(calls))
+            # Every route and arguments compiled its template with the router, later urls are expanded without it
+            self.assertEqual(len(calls_compiled), 3)
+            self.assertTrue(0 < min(calls_compiled.values()))
+            self.assertEqual(len(calls), max(calls_compiled.values()))
+        finally:
+            kodiutils.route_url_for = route_url_for
+            kodiutils.URL_TEMPLATES.clear()
+            kodiutils.URL_TEMPLATES.update(url_templates)
+
     @staticmethod
     def test_log_disabled():
         """Test with logging disabled"""
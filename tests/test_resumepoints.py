@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+# GNU General Public License v3.0 (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+"""Unit tests for ResumePoints functionality"""
+
+# pylint: disable=invalid-name,protected-access
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+import unittest
+
+import resumepoints as resumepoints_module
+from resumepoints import ResumePoints
+
+
+class TestResumePoints(unittest.TestCase):
+    """TestCase class"""
+
+    def test_resumepoint_index(self):
+        """Test looking up resumepoints in the compact resumepoints representation"""
+        resumepoints_json = dict(items=[
+            dict(mediaId='vid-1', at=120, total=1800, updated=1573478400000, gdpr='Aflevering 1 gekeken tot 120 seconden.'),
+            dict(mediaId='vid-2', at=30),
+        ])
+        compact = ResumePoints._compact(resumepoints_json)
+        self.assertEqual(compact, {'vid-1': [120, 1800], 'vid-2': [30, 100]})
+        # A compact representation is kept as is
+        self.assertEqual(ResumePoints._compact(compact), compact)
+
+        resumepoints = ResumePoints()
+        resumepoints._resumepoints = compact
+        self.assertEqual(resumepoints.get_position('vid-1'), 120)
+        self.assertEqual(resumepoints.get_total('vid-1'), 1800)
+        self.assertEqual(resumepoints.get_total('vid-2'), 100)
+        self.assertEqual(resumepoints.get_position('vid-3'), 0)
+        self.assertEqual(resumepoints.get_total('vid-3'), 100)
+
+    def test_empty_resumepoints_cache(self):
+        """Test that an empty cached resumepoints index is used instead of fetched again"""
+        fetched = []
+        saved = (resumepoints_module.get_cache, resumepoints_module.get_url_json, vars(ResumePoints)['is_activated'],
+                 vars(ResumePoints)['resumepoints_headers'])
+        resumepoints_module.get_cache = lambda path, ttl=None: {}
+        resumepoints_module.get_url_json = lambda url, **kwargs: fetched.append(url)
+        ResumePoints.is_activated = staticmethod(lambda: True)
+        ResumePoints.resumepoints_headers = staticmethod(lambda *args, **kwargs: {'authorization': 'Bearer token'})
+        try:
+            resumepoints = ResumePoints()
+            resumepoints.refresh_resumepoints(ttl=5 * 60)
+        finally:
+            (resumepoints_module.get_cache, resumepoints_module.get_url_json, ResumePoints.is_activated,
+             ResumePoints.resumepoints_headers) = saved
+        self.assertEqual(fetched, [])
+        self.assertEqual(resumepoints._resumepoints, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
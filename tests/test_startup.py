@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+# GNU General Public License v3.0 (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+"""Import-time budget for the plugin routes"""
+
+# pylint: disable=invalid-name
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+import os
+import subprocess
+import sys
+import unittest
+
+CWD = os.path.dirname(os.path.realpath(__file__))
+PYTHONPATH = os.pathsep.join([os.path.join(CWD, os.pardir, 'resources', 'lib'), CWD])
+
+# The Kodi modules are stubs here, they are imported before measuring since Kodi provides them for free
+KODI_MODULES = ('xbmc', 'xbmcaddon', 'xbmcgui', 'xbmcplugin', 'xbmcvfs')
+
+# The plugin routes whose imports are measured, running them imports exactly what a plugin invocation imports
+ROUTES = ('/', '/recent', '/play/id/vid-5b12c0f6-b8fe-426f-a600-557f501f3be9')
+
+# Heavy modules that only specific routes need
+DEFERRED_MODULES = ('dateutil', 'favorites', 'metadata', 'resumepoints', 'search', 'tvguide')
+
+MAX_IMPORT_TIME = 0.25  # seconds
+MAX_MODULE_COUNT = 25
+
+SCRIPT = '''
+import json, sys, types
+{kodi_modules}
+
+
+class Plugin(object):
+    """A minimal router standing in for the routing module that Kodi provides"""
+
+    def __init__(self):
+        self.routes = []
+        self.handle = -1
+        self.path = None
+        self.args = dict()
+
+    def route(self, pattern):
+        def decorator(func):
+            self.routes.append((pattern.split('/'), func))
+            return func
+        return decorator
+
+    def url_for(self, func, *args, **kwargs):
+        for parts, route in self.routes:
+            names = [part[1:-1] for part in parts if part.startswith('<')]
+            if route is func and len(names) == len(args) + len(kwargs):
+                values = dict(zip(names, args), **kwargs)
+                return 'plugin://plugin.video.vrt.nu' + '/'.join(str(values.get(part[1:-1])) if part.startswith('<') else part for part in parts)
+        raise KeyError(func)
+
+    def run(self, argv):
+        self.handle = int(argv[1])
+        self.path = argv[0][len('plugin://plugin.video.vrt.nu'):] or '/'
+        path_parts = self.path.split('/')
+        for parts, func in self.routes:
+            if len(parts) == len(path_parts) and all(part.startswith('<') or part == value for part, value in zip(parts, path_parts)):
+                return func(**dict((part[1:-1], value) for part, value in zip(parts, path_parts) if part.startswith('<')))
+        raise KeyError(self.path)
+
+
+# A recent episode, so listing routes convert episodes like they do with network access
+EPISODE = dict(id='1', title='Aflevering 1', description='', permalink='', onTimeRaw='2024-10-04T19:35:00.000+02:00',
+               offTimeRaw='2052-01-01T06:00:00.000+00:00', durationSeconds=1800, season=dict(titleRaw='1'),
+               analytics=dict(airDate='2024-10-04T19:35:00.000+02:00', categories='humor'), favoriteAction=dict(favorite=False),
+               watchAction=dict(videoId='vid-1', publicationId='pbs-pub-1'),
+               program=dict(id='2', title='Thuis', link='/vrtmax/a-z/thuis/', programType='series', subtitle=''))
+GRAPHQL_DATA = dict(ListedEpisodes=dict(data=dict(list=dict(paginated=dict(edges=[dict(node=dict(episode=EPISODE))],
+                                                                           pageInfo=dict(hasNextPage=False))))))
+
+routing = types.ModuleType('routing')
+routing.Plugin = Plugin
+sys.modules['routing'] = routing
+before = set(sys.modules)
+import api
+api.get_graphql_cache = lambda graphql_query, operation_name, variables, client='WEB': GRAPHQL_DATA.get(operation_name)
+import addon_entry
+from addon import run
+error = None
+try:
+    run(['plugin://plugin.video.vrt.nu{route}', '0', ''])
+except Exception as exc:  # Routes that need the VRT MAX API fail without network access
+    error = exc
+imported = sorted(set(sys.modules) - before)
+print(json.dumps(dict(imported=imported, error=repr(error) if error else None)))
+'''
+
+
+def measure_route(route):
+    """Run a route in a fresh interpreter, return the newly imported modules, their import time in seconds and the route error"""
+    script = SCRIPT.format(kodi_modules='\n'.join('import ' + name for name in KODI_MODULES), route=route)
+    env = dict(os.environ, PYTHONPATH=PYTHONPATH)
+    process = subprocess.Popen([sys.executable, '-X', 'importtime', '-c', script], stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=env)
+    stdout, stderr = process.communicate()
+    import json
+    result = json.loads(stdout.decode('utf-8').strip().splitlines()[-1])
+    imported = result.get('imported')
+    # Sum the cumulative time of the top-level imports of the new modules, reported in microseconds
+    import_time = 0
+    for line in stderr.decode('utf-8').splitlines():
+        if not line.startswith('import time:'):
+            continue
+        fields = line.split('|')
+        if fields[2].strip() in imported and not fields[2].startswith('  '):
+            import_time += int(fields[1])
+    return imported, import_time / 1000000.0, result.get('error')
+
+
+@unittest.skipIf(sys.version_info < (3, 7), '-X importtime requires Python 3.7+')
+class TestStartup(unittest.TestCase):
+    """TestCase class"""
+
+    def assert_import_budget(self, route):
+        """Assert the import budget for a route"""
+        imported, import_time, error = measure_route(route)
+        print('%s: %d modules in %.1f ms%s' % (route, len(imported), import_time * 1000, ' (%s)' % error if error else ''))
+        self.assertEqual([name for name in imported if name.split('.')[0] in DEFERRED_MODULES], [])
+        self.assertLessEqual(len(imported), MAX_MODULE_COUNT, imported)
+        self.assertLessEqual(import_time, MAX_IMPORT_TIME)
+
+    def test_main_menu(self):
+        """Test the import budget of the main menu"""
+        self.assert_import_budget('/')
+
+    def test_recent(self):
+        """Test the import budget of the recent listing"""
+        self.assert_import_budget('/recent')
+
+    def test_play_id(self):
+        """Test the import budget of playing a video"""
+        self.assert_import_budget('/play/id/vid-5b12c0f6-b8fe-426f-a600-557f501f3be9')
+
+
+if __name__ == '__main__':
+    unittest.main()
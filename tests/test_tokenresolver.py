@@ -36,6 +36,44 @@ class TestTokenResolver(unittest.TestCase):
         addon.settings['username'] = self.username
         addon.settings['password'] = self.password
 
+    def test_cached_token(self):
+        """Test sharing cached tokens between instances"""
+        self._tokenresolver._set_cached_token({'testToken': 'foo', 'expirationDate': '2052-01-01T06:00:00.000Z'}, 'test')  # pylint: disable=protected-access
+        self.assertEqual(TokenResolver().get_token('testToken', 'test'), 'foo')
+        self.assertFalse(TokenResolver()._expires_soon('testToken', 'test'))  # pylint: disable=protected-access
+        self._tokenresolver._set_cached_token({'testToken': 'bar', 'expirationDate': '2019-01-01T06:00:00.000Z'}, 'test')  # pylint: disable=protected-access
+        self.assertIsNone(TokenResolver()._get_cached_token('testToken', 'test'))  # pylint: disable=protected-access
+        self.assertIsNone(TokenResolver()._expires_soon('testToken', 'test'))  # pylint: disable=protected-access
+
+    def test_shared_tokens(self):
+        """Test only sharing short-lived tokens with other processes"""
+        import tokenresolver
+        properties = {}
+        get_property, set_property = tokenresolver.get_property, tokenresolver.set_property
+        tokenresolver.get_property = properties.get
+        tokenresolver.set_property = properties.__setitem__
+        try:
+            # pylint: disable=protected-access
+            resolver = TokenResolver()
+            resolver._set_cached_token({'vrtnu-site_profile_at': 'foo', 'expirationDate': '2052-01-01T06:00:00.000Z'}, 'test')
+            resolver._set_cached_token({'vrtnu-site_profile_vt': 'bar', 'expirationDate': '2052-01-01T06:00:00.000Z'}, 'test')
+            resolver._set_cached_token({'vrtPlayerToken': 'baz', 'expirationDate': None}, 'test')
+            shared_tokens = resolver._get_shared_tokens()
+        finally:
+            tokenresolver.get_property, tokenresolver.set_property = get_property, set_property
+        self.assertEqual(list(shared_tokens), ['test_vrtnusite_profile_at.tkn'])
+        self.assertEqual(shared_tokens.get('test_vrtnusite_profile_at.tkn').get('token').get('vrtnu-site_profile_at'), 'foo')
+
+    def test_generate_playerinfo(self):
+        """Test signing playerinfo using cached player keys"""
+        from base64 import urlsafe_b64decode
+        from json import loads
+        playerinfo = TokenResolver._generate_playerinfo(dict(kid='foo', secret='bar', version='5.2.2-test'))  # pylint: disable=protected-access
+        segments = playerinfo.split('.')
+        self.assertEqual(len(segments), 3)
+        payload = loads(urlsafe_b64decode(segments[1] + '=' * (-len(segments[1]) % 4)).decode('utf-8'))
+        self.assertEqual(payload.get('player').get('version'), '5.2.2-test')
+
     def test_refresh_login(self):
         """Test refreshing login"""
         self._tokenresolver.refresh_login()
@@ -84,6 +84,112 @@ class TestTVGuide(unittest.TestCase):
         episode_items = self._tvguide.get_episode_items('tomorrow', 'ketnet')
         self.assertTrue(episode_items)
 
+    def test_resolve_stream_ids(self):
+        """Test batched stream id resolution"""
+        stream_ids = self._tvguide.resolve_stream_ids([])
+        self.assertEqual(stream_ids, {})
+        stream_ids = self._tvguide.resolve_stream_ids([None])
+        self.assertEqual(stream_ids, {None: (None, None)})
+
+    def test_stream_ids_cache(self):
+        """Test storing resolved stream ids in the cache"""
+        from kodiutils import delete_cache, get_cache
+        tvguide = TVGuide()
+        tvguide.get_stream_ids_batch = lambda episode_ids: {episode_id: ['vid-' + episode_id, 'pbs-pub-' + episode_id] for episode_id in episode_ids}
+        delete_cache(tvguide.STREAM_IDS_CACHE)
+        try:
+            self.assertEqual(tvguide.resolve_stream_ids(['1571140659165']), {'1571140659165': ('vid-1571140659165', 'pbs-pub-1571140659165')})
+            self.assertEqual(get_cache(tvguide.STREAM_IDS_CACHE), {'1571140659165': ['vid-1571140659165', 'pbs-pub-1571140659165']})
+            # A new instance reads the stream ids back from the cache
+            self.assertEqual(TVGuide().get_stream_ids('1571140659165'), ('vid-1571140659165', 'pbs-pub-1571140659165'))
+        finally:
+            delete_cache(tvguide.STREAM_IDS_CACHE)
+
+    def test_schedule_index(self):
+        """Test looking up episodes in a schedule by timestamp"""
+        from calendar import timegm
+        from helperobjects import ScheduleIndex
+        episodes = [
+            dict(title='News', startTime='2019-05-11T19:00:00.000+02:00', endTime='2019-05-11T19:45:00.000+02:00'),
+            dict(title='Weather', startTime='2019-05-11T19:45:00.000+02:00', endTime='2019-05-11T19:50:00.000+02:00'),
+            dict(title='Movie', startTime='2019-05-11T20:30:00.000+02:00', endTime='2019-05-11T22:30:00.000+02:00'),
+        ]
+        schedule_index = ScheduleIndex(episodes)
+        timestamp = timegm((2019, 5, 11, 17, 10, 0))  # 19:10 CEST
+        self.assertEqual(schedule_index.episodes[schedule_index.playing(timestamp)].get('title'), 'News')
+        self.assertEqual(schedule_index.episodes[schedule_index.upcoming(timestamp)].get('title'), 'Weather')
+        timestamp = timegm((2019, 5, 11, 18, 0, 0))  # 20:00 CEST
+        self.assertIsNone(schedule_index.playing(timestamp))
+        self.assertEqual(schedule_index.episodes[schedule_index.upcoming(timestamp)].get('title'), 'Movie')
+        self.assertEqual(schedule_index.episodes[schedule_index.nearest_start(timestamp)].get('title'), 'Weather')
+        self.assertEqual(schedule_index.episodes[schedule_index.nearest_middle(timestamp + 3600)].get('title'), 'Movie')
+        self.assertIsNone(ScheduleIndex([]).nearest_start(timestamp))
+
+    def test_epg_day(self):
+        """Test reusing the stored EPG of a past day"""
+        from json import dumps
+        from data import CHANNELS
+        from kodiutils import delete_cache, update_cache
+        today = datetime.now(dateutil.tz.tzlocal())
+        epg = today + timedelta(days=-3)
+        channel = CHANNELS[0]
+        schedule = {channel.get('id'): [dict(title='Het Journaal', startTime='2019-05-11T19:00:00.000+02:00', endTime='2019-05-11T19:45:00.000+02:00')]}
+        epg_day = self._tvguide.convert_epg_day(schedule, {})
+        self.assertTrue(epg_day.get('complete'))
+        self.assertEqual(epg_day.get('epg_ids'), [channel.get('epg_id')])
+        self.assertEqual(epg_day.get('channels').get(channel.get('epg_id'))[0].get('title'), 'Het Journaal')
+        update_cache(epg.strftime(self._tvguide.EPG_CACHE), dumps(epg_day))
+        self.assertEqual(self._tvguide.get_epg_day(epg, today), epg_day)
+        delete_cache(epg.strftime(self._tvguide.EPG_CACHE))
+
+    def test_epg_day_failed(self):
+        """Test fetching the schedule of a past day again after it failed"""
+        from data import CHANNELS
+        from kodiutils import delete_cache, get_cache
+        today = datetime.now(dateutil.tz.tzlocal())
+        epg = self._tvguide.parse('today', today) + timedelta(days=-3)
+        channel = CHANNELS[0]
+        schedules = [{}, {channel.get('id'): [dict(title='Het Journaal', startTime='2019-05-11T19:00:00.000+02:00',
+                                                   endTime='2019-05-11T19:45:00.000+02:00')]}]
+        fetched = []
+        tvguide = TVGuide()
+        tvguide.get_schedule = lambda epg, today: fetched.append(epg.date()) or schedules[len(fetched) - 1]
+        delete_cache(epg.strftime(tvguide.EPG_CACHE))
+        try:
+            self.assertEqual(tvguide.get_epg_data(days_before=3, days_after=-3), {})
+            self.assertIsNone(get_cache(epg.strftime(tvguide.EPG_CACHE)))
+            epg_data = tvguide.get_epg_data(days_before=3, days_after=-3)
+            self.assertEqual(fetched, [epg.date(), epg.date()])
+            self.assertEqual(epg_data.get(channel.get('epg_id'))[0].get('title'), 'Het Journaal')
+            self.assertTrue(get_cache(epg.strftime(tvguide.EPG_CACHE)).get('complete'))
+        finally:
+            delete_cache(epg.strftime(tvguide.EPG_CACHE))
+
+    def test_past_schedule_revalidated(self):
+        """Test revalidating the schedule of a past day once when it was cached before the day ended"""
+        from calendar import timegm
+        from json import dumps
+        import kodiutils
+        today = datetime.now(dateutil.tz.tzlocal())
+        epg = self._tvguide.parse('today', today) + timedelta(days=-3)
+        cache_file = epg.strftime(self._tvguide.SCHEDULE_CACHE)
+        day_end = epg.replace(hour=6, minute=0, second=0, microsecond=0) + timedelta(days=1)
+        schedule = {'O8': [dict(title='Het Journaal')]}
+        requests = []
+        open_url = kodiutils.open_url
+        kodiutils.open_url = lambda url, **kwargs: requests.append(url)
+        try:
+            for updated, revalidated in ((day_end - timedelta(hours=1), True), (day_end + timedelta(hours=1), False)):
+                kodiutils.update_cache(cache_file, dumps(schedule))
+                kodiutils.get_cache_store()._execute('UPDATE cache SET updated = ? WHERE key = ?',  # pylint: disable=protected-access
+                                                     (timegm(updated.utctimetuple()), cache_file))
+                del requests[:]
+                self.assertEqual(self._tvguide.get_schedule(epg, today), schedule)
+                self.assertEqual(bool(requests), revalidated)
+        finally:
+            kodiutils.open_url = open_url
+            kodiutils.delete_cache(cache_file)
+
     def test_parse(self):
         """Test parsing date"""
         now = datetime.now(dateutil.tz.tzlocal())
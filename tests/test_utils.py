@@ -162,6 +162,85 @@ class TestUtils(unittest.TestCase):
         self.assertEqual('plugin://plugin.video.youtube/foo/bar/', utils.youtube_to_plugin_url('https://www.youtube.com/foo/bar'))
         self.assertEqual('plugin://plugin.video.youtube/foo/bar/baz/', utils.youtube_to_plugin_url('https://www.youtube.com/foo/bar/baz/'))
 
+    def test_run_concurrently(self):
+        """run_concurrently"""
+        self.assertEqual([], utils.run_concurrently(lambda item: item * 2, []))
+        self.assertEqual([2, 4, 6, 8, 10], utils.run_concurrently(lambda item: item * 2, [1, 2, 3, 4, 5], max_workers=3))
+        with self.assertRaises(ZeroDivisionError):
+            utils.run_concurrently(lambda item: 1 // item, [1, 0, 2])
+
+    def test_run_in_background(self):
+        """run_in_background"""
+        from threading import Event
+        results = []
+        event = Event()
+        utils.run_in_background(results.append, 'done')
+        utils.run_in_background(event.wait)
+        utils.wait_for_background(timeout=0.1)
+        self.assertEqual(results, ['done'])
+        self.assertEqual(utils.BACKGROUND_THREADS, [])
+        event.set()
+
+    def test_run_in_background_prunes(self):
+        """run_in_background forgets finished threads"""
+        from threading import Event
+        event = Event()
+        finished = utils.run_in_background(len, 'done')
+        finished.join()
+        running = utils.run_in_background(event.wait)
+        self.assertEqual(utils.BACKGROUND_THREADS, [running])
+        event.set()
+        utils.wait_for_background(timeout=1)
+
+    def test_parse_iso8601(self):
+        """parse_iso8601"""
+        import dateutil.parser
+        for value in ('2019-05-11', '2024-10-04T19:35:00', '2019-05-11T19:00:00.000+02:00', '2052-01-01T06:00:00.000000Z',
+                      '2020-03-01T10:00:00.123456789-05:30', '2021-01-01T00:00:00+0100', 'Mon, 1 Jan 2052 06:00:00 GMT'):
+            parsed = utils.parse_iso8601(value)
+            self.assertEqual(parsed, dateutil.parser.parse(value))
+            self.assertEqual(parsed.utcoffset(), dateutil.parser.parse(value).utcoffset())
+            self.assertIs(utils.parse_iso8601(value), parsed)
+
+    def test_convert_episode_benchmark(self):
+        """Benchmark converting a page of 50 episodes with dateutil, parse_iso8601 and its memo"""
+        from timeit import timeit
+        import dateutil.parser
+        import api
+        items = []
+        for idx in range(50):
+            items.append(dict(node=dict(episode=dict(
+                id='ep-%d' % idx, title='Aflevering %d' % (idx + 1), description='<p>Beschrijving</p>', permalink='',
+                onTimeRaw='2024-10-%02dT19:35:00.000+02:00' % (idx % 28 + 1), offTimeRaw='2052-01-01T06:00:00.000+00:00',
+                durationSeconds=1800, episodeNumberRaw=str(idx + 1), season=dict(titleRaw='1'),
+                analytics=dict(airDate='2024-10-%02dT17:35:%02d.000Z' % (idx % 28 + 1, idx), categories='humor,actua'),
+                favoriteAction=dict(favorite=False), watchAction=dict(videoId='vid-%d' % idx, publicationId='pbs-pub-%d' % idx),
+                program=dict(id='prog-%d' % (idx % 5), title='Thuis', link='/vrtmax/a-z/thuis/', programType='series', subtitle='')))))
+
+        def convert_page():
+            """Convert all episodes of the page"""
+            return [api.convert_episode(item, destination='recent')[3].info_dict for item in items]
+
+        def convert_page_uncached():
+            """Convert all episodes of the page without using the memo"""
+            for item in items:
+                utils.parse_iso8601.cached = {}
+                api.convert_episode(item, destination='recent')
+
+        memo = getattr(utils.parse_iso8601, 'cached', {})
+        try:
+            api.parse_iso8601 = dateutil.parser.parse
+            converted = convert_page()
+            dateutil_time = timeit(convert_page, number=10)
+            api.parse_iso8601 = utils.parse_iso8601
+            self.assertEqual(convert_page(), converted)
+            uncached_time = timeit(convert_page_uncached, number=10)
+            cached_time = timeit(convert_page, number=10)
+        finally:
+            api.parse_iso8601 = utils.parse_iso8601
+            utils.parse_iso8601.cached = memo
+        print('dateutil: %.2f ms, parse_iso8601: %.2f ms (%.1fx), memoized: %.2f ms (%.1fx)' % (
+            dateutil_time * 100, uncached_time * 100, dateutil_time / uncached_time, cached_time * 100, dateutil_time / cached_time))
 
 if __name__ == '__main__':
     unittest.main()
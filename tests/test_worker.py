@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+# GNU General Public License v3.0 (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+"""Unit tests for the plugin worker"""
+
+# pylint: disable=invalid-name
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+import socket
+import sys
+from threading import Thread
+import unittest
+
+import kodiutils
+import worker
+from helperobjects import TitleItem
+from worker import PluginWorker, forward, forwardable, read_message, write_message
+
+
+class TestWorker(unittest.TestCase):
+    """TestCase class"""
+
+    def test_forwardable(self):
+        """Test which plugin invocations are forwarded to the worker"""
+        self.assertTrue(forwardable('plugin://plugin.video.vrt.nu/'))
+        self.assertTrue(forwardable('plugin://plugin.video.vrt.nu/favorites/programs'))
+        self.assertTrue(forwardable('plugin://plugin.video.vrt.nu/programs/de-ideale-wereld'))
+        self.assertTrue(forwardable('plugin://plugin.video.vrt.nu/tvguide/date/today/een'))
+        self.assertFalse(forwardable('plugin://plugin.video.vrt.nu/play/id/vid-123'))
+        self.assertFalse(forwardable('plugin://plugin.video.vrt.nu/follow/de-ideale-wereld/De%20Ideale%20Wereld'))
+        self.assertFalse(forwardable('plugin://plugin.video.vrt.nu/search/query'))
+
+    def test_forward_without_worker(self):
+        """Test falling back to running in-process when no worker is listening"""
+        self.assertFalse(forward(['plugin://plugin.video.vrt.nu/', '0', '']))
+
+    @staticmethod
+    def fake_worker(response):
+        """Publish a worker that answers every plugin invocation with a response, or never answers when the response is None"""
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.bind(('127.0.0.1', 0))
+        sock.listen(1)
+
+        def serve():
+            """Answer a single plugin invocation"""
+            conn, _ = sock.accept()
+            read_message(conn)
+            if response is not None:
+                write_message(conn, response)
+            conn.recv(1)  # Wait until the plugin invocation hangs up
+            conn.close()
+            sock.close()
+
+        thread = Thread(target=serve)
+        thread.daemon = True
+        thread.start()
+        return '%d:secret' % sock.getsockname()[1]
+
+    def forward_to(self, response):
+        """Forward a plugin invocation to a fake worker"""
+        get_property, timeout = kodiutils.get_property, worker.WORKER_TIMEOUT
+        kodiutils.get_property = lambda key: self.fake_worker(response)
+        worker.WORKER_TIMEOUT = 0.2
+        try:
+            return forward(['plugin://plugin.video.vrt.nu/', '0', ''])
+        finally:
+            kodiutils.get_property, worker.WORKER_TIMEOUT = get_property, timeout
+
+    def test_forward_responses(self):
+        """Test only falling back to running in-process when the worker did not run the plugin invocation"""
+        self.assertFalse(self.forward_to(dict(fallback=True)))
+        self.assertTrue(self.forward_to(dict(handled=True)))
+        self.assertTrue(self.forward_to(dict(directive=dict(end_of_directory=True))))
+        # A worker that times out may still be running the route
+        self.assertTrue(self.forward_to(None))
+
+    def test_run_restores_argv(self):
+        """Test restoring the arguments of the service process after running a plugin invocation"""
+        argv = list(sys.argv)
+        PluginWorker().run(['plugin://plugin.video.vrt.nu/', '0', ''])
+        self.assertEqual(sys.argv, argv)
+
+    def test_title_item_roundtrip(self):
+        """Test serializing a listing item for the plugin invocation"""
+        title_item = TitleItem(label='Label', path='plugin://plugin.video.vrt.nu/programs/foo',
+                               art_dict=dict(thumb='thumb.jpg'), info_dict=dict(plot='Plot'),
+                               context_menu=[('Follow', 'RunPlugin(plugin://plugin.video.vrt.nu/follow/foo/Foo)')],
+                               is_playable=False)
+        restored = TitleItem.from_dict(title_item.to_dict())
+        self.assertEqual(restored.to_dict(), title_item.to_dict())
+        self.assertEqual(restored.context_menu, title_item.context_menu)
+
+    def test_title_item_lazy_context_menu(self):
+        """Test building a callable context menu once, on first access"""
+        calls = []
+
+        def build_context_menu():
+            """Build a context menu and count the calls"""
+            calls.append(1)
+            return [('Follow', 'RunPlugin(plugin://plugin.video.vrt.nu/follow/foo/Foo)')]
+
+        title_item = TitleItem(label='Label', path='plugin://plugin.video.vrt.nu/programs/foo', context_menu=build_context_menu)
+        self.assertEqual(calls, [])
+        self.assertEqual(title_item.context_menu, [('Follow', 'RunPlugin(plugin://plugin.video.vrt.nu/follow/foo/Foo)')])
+        self.assertEqual(title_item.context_menu, [('Follow', 'RunPlugin(plugin://plugin.video.vrt.nu/follow/foo/Foo)')])
+        self.assertEqual(len(calls), 1)
+
+        title_item = TitleItem(label='Label', path='plugin://plugin.video.vrt.nu/programs/foo', context_menu=build_context_menu)
+        restored = TitleItem.from_dict(title_item.to_dict())
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(restored.context_menu, [('Follow', 'RunPlugin(plugin://plugin.video.vrt.nu/follow/foo/Foo)')])
+        self.assertEqual(restored.to_dict(), title_item.to_dict())
+        self.assertEqual(len(calls), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()